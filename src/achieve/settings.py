@@ -47,7 +47,6 @@ INSTALLED_APPS = [
     'hijack_admin',
     'hijack',
     'compat',
-    'django_crontab',
 ]
 
 MIDDLEWARE = [
@@ -56,6 +55,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'okr.middleware.RolesMiddleware',
+    'okr.middleware.ActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,6 +87,8 @@ if DEBUG:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            # okr.Poker is ahead of its migrations, so the test database can't be serialized
+            'TEST': {'SERIALIZE': False},
         }
     }
 else:
@@ -151,7 +154,10 @@ REST_FRAMEWORK = {
 
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
-    ]
+    ],
+
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.IdCursorPagination',
+    'PAGE_SIZE': 100,
 }
 
 # Python LDAP 3 Settings
@@ -161,12 +167,75 @@ LDAP_AUTH_SEARCH_BASE = "ou=People,o=ing"
 LDAP_AUTH_CONNECTION_USERNAME = None
 LDAP_AUTH_CONNECTION_PASSWORD = None
 
-# Crontab Settings
-CRONJOBS = [
-    ('0 9 * * *', 'okr.cron.update_issues', '>> /tmp/update_issues_morning.log'),
-    ('0 14 * * *', 'okr.cron.update_issues', '>> /tmp/update_issues_afternoon.log'),
-    ('* * * * *', 'okr.cron.update_percentages', '>> /tmp/update_percentages.log'),
+# JIRA Settings
+JIRA_SERVER = os.environ.get('JIRA_SERVER', 'https://jira.cbs.europe.intranet:8081')
+JIRA_USERNAME = os.environ.get('JIRA_USERNAME')
+JIRA_PASSWORD = os.environ.get('JIRA_PASSWORD')
+JIRA_VERIFY = False
+# JQL dates are read in the time zone of the JIRA user we sync as (their profile setting), not in ours
+JIRA_TIME_ZONE = os.environ.get('JIRA_TIME_ZONE', 'UTC')
+JIRA_STORY_POINTS_FIELD = os.environ.get('JIRA_STORY_POINTS_FIELD', 'customfield_10002')
+JIRA_CONNECT_TIMEOUT = 3.05  # seconds
+JIRA_READ_TIMEOUT = 15  # seconds
+JIRA_POKER_READ_TIMEOUT = 3  # seconds; Poker queries JIRA inside a web request, once and without retries
+JIRA_MAX_RETRIES = 2
+JIRA_RETRY_BACKOFF = 0.5  # seconds, doubled on every retry
+JIRA_FAILURE_THRESHOLD = 5  # consecutive failures before the circuit opens
+JIRA_RESET_TIMEOUT = 60  # seconds the circuit stays open before a trial request
+JIRA_WEBHOOK_SECRET = os.environ.get('JIRA_WEBHOOK_SECRET', '')  # passed by JIRA as ?token=
+JIRA_WEBHOOK_WINDOW = 2  # seconds an issue event waits as a queued job, coalescing later events of the issue
+
+# Report Settings
+REPORT_SNAPSHOT_RETENTION = 14  # days hourly report snapshots are kept; older ones are thinned out to one per day
+
+# Cache Settings
+# Local memory by default; set CACHE_BACKEND and CACHE_LOCATION for a shared cache, e.g.
+# django.core.cache.backends.filebased.FileBasedCache with a directory, or django_redis.cache.RedisCache with a URL.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'achieve'),
+        'KEY_PREFIX': 'achieve',
+    },
+}
+# Versions are bumped by whichever process changes the data (web, JIRA sync, job workers), so rendered fragments
+# are only cached when all of them share the cache; with the default local memory cache they are always rendered.
+FRAGMENT_CACHE_ENABLED = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+FRAGMENT_CACHE_TIMEOUT = 3600  # seconds a rendered fragment is kept; it is replaced as soon as its objects change
+FRAGMENT_CACHE_LOCK_TIMEOUT = 10  # seconds one process may take to render a fragment before another may try
+
+# Activity Settings
+ACTIVITY_FEED_CACHE_TTL = 30  # seconds the first page of a team's feed is cached
+ACTIVITY_BUFFER_SIZE = 100  # activities buffered per request before they are written
+
+# Typeahead Settings
+TYPEAHEAD_MEMORY_INDEX = False  # search sorted in-memory copies of issue keys and usernames instead of the database
+TYPEAHEAD_INDEX_TTL = 300  # seconds before an in-memory index is reloaded, picking up other processes' writes
+
+# Job Queue Settings
+# Background work is queued in the database (okr.jobs) and run by `manage.py run_jobs` worker processes.
+JOB_LEASE = 300  # seconds a claimed job is reserved for its worker; extended while the job runs
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # seconds before the first retry, doubled for every further attempt
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_POLL_INTERVAL = 5  # seconds an idle worker waits before looking for due jobs again
+
+# Scheduler Settings
+# Periodic jobs, queued by `manage.py run_scheduler` on whichever node is the elected leader and run by the
+# `manage.py run_jobs` workers: (name, cron expression in TIME_ZONE, job, keyword arguments). Jobs are the tasks of
+# okr.jobs.TASKS.
+# Progress is rolled up as issues and key results change (okr.rollup); the nightly run only repairs drift.
+SCHEDULE = [
+    ('sync_issues', '*/5 * * * *', 'sync_issues', {}),
+    ('sync_issues_full', '0 9 * * *', 'sync_issues', {'full': True}),
+    ('update_percentages', '0 3 * * *', 'update_percentages', {}),
+    ('take_report_snapshots', '15 * * * *', 'take_report_snapshots', {}),
+    ('compact_progress_history', '30 3 * * *', 'compact_progress_history', {}),
+    ('prune_report_snapshots', '45 3 * * *', 'prune_report_snapshots', {}),
 ]
+SCHEDULER_LEASE = 60  # seconds the leader holds its lease; renewed on every pass
+SCHEDULER_INTERVAL = 10  # seconds between two passes of the scheduler loop
+SCHEDULER_CATCH_UP = 24 * 60 * 60  # seconds of ticks missed during a leader handover or outage still queued
 
 # Hijack Admin Settings
 HIJACK_LOGIN_REDIRECT_URL = '/okr/objective/list'  # Where admins are redirected to after hijacking a user
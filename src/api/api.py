@@ -1,49 +1,289 @@
+from django.db import connection, transaction
 from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.timezone import now
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import api_view
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from okr import activity, feed, fragments, history, rollup, search, typeahead
+from okr.permissions import is_owner_of_key_result, is_owner_of_objective
+
+from .conditional import ConditionalMixin
+from .filters import QueryFilterMixin, parse_id
 from .serializers import *
 
+BULK_MAX_ITEMS = 500
+
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(QueryFilterMixin, viewsets.ModelViewSet):
     """ List all Users """
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    filter_lookups = {'team': 'profile__team', 'updated_since': 'date_joined'}
 
 
-class GlobalObjectiveViewSet(viewsets.ModelViewSet):
+class GlobalObjectiveViewSet(ConditionalMixin, QueryFilterMixin, viewsets.ModelViewSet):
     queryset = GlobalObjective.objects.all()
     serializer_class = GlobalObjectiveSerializer
+    filter_lookups = {'quarter': 'quarter', 'team': 'user__manager__team', 'user': 'user', 'updated_since': 'modified'}
 
 
-class GlobalKeyResultViewSet(viewsets.ModelViewSet):
+class GlobalKeyResultViewSet(ConditionalMixin, QueryFilterMixin, viewsets.ModelViewSet):
     queryset = GlobalKeyResult.objects.all()
     serializer_class = GlobalKeyResultSerializer
+    filter_lookups = {'quarter': 'objective__quarter', 'team': 'objective__user__manager__team',
+                      'objective': 'objective', 'complete': 'percentage', 'updated_since': 'modified'}
 
 
-class ObjectiveViewSet(viewsets.ModelViewSet):
-    queryset = Objective.objects.all()
+class ObjectiveViewSet(ConditionalMixin, QueryFilterMixin, viewsets.ModelViewSet):
+    queryset = Objective.objects.with_progress()
     serializer_class = ObjectiveSerializer
+    filter_lookups = {'quarter': 'global_key_result__objective__quarter', 'team': 'user__profile__team',
+                      'user': 'user', 'complete': 'percentage', 'updated_since': 'modified'}
+    # has_linked_issues changes with the key results, which touch their modified when issues are linked
+    modified_fields = ('modified', 'result__modified')
+
+
+class ProfileViewSet(ConditionalMixin, QueryFilterMixin, viewsets.ReadOnlyModelViewSet):
+    """ Team members with their progress in the current quarter, or in ?quarter= """
 
+    queryset = Profile.objects.select_related('user')
+    serializer_class = ProfileSerializer
+    filter_lookups = {'team': 'team', 'user': 'user', 'updated_since': 'last_updated'}
+    modified_fields = ('last_updated', 'user__objective_set__modified', 'user__objective_set__result__modified')
 
-class KeyResultViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        quarter = self.request.query_params.get('quarter', '')
+        quarter = Quarter.objects.filter(id=quarter).first() if quarter.isdigit() else None
+        return super().get_queryset().with_progress(quarter)
+
+
+class KeyResultViewSet(ConditionalMixin, QueryFilterMixin, viewsets.ModelViewSet):
     queryset = Result.objects.all()
     serializer_class = KeyResultSerializer
+    filter_lookups = {'quarter': 'objective__global_key_result__objective__quarter',
+                      'team': 'objective__user__profile__team', 'user': 'objective__user',
+                      'objective': 'objective', 'complete': 'percentage', 'updated_since': 'modified'}
+
+
+class KeyResultBulk(APIView):
+    """ Create and update many key results in one transaction """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        items = validate_bulk(BulkKeyResultSerializer, request.data)
+
+        results = Result.objects.select_related('objective__user').in_bulk(
+            {item['id'] for item in items if 'id' in item})
+        objectives = Objective.objects.select_related('user').in_bulk({item['objective'] for item in items})
+
+        missing = sorted({item['id'] for item in items if 'id' in item} - set(results))
+        if missing:
+            raise ValidationError({'id': 'Unknown key results: {ids}'.format(ids=missing)})
+        missing = sorted({item['objective'] for item in items} - set(objectives))
+        if missing:
+            raise ValidationError({'objective': 'Unknown objectives: {ids}'.format(ids=missing)})
+
+        denied = sorted({item['objective'] for item in items
+                         if not is_owner_of_objective(request.user, objectives[item['objective']])})
+        if denied:
+            raise PermissionDenied('Not an owner of objectives {ids}.'.format(ids=denied))
+        denied = sorted(pk for pk, result in results.items() if not is_owner_of_key_result(request.user, result))
+        if denied:
+            raise PermissionDenied('Not an owner of key results {ids}.'.format(ids=denied))
+
+        created, updated = [], []
+        touched_objectives = set()
+        previous = {pk: result.percentage for pk, result in results.items()}
+        for item in items:
+            if 'id' in item:
+                result = results[item.pop('id')]
+                touched_objectives.add(result.objective_id)
+            else:
+                result = Result()
+                created.append(result)
+            item['objective_id'] = item.pop('objective')
+            for field, value in item.items():
+                setattr(result, field, value)
+            result.modified = now()
+            touched_objectives.add(result.objective_id)
+            if result.pk:
+                updated.append(result)
+
+        with transaction.atomic():
+            if connection.features.can_return_ids_from_bulk_insert:
+                Result.objects.bulk_create(created)
+                inserted = created
+            else:
+                # bulk inserts leave the created rows without ids here; saved one by one, post_save follows them up
+                for result in created:
+                    result.save()
+                inserted = []
+            Result.objects.bulk_update(updated, ['objective', 'result', 'manual_bar', 'percentage', 'modified'])
+
+            # bulk writes skip the post_save signals; one rollup runs for the whole batch on commit
+            rollup.mark_results(result.pk for result in updated)
+            history.record({result.pk: result.percentage for result in inserted + updated})
+            rollup.mark_objectives(touched_objectives)
+            search.index(inserted + updated)
+
+            for result in inserted:
+                activity.key_result_saved(result, True, None, objectives[result.objective_id].user_id)
+            for result in updated:
+                activity.key_result_saved(result, False, previous[result.pk], objectives[result.objective_id].user_id)
+
+        return Response({'created': len(created), 'updated': len(updated)}, status=status.HTTP_200_OK)
+
+
+class KeyResultProgress(APIView):
+    """ Apply progress deltas (in percentage points) to many key results in one transaction """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        deltas = {}
+        for item in validate_bulk(ProgressDeltaSerializer, request.data):
+            deltas[item['id']] = deltas.get(item['id'], 0) + item['delta']
+
+        results = Result.objects.select_related('objective__user').in_bulk(deltas)
+        missing = sorted(set(deltas) - set(results))
+        if missing:
+            raise ValidationError({'id': 'Unknown key results: {ids}'.format(ids=missing)})
+        denied = sorted(pk for pk, result in results.items() if not is_owner_of_key_result(request.user, result))
+        if denied:
+            raise PermissionDenied('Not an owner of key results {ids}.'.format(ids=denied))
+
+        modified = now()
+        previous = {pk: result.percentage for pk, result in results.items()}
+        for pk, result in results.items():
+            result.percentage = min(100.0, max(0.0, result.percentage + deltas[pk]))
+            result.modified = modified
+
+        with transaction.atomic():
+            Result.objects.bulk_update(results.values(), ['percentage', 'modified'])
+            rollup.mark_results(results)
+            history.record({pk: result.percentage for pk, result in results.items()})
+
+            for pk, result in results.items():
+                activity.key_result_saved(result, False, previous[pk], result.objective.user_id)
+
+        return Response([{'id': pk, 'percentage': result.percentage} for pk, result in sorted(results.items())])
+
+
+class ActivityFeed(APIView):
+    """ The team's activity feed, or a single member's with ?user=; paged with ?cursor= and ?page_size= """
 
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        params = request.query_params
+        member = params.get('user', '')
+        if member and not member.isdigit():
+            raise ValidationError({'user': 'Invalid value.'})
+        member = get_object_or_404(User, pk=member) if member else None
+
+        size = params.get('page_size', '')
+        if size and not size.isdigit():
+            raise ValidationError({'page_size': 'Invalid value.'})
+
+        try:
+            activities, next_cursor = feed.read(request.user, member, params.get('cursor'),
+                                                int(size) if size else feed.PAGE_SIZE)
+        except feed.InvalidCursor:
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+        next_url = None
+        if next_cursor:
+            query = params.copy()
+            query['cursor'] = next_cursor
+            next_url = request.build_absolute_uri('?' + query.urlencode())
+
+        return Response({
+            'next': next_url,
+            'results': ActivitySerializer(activities, many=True).data,
+        })
+
+
+class Search(APIView):
+    """ Ranked search; ?q= words, optional ?quarter=, ?team=, ?kind= (repeatable) and ?limit= """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        params = request.query_params
+        scope = {}
+        for param in ('quarter', 'team', 'limit'):
+            try:
+                scope[param] = parse_id(params[param]) if params.get(param) else None
+            except ValueError:
+                raise ValidationError({param: 'Invalid value.'})
+
+        kinds = params.getlist('kind')
+        unknown = sorted(set(kinds) - set(search.KINDS))
+        if unknown:
+            raise ValidationError({'kind': 'Unknown kinds: {kinds}'.format(kinds=unknown)})
+
+        hits = search.search(params.get('q', ''), scope['quarter'], scope['team'], kinds or None,
+                             scope['limit'] or search.LIMIT)
+        return Response([{'kind': hit.kind, 'id': hit.object.pk, 'title': hit.title,
+                          'url': request.build_absolute_uri(hit.url), 'score': hit.score} for hit in hits])
+
+
+class Typeahead(APIView):
+    """ Issue keys or usernames starting with ?q=, at most ?limit= of them """
 
-class TeamViewSet(viewsets.ModelViewSet):
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, source, format=None):
+        if source not in typeahead.SOURCES:
+            raise Http404
+
+        limit = request.query_params.get('limit', '')
+        if limit and not limit.isdigit():
+            raise ValidationError({'limit': 'Invalid value.'})
+
+        return Response(typeahead.search(source, request.query_params.get('q', ''),
+                                         int(limit) if limit else typeahead.LIMIT))
+
+
+class FragmentCacheStats(APIView):
+    """ Fragment cache hits and misses of the answering process """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, format=None):
+        return Response(fragments.stats())
+
+
+def validate_bulk(serializer_class, data):
+    if isinstance(data, list) and len(data) > BULK_MAX_ITEMS:
+        raise ValidationError('At most {count} items per request.'.format(count=BULK_MAX_ITEMS))
+
+    serializer = serializer_class(data=data, many=True)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class TeamViewSet(QueryFilterMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    filter_lookups = {'updated_since': 'created'}
+
+    def get_queryset(self):
+        return super().get_queryset().with_summary(self.request.user)
 
 
-class ManagerViewSet(viewsets.ModelViewSet):
+class ManagerViewSet(QueryFilterMixin, viewsets.ModelViewSet):
     queryset = Manager.objects.all()
     serializer_class = ManagerSerializer
+    filter_lookups = {'team': 'team', 'user': 'manager', 'updated_since': 'created'}
 
 
 class UserTeamAdd(APIView):
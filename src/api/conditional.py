@@ -0,0 +1,37 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+class ConditionalMixin(object):
+    """
+        Conditional GET for list and retrieve.
+
+        The validator is the newest value of each of modified_fields plus the row count over the filtered queryset,
+        hashed with the full URL so every cursor page gets its own ETag. Unchanged data is answered with
+        304 Not Modified before anything is serialized. No Last-Modified is sent, since a row that is deleted or
+        filtered out leaves the newest timestamp where it was.
+    """
+    modified_fields = ('modified',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.filter_queryset(self.get_queryset()), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup]})
+        return self.conditional(queryset, super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, queryset, render, request, *args, **kwargs):
+        aggregates = {field: Max(field) for field in self.modified_fields}
+        state = queryset.order_by().aggregate(count=Count('pk', distinct=True), **aggregates)
+        etag = quote_etag(hashlib.sha1(repr((request.get_full_path(), sorted(state.items()))).encode()).hexdigest())
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = render(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+        return response
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import get_current_timezone, make_aware
+from rest_framework.exceptions import ValidationError
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_id(value):
+    if not value.isdigit():
+        raise ValueError
+    return int(value)
+
+
+def parse_bool(value):
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def parse_timestamp(value):
+    """ ISO 8601 date or datetime; naive values are read in the server's time zone. """
+    timestamp = parse_datetime(value)
+    if timestamp is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError
+        timestamp = make_aware(datetime(day.year, day.month, day.day), get_current_timezone())
+    elif timestamp.tzinfo is None:
+        timestamp = make_aware(timestamp, get_current_timezone())
+    return timestamp
+
+
+PARSERS = {
+    'quarter': parse_id,
+    'team': parse_id,
+    'user': parse_id,
+    'objective': parse_id,
+    'complete': parse_bool,
+    'updated_since': parse_timestamp,
+}
+
+
+class QueryFilterMixin(object):
+    """
+        Server-side filtering from query parameters.
+
+        filter_lookups maps the supported parameters (see PARSERS) to ORM lookups on the viewset's model, e.g.
+        {'team': 'user__profile__team', 'updated_since': 'created'}. complete filters on a percentage lookup and
+        updated_since on a timestamp lookup (>=); the rest are exact matches on indexed foreign keys.
+    """
+    filter_lookups = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        for param, lookup in self.filter_lookups.items():
+            value = self.request.query_params.get(param)
+            if value is None or value == '':
+                continue
+
+            try:
+                value = PARSERS[param](value)
+            except ValueError:
+                raise ValidationError({param: 'Invalid value.'})
+
+            if param == 'complete':
+                queryset = queryset.filter(**{lookup: 100}) if value else queryset.exclude(**{lookup: 100})
+            elif param == 'updated_since':
+                queryset = queryset.filter(**{lookup + '__gte': value})
+            else:
+                queryset = queryset.filter(**{lookup: value})
+        return queryset
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+        Cursor pagination on the primary key.
+
+        The id is unique, immutable and indexed on every table, so each page is a single indexed range scan no
+        matter how deep the client has paged.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -27,10 +27,21 @@ class GlobalKeyResultSerializer(serializers.ModelSerializer):
 
 class ObjectiveSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='okr:objective-detail')
+    has_linked_issues = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Objective
-        fields = ('url', 'created', 'objective', 'global_key_result', 'user', 'percentage')
+        fields = ('url', 'created', 'objective', 'global_key_result', 'user', 'percentage', 'has_linked_issues')
+
+
+class ProfileSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+    progress = serializers.FloatField(source='get_percentage', read_only=True)
+    has_linked_issues = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Profile
+        fields = ('id', 'username', 'name', 'team', 'progress', 'has_linked_issues')
 
 
 class KeyResultSerializer(serializers.ModelSerializer):
@@ -39,12 +50,41 @@ class KeyResultSerializer(serializers.ModelSerializer):
         fields = ('created', 'objective', 'result', 'percentage')
 
 
+class BulkKeyResultSerializer(serializers.ModelSerializer):
+    """ One item of a bulk key result write; items with an id update that key result, the rest are created. """
+    id = serializers.IntegerField(required=False)
+    objective = serializers.IntegerField()
+
+    class Meta:
+        model = Result
+        fields = ('id', 'objective', 'result', 'manual_bar', 'percentage')
+        extra_kwargs = {'percentage': {'min_value': 0, 'max_value': 100}}
+
+
+class ProgressDeltaSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    delta = serializers.FloatField(min_value=-100, max_value=100)
+
+
+class ActivitySerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+    data = serializers.ReadOnlyField(source='get_data')
+
+    class Meta:
+        model = Activity
+        fields = ('id', 'created', 'type', 'user', 'username', 'public', 'data')
+
+
 class TeamSerializer(serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='okr:team-detail')
 
+    member_count = serializers.IntegerField(read_only=True)
+    manager_username = serializers.CharField(read_only=True)
+    managed_by_me = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = Team
-        fields = ('url', 'created', 'name')
+        fields = ('url', 'created', 'name', 'member_count', 'manager_username', 'managed_by_me')
 
 
 class ManagerSerializer(serializers.ModelSerializer):
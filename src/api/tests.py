@@ -0,0 +1,284 @@
+import json
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils.http import http_date
+from django.utils.timezone import now
+
+from okr.models import (
+    Activity, GlobalKeyResult, GlobalObjective, Issue, Objective, Quarter, Result, ResultProgress, SearchPosting, Team,
+    invalidate_current_quarter,
+)
+
+
+class ApiTestCase(TestCase):
+
+    def setUp(self):
+        self.teams = [Team.objects.create(name='Team {n}'.format(n=n)) for n in range(2)]
+        self.users = []
+        for n, team in enumerate(self.teams):
+            user = User.objects.create_user('user{n}'.format(n=n), password='password')
+            user.profile.team = team
+            user.profile.save()
+            self.users.append(user)
+
+        self.quarters = [Quarter.objects.create(name='Q1', start_date=date(2000, 1, 1), end_date=date(2999, 12, 31)),
+                         Quarter.objects.create(name='Q2', start_date=date(1990, 1, 1), end_date=date(1990, 3, 31))]
+        invalidate_current_quarter()
+        self.objectives = []
+        for quarter in self.quarters:
+            global_objective = GlobalObjective.objects.create(objective='Global', quarter=quarter, user=self.users[0])
+            global_key_result = GlobalKeyResult.objects.create(key_result='Global KR', objective=global_objective)
+            for user in self.users:
+                self.objectives.append(Objective.objects.create(
+                    objective='{user} {quarter}'.format(user=user.username, quarter=quarter.name),
+                    user=user, global_key_result=global_key_result))
+        self.client.force_login(self.users[0])
+
+    def get(self, url, status_code=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status_code)
+        return response.json()
+
+
+class CursorPaginationTests(ApiTestCase):
+
+    def pages(self, url):
+        while url:
+            page = self.get(url)
+            yield [objective['objective'] for objective in page['results']]
+            url = page['next']
+
+    def test_pages_follow_descending_ids_without_gaps(self):
+        pages = list(self.pages('/api/objectives/?page_size=3'))
+        self.assertEqual([len(page) for page in pages], [3, 1])
+        self.assertEqual(sum(pages, []), [objective.objective for objective in reversed(self.objectives)])
+
+    def test_rows_added_while_paging_do_not_shift_the_pages(self):
+        first = self.get('/api/objectives/?page_size=2')
+        Objective.objects.create(objective='New', user=self.users[0],
+                                 global_key_result=self.objectives[0].global_key_result)
+        Objective.objects.filter(pk=self.objectives[0].pk).delete()
+
+        rest = [objective['objective'] for objective in self.get(first['next'])['results']]
+        self.assertEqual(rest, [objective.objective for objective in reversed(self.objectives[1:2])])
+        self.assertNotIn('New', rest)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.get('/api/objectives/?cursor=garbage', status_code=404)
+
+
+class QueryFilterTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.results = []
+        for objective in self.objectives:
+            self.results.append(Result.objects.create(result=objective.objective, objective=objective))
+        Result.objects.filter(pk=self.results[0].pk).update(percentage=100)
+
+    def key_results(self, query):
+        return sorted(result['result'] for result in self.get('/api/keyresults/?' + query)['results'])
+
+    def test_each_filter(self):
+        self.assertEqual(self.key_results('quarter={pk}'.format(pk=self.quarters[1].pk)), ['user0 Q2', 'user1 Q2'])
+        self.assertEqual(self.key_results('team={pk}'.format(pk=self.teams[1].pk)), ['user1 Q1', 'user1 Q2'])
+        self.assertEqual(self.key_results('user={pk}'.format(pk=self.users[0].pk)), ['user0 Q1', 'user0 Q2'])
+        self.assertEqual(self.key_results('objective={pk}'.format(pk=self.objectives[1].pk)), ['user1 Q1'])
+        self.assertEqual(self.key_results('complete=true'), ['user0 Q1'])
+        self.assertEqual(self.key_results('complete=no'), ['user0 Q2', 'user1 Q1', 'user1 Q2'])
+
+        Result.objects.exclude(pk=self.results[3].pk).update(modified=now() - timedelta(days=10))
+        since = (now() - timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.key_results('updated_since=' + since), ['user1 Q2'])
+
+    def test_filters_combine(self):
+        query = 'team={team}&quarter={quarter}'.format(team=self.teams[0].pk, quarter=self.quarters[0].pk)
+        self.assertEqual(self.key_results(query), ['user0 Q1'])
+
+    def test_bad_values_are_rejected(self):
+        for param in ('quarter', 'team', 'user', 'objective', 'complete', 'updated_since'):
+            response = self.get('/api/keyresults/?{param}=bad'.format(param=param), status_code=400)
+            self.assertEqual(list(response), [param])
+
+
+class ProfileViewSetTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Objective.objects.filter(global_key_result__objective__quarter=self.quarters[0]).update(percentage=40)
+        Objective.objects.filter(global_key_result__objective__quarter=self.quarters[1]).update(percentage=80)
+
+    def profiles(self, query=''):
+        page = self.get('/api/profiles/?' + query)
+        return [(profile['username'], profile['progress']) for profile in page['results']]
+
+    def test_progress_is_for_the_current_quarter_by_default(self):
+        self.assertEqual(sorted(self.profiles()), [('user0', 40), ('user1', 40)])
+
+    def test_progress_for_the_requested_quarter(self):
+        self.assertEqual(sorted(self.profiles('quarter={pk}'.format(pk=self.quarters[1].pk))),
+                         [('user0', 80), ('user1', 80)])
+
+    def test_team_filter(self):
+        self.assertEqual(self.profiles('team={pk}'.format(pk=self.teams[1].pk)), [('user1', 40)])
+
+
+class ConditionalTests(ApiTestCase):
+
+    def test_unchanged_list_and_detail_are_not_modified(self):
+        for url in ['/api/objectives/', '/api/objectives/{pk}/'.format(pk=self.objectives[0].pk)]:
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_each_page_has_its_own_etag(self):
+        first = self.client.get('/api/objectives/?page_size=2')
+        second = self.client.get(first.json()['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_saved_row_is_modified(self):
+        etag = self.client.get('/api/objectives/')['ETag']
+        Objective.objects.get(pk=self.objectives[0].pk).save()
+        self.assertEqual(self.client.get('/api/objectives/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_row_is_modified(self):
+        etag = self.client.get('/api/objectives/')['ETag']
+        Objective.objects.filter(pk=self.objectives[-1].pk).delete()
+        self.assertEqual(self.client.get('/api/objectives/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_row_is_modified_for_if_modified_since(self):
+        Objective.objects.filter(pk=self.objectives[-1].pk).delete()
+        since = http_date((now() + timedelta(hours=1)).timestamp())
+        response = self.client.get('/api/objectives/', HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_errors_are_not_cached(self):
+        response = self.client.get('/api/objectives/?updated_since=yesterday')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('ETag', response)
+
+
+class KeyResultBulkTests(ApiTestCase):
+
+    def post(self, url, items, status_code=200):
+        response = self.client.post(url, json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, status_code)
+        return response.json()
+
+    def test_items_without_id_are_created_and_with_id_updated(self):
+        existing = Result.objects.create(result='Existing', objective=self.objectives[0])
+        response = self.post('/api/keyresults/bulk/', [
+            {'objective': self.objectives[0].pk, 'result': 'New', 'manual_bar': True, 'percentage': 30},
+            {'id': existing.pk, 'objective': self.objectives[2].pk, 'result': 'Moved', 'manual_bar': True,
+             'percentage': 60},
+        ])
+        self.assertEqual(response, {'created': 1, 'updated': 1})
+        self.assertEqual(Result.objects.get(result='New').objective, self.objectives[0])
+        existing.refresh_from_db()
+        self.assertEqual((existing.objective, existing.result, existing.percentage), (self.objectives[2], 'Moved', 60))
+
+    def test_other_users_objectives_are_denied(self):
+        self.post('/api/keyresults/bulk/', [
+            {'objective': self.objectives[0].pk, 'result': 'Mine', 'manual_bar': True, 'percentage': 0},
+            {'objective': self.objectives[1].pk, 'result': 'Theirs', 'manual_bar': True, 'percentage': 0},
+        ], status_code=403)
+        self.assertFalse(Result.objects.exists())
+
+    def test_unknown_ids_are_rejected(self):
+        response = self.post('/api/keyresults/bulk/', [
+            {'id': 9999, 'objective': self.objectives[0].pk, 'result': 'Gone', 'manual_bar': True, 'percentage': 0},
+        ], status_code=400)
+        self.assertEqual(list(response), ['id'])
+
+    def test_too_many_items_are_rejected(self):
+        item = {'objective': self.objectives[0].pk, 'result': 'Many', 'manual_bar': True, 'percentage': 0}
+        self.post('/api/keyresults/bulk/', [item] * 501, status_code=400)
+        self.assertFalse(Result.objects.exists())
+
+    def test_progress_deltas_are_summed_and_clamped(self):
+        low = Result.objects.create(result='Low', objective=self.objectives[0], percentage=10)
+        high = Result.objects.create(result='High', objective=self.objectives[0], percentage=90)
+        response = self.post('/api/keyresults/progress/', [
+            {'id': low.pk, 'delta': 15}, {'id': low.pk, 'delta': -40}, {'id': high.pk, 'delta': 25},
+        ])
+        self.assertEqual(response, [{'id': low.pk, 'percentage': 0.0}, {'id': high.pk, 'percentage': 100.0}])
+        self.assertEqual(sorted(Result.objects.values_list('percentage', flat=True)), [0.0, 100.0])
+
+    def test_progress_on_other_users_key_results_is_denied(self):
+        theirs = Result.objects.create(result='Theirs', objective=self.objectives[1], percentage=10)
+        self.post('/api/keyresults/progress/', [{'id': theirs.pk, 'delta': 50}], status_code=403)
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.percentage, 10)
+
+
+class KeyResultHistoryTests(KeyResultBulkTests):
+
+    def test_bulk_writes_record_history(self):
+        existing = Result.objects.create(result='Existing', objective=self.objectives[0])
+        self.post('/api/keyresults/bulk/', [
+            {'objective': self.objectives[0].pk, 'result': 'New', 'manual_bar': True, 'percentage': 30},
+            {'id': existing.pk, 'objective': self.objectives[0].pk, 'result': 'Existing', 'manual_bar': True,
+             'percentage': 60},
+        ])
+        created = Result.objects.get(result='New')
+        self.assertEqual(ResultProgress.objects.get(result=created).percentage, 30)
+        self.assertEqual(ResultProgress.objects.get(result=existing).percentage, 60)
+
+    def test_progress_deltas_record_history(self):
+        result = Result.objects.create(result='Result', objective=self.objectives[0], percentage=10)
+        self.post('/api/keyresults/progress/', [{'id': result.pk, 'delta': 15}])
+        self.assertEqual(ResultProgress.objects.get(result=result).percentage, 25)
+
+
+class ActivityFeedTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Activity.objects.bulk_create(Activity(type=Activity.MODIFIED_OBJECTIVE, user=self.users[0], data='{}')
+                                     for _ in range(3))
+        Activity.objects.create(type=Activity.MODIFIED_OBJECTIVE, user=self.users[0], data='{}', public=False)
+
+    def test_pages_follow_next(self):
+        page = self.get('/api/activity/?user={pk}&page_size=2'.format(pk=self.users[0].pk))
+        self.assertEqual(len(page['results']), 2)
+        rest = self.get(page['next'])
+        self.assertEqual(len(rest['results']), 2)
+        self.assertIsNone(rest['next'])
+
+    def test_bad_parameters_are_rejected(self):
+        for query in ('user=x', 'page_size=x', 'cursor=garbage'):
+            self.assertEqual(list(self.get('/api/activity/?' + query, status_code=400)), [query.split('=')[0]])
+
+    def test_other_teams_are_denied(self):
+        self.get('/api/activity/?user={pk}'.format(pk=self.users[1].pk), status_code=403)
+
+
+class TypeaheadTests(ApiTestCase):
+
+    def test_typeahead(self):
+        Issue.objects.bulk_create(Issue(key=key) for key in ('SUM-1', 'SUM-10', 'SUM-2'))
+        self.assertEqual(self.get('/api/typeahead/issues/?q=SUM-1'), ['SUM-1', 'SUM-10'])
+        self.assertEqual(self.get('/api/typeahead/issues/?q=SUM&limit=2'), ['SUM-1', 'SUM-10'])
+        self.assertEqual(self.get('/api/typeahead/users/?q=user'), ['user0', 'user1'])
+
+    def test_bad_requests(self):
+        self.assertEqual(list(self.get('/api/typeahead/issues/?q=SUM&limit=x', status_code=400)), ['limit'])
+        self.assertEqual(self.client.get('/api/typeahead/teams/?q=Team').status_code, 404)
+
+
+class SearchTests(ApiTestCase):
+
+    def test_search(self):
+        Result.objects.create(result='Launch the rocket', objective=self.objectives[0])
+        Result.objects.create(result='Launch', objective=self.objectives[1])
+        hits = self.get('/api/search/?q=launch+rocket&kind=key_result&team={pk}'.format(pk=self.teams[0].pk))
+        self.assertEqual([(hit['kind'], hit['title']) for hit in hits],
+                         [(SearchPosting.KEY_RESULT, '{key} Launch the rocket'.format(
+                             key=Result.objects.get(result='Launch the rocket').get_key()))])
+        self.assertTrue(hits[0]['url'].startswith('http://testserver/objective/'))
+
+    def test_bad_parameters_are_rejected(self):
+        for query in ('quarter=x', 'team=x', 'limit=x', 'kind=teams'):
+            self.assertEqual(list(self.get('/api/search/?q=launch&' + query, status_code=400)), [query.split('=')[0]])
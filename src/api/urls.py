@@ -10,6 +10,7 @@ router.register(r'users', api.UserViewSet)
 router.register(r'global/objectives', api.GlobalObjectiveViewSet)
 router.register(r'global/keyresults', api.GlobalKeyResultViewSet)
 router.register(r'objectives', api.ObjectiveViewSet)
+router.register(r'profiles', api.ProfileViewSet, basename='profile')
 router.register(r'keyresults', api.KeyResultViewSet)
 router.register(r'teams', api.TeamViewSet)
 router.register(r'managers', api.ManagerViewSet)
@@ -17,6 +18,12 @@ router.register(r'managers', api.ManagerViewSet)
 urlpatterns = [
 
     # API
+    path('keyresults/bulk/', api.KeyResultBulk.as_view(), name='keyresult-bulk'),
+    path('keyresults/progress/', api.KeyResultProgress.as_view(), name='keyresult-progress'),
+    path('activity/', api.ActivityFeed.as_view(), name='activity'),
+    path('typeahead/<str:source>/', api.Typeahead.as_view(), name='typeahead'),
+    path('search/', api.Search.as_view(), name='search'),
+    path('cache/fragments/', api.FragmentCacheStats.as_view(), name='fragment-cache-stats'),
     path('', include(router.urls), name='index'),
 
     # team-detail.html
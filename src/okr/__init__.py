@@ -0,0 +1 @@
+default_app_config = 'okr.apps.OkrConfig'
@@ -0,0 +1,130 @@
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Activity, Objective, Result
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'activities'):
+        _state.activities = []
+        _state.request = None
+        _state.deleted_users = set()
+    return _state
+
+
+def begin(request):
+    """ Buffer activity until end() is called at the end of the request. """
+    state = _pending()
+    state.request = request
+    state.activities = []
+    state.deleted_users = set()
+
+
+def end():
+    """
+        Write the buffered activity.
+
+        Activity is only buffered once its transaction committed, so it is written even when the view fails
+        afterwards; the changes it describes are stored.
+    """
+    state = _pending()
+    try:
+        flush()
+    finally:
+        state.request = None
+
+
+def log(type, user_id, public=True, **data):
+    """
+        Queue one activity of user_id; data is stored as JSON.
+
+        Within a request (see ActivityMiddleware) activities are written with one bulk_create when the request ends
+        or once ACTIVITY_BUFFER_SIZE of them are waiting; anywhere else they are written straight away.
+    """
+    state = _pending()
+    if not user_id or user_id in state.deleted_users:
+        return
+
+    user = getattr(state.request, 'user', None)
+    if user is not None and user.is_authenticated:
+        data['actor'] = user.pk
+
+    entry = Activity(type=type, user_id=user_id, public=public, data=dumps(data))
+    # only buffered once the surrounding transaction commits, so rolled back changes leave no activity behind
+    transaction.on_commit(lambda: _buffer(entry))
+
+
+def _buffer(entry):
+    state = _pending()
+    state.activities.append(entry)
+    if state.request is None or len(state.activities) >= settings.ACTIVITY_BUFFER_SIZE:
+        flush()
+
+
+def flush():
+    state = _pending()
+    activities, state.activities = state.activities, []
+    if activities:
+        Activity.objects.bulk_create(activities, batch_size=settings.ACTIVITY_BUFFER_SIZE)
+
+
+def user_deleting(user_id):
+    """ Stop logging activity of a user whose deletion is cascading to their objectives and key results. """
+    _pending().deleted_users.add(user_id)
+
+
+def user_deleted(user_id):
+    _pending().deleted_users.discard(user_id)
+
+
+def dumps(data):
+    return json.dumps(data, sort_keys=True)
+
+
+# Objectives and key results
+
+def objective_data(objective):
+    return {'id': objective.pk, 'key': objective.get_key(), 'text': objective.objective}
+
+
+def key_result_data(result):
+    return {'id': result.pk, 'key': result.get_key() if result.pk else None, 'objective': result.objective_id,
+            'text': result.result, 'percentage': result.percentage}
+
+
+def objective_saved(objective, created):
+    log(Activity.CREATED_OBJECTIVE if created else Activity.MODIFIED_OBJECTIVE, objective.user_id,
+        **objective_data(objective))
+
+
+def objective_deleted(objective):
+    log(Activity.DELETED_OBJECTIVE, objective.user_id, **objective_data(objective))
+
+
+def key_result_saved(result, created, previous_percentage, user_id):
+    log(Activity.CREATED_KEY_RESULT if created else Activity.MODIFIED_KEY_RESULT, user_id, **key_result_data(result))
+    if result.is_complete() and (created or previous_percentage != result.percentage):
+        log(Activity.COMPLETED_KEY_RESULT, user_id, **key_result_data(result))
+
+
+def key_result_deleted(result, user_id):
+    log(Activity.DELETED_KEY_RESULT, user_id, **key_result_data(result))
+
+
+def completed(model, ids):
+    """ Log the objectives or key results the rollup has just brought to 100%. """
+    if not ids:
+        return
+
+    if model is Objective:
+        for objective in Objective.objects.filter(id__in=ids).only('id', 'user_id', 'objective'):
+            log(Activity.COMPLETED_OBJECTIVE, objective.user_id, **objective_data(objective))
+    elif model is Result:
+        for result in Result.objects.filter(id__in=ids).annotate(owner_id=F('objective__user_id')):
+            log(Activity.COMPLETED_KEY_RESULT, result.owner_id, **key_result_data(result))
@@ -60,6 +60,10 @@ class IssueAdmin(admin.ModelAdmin):
     list_filter = ('created', 'status', 'user')
 
 
+class JiraSyncAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'project', 'last_synced')
+
+
 class GlobalObjectiveAdmin(admin.ModelAdmin):
     list_display = ('id', 'created', 'objective', 'quarter', 'user')
     list_filter = ('created', 'quarter', 'user')
@@ -100,6 +104,50 @@ class ActivityAdmin(admin.ModelAdmin):
     list_filter = ('created', 'public', 'user')
 
 
+class ResultProgressAdmin(admin.ModelAdmin):
+    list_display = ('id', 'result', 'day', 'percentage')
+    list_filter = ('day',)
+    raw_id_fields = ('result',)
+
+
+class ResultProgressSeriesAdmin(admin.ModelAdmin):
+    list_display = ('id', 'result', 'quarter', 'step_days')
+    list_filter = ('quarter',)
+    raw_id_fields = ('result',)
+
+
+class ReportSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'team', 'quarter', 'percentage')
+    list_filter = ('created', 'team', 'quarter')
+
+
+class GlobalKeyResultSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'snapshot', 'global_key_result', 'percentage')
+    raw_id_fields = ('snapshot', 'global_key_result')
+
+
+class UserSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'snapshot', 'user', 'percentage', 'objectives')
+    raw_id_fields = ('snapshot', 'user')
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'name', 'key', 'status', 'attempts', 'run_after', 'leased_until', 'worker')
+    list_filter = ('created', 'status', 'name')
+    search_fields = ('name', 'key')
+
+
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job', 'name', 'worker', 'attempt', 'started', 'duration', 'outcome')
+    list_filter = ('started', 'outcome', 'name')
+    raw_id_fields = ('job',)
+
+
+class LeaseAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'holder', 'expires', 'last_tick')
+    search_fields = ('name', 'holder')
+
+
 def _register(model, admin_class):
     admin.site.register(model, admin_class)
 
@@ -109,8 +157,17 @@ _register(models.Team, TeamAdmin)
 _register(models.Manager, ManagerAdmin)
 _register(models.Profile, ProfileAdmin)
 _register(models.Issue, IssueAdmin)
+_register(models.JiraSync, JiraSyncAdmin)
 _register(models.GlobalObjective, GlobalObjectiveAdmin)
 _register(models.GlobalKeyResult, GlobalKeyResultAdmin)
 _register(models.Objective, ObjectiveAdmin)
 _register(models.Result, ResultAdmin)
+_register(models.ResultProgress, ResultProgressAdmin)
+_register(models.ResultProgressSeries, ResultProgressSeriesAdmin)
 _register(models.Activity, ActivityAdmin)
+_register(models.ReportSnapshot, ReportSnapshotAdmin)
+_register(models.GlobalKeyResultSnapshot, GlobalKeyResultSnapshotAdmin)
+_register(models.UserSnapshot, UserSnapshotAdmin)
+_register(models.Job, JobAdmin)
+_register(models.JobRun, JobRunAdmin)
+_register(models.Lease, LeaseAdmin)
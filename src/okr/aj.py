@@ -1,27 +1,155 @@
+import threading
+import time
 import warnings
 
+from django.conf import settings
 from jira.client import JIRA
+from jira.exceptions import JIRAError
+from requests.adapters import HTTPAdapter
+from requests import exceptions as requests_exceptions
 
 from .models import Issue
 
 
+class JiraUnavailable(Exception):
+    """ JIRA could not be reached, or the circuit breaker is open. """
+
+
+class CircuitBreaker(object):
+    """
+        Stops calling JIRA after repeated failures.
+
+        After failure_threshold consecutive failures the circuit opens and calls fail fast for reset_timeout
+        seconds; the first call after that is let through as a trial and closes the circuit again on success.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: let this call through, the next failure re-opens immediately
+                self.opened_at = None
+                self.failures = self.failure_threshold - 1
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class JiraClient(object):
+    """
+        Process-wide JIRA client.
+
+        Sessions are only opened on first use, one per read timeout, and their HTTP connections are kept alive
+        and shared between threads. Transient errors are retried with exponential backoff behind a circuit
+        breaker.
+    """
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(settings.JIRA_FAILURE_THRESHOLD, settings.JIRA_RESET_TIMEOUT)
+
+    @property
+    def jira(self):
+        return self.connection()
+
+    def connection(self, read_timeout=None):
+        read_timeout = read_timeout or settings.JIRA_READ_TIMEOUT
+        if read_timeout not in self._connections:
+            with self._lock:
+                if read_timeout not in self._connections:
+                    self._connections[read_timeout] = self.connect(read_timeout)
+        return self._connections[read_timeout]
+
+    @staticmethod
+    def connect(read_timeout):
+        if not settings.JIRA_USERNAME or not settings.JIRA_PASSWORD:
+            raise JiraUnavailable('Set JIRA_USERNAME and JIRA_PASSWORD in the environment.')
+
+        options = {
+            'server': settings.JIRA_SERVER,
+            'verify': settings.JIRA_VERIFY,
+        }
+        warnings.filterwarnings("ignore")
+        jira = JIRA(options=options, basic_auth=(settings.JIRA_USERNAME, settings.JIRA_PASSWORD),
+                    timeout=(settings.JIRA_CONNECT_TIMEOUT, read_timeout),
+                    max_retries=0, get_server_info=False)
+
+        # enough pooled keep-alive connections for the sync thread pool
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        jira._session.mount('http://', adapter)
+        jira._session.mount('https://', adapter)
+        return jira
+
+    def call(self, method, *args, retries=None, timeout=None, **kwargs):
+        """
+            Call method on the JIRA session. retries and timeout (the read timeout, in seconds) default to the
+            JIRA_MAX_RETRIES and JIRA_READ_TIMEOUT settings; callers inside a web request should lower both.
+        """
+        if retries is None:
+            retries = settings.JIRA_MAX_RETRIES
+        if not self.breaker.allow():
+            raise JiraUnavailable('JIRA circuit is open')
+
+        jira = self.connection(timeout)
+        for attempt in range(retries + 1):
+            try:
+                result = getattr(jira, method)(*args, **kwargs)
+            except (requests_exceptions.ConnectionError, requests_exceptions.Timeout, JIRAError) as e:
+                if isinstance(e, JIRAError) and not self.is_transient(e):
+                    raise
+                if attempt == retries:
+                    self.breaker.failure()
+                    raise JiraUnavailable('JIRA request failed: %s' % e) from e
+                time.sleep(settings.JIRA_RETRY_BACKOFF * 2 ** attempt)
+            else:
+                self.breaker.success()
+                return result
+
+    @staticmethod
+    def is_transient(error):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+
+    def search_issues(self, *args, **kwargs):
+        return self.call('search_issues', *args, **kwargs)
+
+
 class AJ(object):
     """
         Connection handling for Achieve and JIRA.
     """
 
+    _client = None
+    _client_lock = threading.Lock()
+
     def __init__(self):
-        try:
-            server = 'https://jira.cbs.europe.intranet:8081'
-            options = {
-                'server': server,
-                'verify': False,
-            }
-            warnings.filterwarnings("ignore")
-            self.jira = JIRA(options=options, basic_auth=('rb15jm', 'Apples11'))
-        except Exception as e:
-            self.jira = None
-            print("Failed to connect to JIRA: %s" % e)
+        self.jira = self.client()
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    cls._client = JiraClient()
+        return cls._client
 
     @staticmethod
     def get_priority(priority):
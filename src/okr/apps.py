@@ -6,3 +6,6 @@ class OkrConfig(AppConfig):
 
     class Meta:
         app_label = 'OKR'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,92 @@
+import hashlib
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.middleware.csrf import get_token
+from django.utils.decorators import method_decorator
+from django.utils.timezone import localtime, now
+from django.views.decorators.http import condition
+
+from .models import GlobalKeyResult, Issue, Objective, Profile, ReportSnapshot, Result, get_current_quarter
+
+
+def state(queryset, field='modified'):
+    """ (newest timestamp, row count) of a queryset; changes whenever a row is saved, added or removed. """
+    values = queryset.order_by().aggregate(latest=Max(field), count=Count('pk', distinct=True))
+    return values['latest'], values['count']
+
+
+def objectives_state(objectives):
+    """ State of the objectives together with their key results and linked issues. """
+    return [
+        state(objectives),
+        state(Result.objects.filter(objective__in=objectives)),
+        state(Issue.objects.filter(result__objective__in=objectives)),
+    ]
+
+
+def snapshot_state(team, quarter):
+    return state(ReportSnapshot.objects.filter(team=team, quarter=quarter), 'created')
+
+
+def conditional(validator):
+    """
+        Conditional GET for a class based view method.
+
+        validator(view_request, **kwargs) returns a list of values describing everything the page shows, typically
+        state() tuples. The ETag hashes them together with what the navigation shows about the signed in user, the
+        CSRF token the page's forms carry and the start of today, as charts run up to today. There is no
+        Last-Modified: a removed row or a new CSRF token doesn't move any timestamp, so only the ETag can tell.
+        Requests with pending flash messages are always rendered.
+    """
+
+    def get_state(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            roles = request.roles
+            request._conditional_state = [
+                request.user.pk, request.user.get_full_name(), roles.is_manager,
+                roles.team and (roles.team.pk, roles.team.name),
+                getattr(get_current_quarter(request), 'pk', None),
+                csrf_cookie(request), localtime(now()).replace(hour=0, minute=0, second=0, microsecond=0),
+            ] + list(validator(request, *args, **kwargs))
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            return None
+        return hashlib.sha1(repr(get_state(request, *args, **kwargs)).encode()).hexdigest()
+
+    return method_decorator(condition(etag_func=etag))
+
+
+def csrf_cookie(request):
+    # get_token() masks the token differently on every call; the cookie it comes from only changes on rotation
+    get_token(request)
+    return request.META['CSRF_COOKIE']
+
+
+def objective_list_state(request):
+    return objectives_state(Objective.objects.filter(user=request.user))
+
+
+def objective_detail_state(request, pk):
+    return objectives_state(Objective.objects.filter(pk=pk))
+
+
+def report_state(request):
+    return [snapshot_state(request.roles.team, get_current_quarter(request))]
+
+
+def report_global_key_result_state(request, pk):
+    team = request.roles.team
+    global_key_result = GlobalKeyResult.objects.filter(pk=pk)
+    objectives = Objective.objects.filter(user__profile__team=team, global_key_result=pk)
+    snapshots = snapshot_state(team, global_key_result.values('objective__quarter')[:1])
+    return [state(global_key_result), snapshots] + objectives_state(objectives)
+
+
+def report_user_state(request, pk):
+    team = request.roles.team
+    objectives = Objective.objects.filter(user__profile__team=team, user=pk)
+    profile = state(Profile.objects.filter(user=pk), 'last_updated')
+    return [profile, snapshot_state(team, get_current_quarter(request))] + objectives_state(objectives)
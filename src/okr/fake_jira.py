@@ -0,0 +1,148 @@
+import json
+import re
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+
+FIELDS = ['status', 'priority', 'issuetype', 'summary', 'assignee', 'updated', 'description', 'comment']
+KEYS_CLAUSE = re.compile(r'issuekey\s+in\s*\(([^)]*)\)', re.IGNORECASE)
+PROJECT_CLAUSE = re.compile(r'project\s*=\s*[\'"]?([\w-]+)', re.IGNORECASE)
+UPDATED_CLAUSE = re.compile(r'updated\s*>=\s*[\'"]([^\'"]+)', re.IGNORECASE)
+JIRA_DATETIME = '%Y-%m-%dT%H:%M:%S.000+0000'
+
+
+class FakeJira(object):
+    """
+        Minimal in-process JIRA REST server used to exercise and benchmark the issue sync offline.
+
+        Issues are plain dicts in the shape JIRA returns them ({'key': ..., 'fields': {...}}).
+    """
+
+    def __init__(self, issues=None):
+        self.issues = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        for issue in issues or []:
+            self.add(issue)
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                url = urlparse(self.path)
+                params = {key: ','.join(values) for key, values in parse_qs(url.query).items()}
+                status = 200
+
+                if url.path.endswith('/serverInfo'):
+                    body = {'baseUrl': fake.url, 'version': '7.6.0', 'versionNumbers': [7, 6, 0],
+                            'deploymentType': 'Server'}
+                elif url.path.endswith('/field'):
+                    body = [{'id': name, 'name': name} for name in FIELDS]
+                elif url.path.endswith('/search'):
+                    unknown = fake.unknown_keys(params)
+                    if unknown:
+                        # like JIRA, reject the whole query over the first key it doesn't know
+                        status = 400
+                        body = {'errorMessages': ["An issue with key '{key}' does not exist for field "
+                                                  "'issuekey'.".format(key=unknown[0])], 'errors': {}}
+                    else:
+                        body = fake.search(params)
+                else:
+                    self.send_error(404)
+                    return
+
+                payload = json.dumps(body).encode()
+                fake.bytes_sent += len(payload)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{port}'.format(port=self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @staticmethod
+    def issue(key, status='Open', priority='Low', type='Task', summary='', assignee=None, updated=None,
+              story_points=None, description=''):
+        return {
+            'key': key,
+            'fields': {
+                settings.JIRA_STORY_POINTS_FIELD: story_points,
+                'updated': (updated or datetime.utcnow()).strftime(JIRA_DATETIME),
+                'status': {'name': status},
+                'priority': {'name': priority},
+                'issuetype': {'name': type},
+                'summary': summary,
+                'assignee': {'name': assignee} if assignee else None,
+                'description': description,
+                'comment': {'comments': [], 'maxResults': 0, 'total': 0, 'startAt': 0},
+            },
+        }
+
+    def add(self, issue):
+        issue.setdefault('id', str(10000 + len(self.issues)))
+        self.issues[issue['key']] = issue
+
+    @staticmethod
+    def keys_of(params):
+        keys = KEYS_CLAUSE.search(params.get('jql', ''))
+        if keys is None:
+            return None
+        return [key.strip().strip('\'"') for key in keys.group(1).split(',')]
+
+    def unknown_keys(self, params):
+        return [key for key in self.keys_of(params) or [] if key not in self.issues]
+
+    def search(self, params):
+        matches = list(self.issues.values())
+
+        keys = self.keys_of(params)
+        if keys is not None:
+            wanted = set(keys)
+            matches = [issue for issue in matches if issue['key'] in wanted]
+
+        project = PROJECT_CLAUSE.search(params.get('jql', ''))
+        if project:
+            matches = [issue for issue in matches if issue['key'].rsplit('-', 1)[0] == project.group(1)]
+
+        updated = UPDATED_CLAUSE.search(params.get('jql', ''))
+        if updated:
+            since = datetime.strptime(updated.group(1).replace('-', '/'), '%Y/%m/%d %H:%M')
+            matches = [issue for issue in matches
+                       if datetime.strptime(issue['fields']['updated'], JIRA_DATETIME) >= since]
+
+        matches.sort(key=lambda issue: (issue['key'].rsplit('-', 1)[0], int(issue['key'].rsplit('-', 1)[1])))
+
+        start_at = int(params.get('startAt', 0))
+        max_results = int(params.get('maxResults', 50))
+        fields = params.get('fields', '*all').split(',')
+
+        return {
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(matches),
+            'issues': [self.render(issue, fields) for issue in matches[start_at:start_at + max_results]],
+        }
+
+    def render(self, issue, fields):
+        rendered = dict(issue, self='{url}/rest/api/2/issue/{id}'.format(url=self.url, id=issue['id']))
+        if '*all' not in fields:
+            rendered['fields'] = {name: value for name, value in issue['fields'].items() if name in fields}
+        return rendered
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
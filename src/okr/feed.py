@@ -0,0 +1,100 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Activity
+from .permissions import get_roles
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(activity):
+    value = '{created}|{id}'.format(created=activity.created.isoformat(), id=activity.id)
+    return urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor(cursor)
+    if created is None:
+        raise InvalidCursor(cursor)
+    return created, pk
+
+
+def activities(team=None, user=None, public=True):
+    """
+        Activity of a team or a single user, newest first.
+
+        A user's feed is read from the (user, created) index and a team's from the (public, created) index.
+    """
+    queryset = Activity.objects.select_related('user')
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if team is not None:
+        queryset = queryset.filter(user__profile__team=team)
+    if public:
+        queryset = queryset.filter(public=True)
+    return queryset
+
+
+def page(queryset, cursor=None, size=PAGE_SIZE):
+    """
+        One page of queryset after cursor; returns (activities, next_cursor).
+
+        The cursor is the (created, id) of the last row already shown, so every page is an index range scan that
+        costs the same however deep the reader has scrolled.
+    """
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+
+    rows = list(queryset.order_by('-created', '-id')[:size + 1])
+    return rows[:size], encode_cursor(rows[size - 1]) if len(rows) > size else None
+
+
+def team_page(team, cursor=None, size=PAGE_SIZE):
+    """ Like page() for a team's public feed; the first page is cached for ACTIVITY_FEED_CACHE_TTL seconds. """
+    if cursor:
+        return page(activities(team=team), cursor, size)
+
+    key = 'okr:activity-feed:{team}:{size}'.format(team=team.pk, size=size)
+    result = cache.get(key)
+    if result is None:
+        result = page(activities(team=team), size=size)
+        cache.set(key, result, settings.ACTIVITY_FEED_CACHE_TTL)
+    return result
+
+
+def read(viewer, member=None, cursor=None, size=PAGE_SIZE):
+    """
+        The page of the feed viewer may see: their team's public activity or, with member, that user's activity.
+
+        Members see each other's public activity; a user's private activity is only shown to them, their team's
+        managers and staff. Raises PermissionDenied for users outside the viewer's team.
+    """
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    roles = get_roles(viewer)
+
+    if member is None:
+        if roles.team is None:
+            return [], None
+        return team_page(roles.team, cursor, size)
+
+    team = get_roles(member).team
+    private = member == viewer or viewer.is_staff or roles.is_manager_of(team)
+    if not private and (team is None or team != roles.team):
+        raise PermissionDenied
+    return page(activities(user=member, public=not private), cursor, size)
@@ -2,8 +2,7 @@ import datetime
 
 from django import forms
 
-from .context_processors import get_current_quarter
-from .models import Objective, GlobalKeyResult, Result, Profile, Manager, GlobalObjective, Issue
+from .models import Objective, GlobalKeyResult, Result, Profile, Manager, GlobalObjective, Issue, get_current_quarter
 
 
 class ObjectiveFormCurrent(forms.ModelForm):
@@ -30,6 +29,22 @@ class ObjectiveFormCurrent(forms.ModelForm):
         self.fields['global_key_result'].queryset = queryset
 
 
+class IssueForm(forms.ModelForm):
+    class Meta:
+        model = Issue
+        fields = ('key',)
+
+    def clean_key(self):
+        key = self.cleaned_data['key'].strip()
+        if not key.startswith('SUM-'):
+            key = 'SUM-' + key
+        return key
+
+    def validate_unique(self):
+        # IssueCreate upserts on the key, so an issue that is already tracked is not an error
+        pass
+
+
 class ResultForm(forms.ModelForm):
     class Meta:
         model = Result
@@ -0,0 +1,83 @@
+import threading
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def version_key(model, pk):
+    return 'okr:version:{model}:{pk}'.format(model=model._meta.label_lower, pk=pk)
+
+
+def bump(model, ids):
+    """
+        Give the objects a new version, which invalidates every fragment rendered from them.
+
+        Versions are random rather than incremented, so a version lost to eviction can never come back with a value
+        an old fragment was stored under.
+    """
+    ids = {pk for pk in ids if pk}
+    if ids and settings.FRAGMENT_CACHE_ENABLED:
+        cache.set_many({version_key(model, pk): uuid4().hex for pk in ids}, timeout=None)
+
+
+def fetch(name, objects, render):
+    """
+        The fragment name rendered for objects, from the cache while none of the objects has been bumped.
+
+        Only one process renders a missing or outdated fragment at a time; the others serve the outdated copy if
+        there is one, or render without storing. Returns the rendered text.
+    """
+    if not settings.FRAGMENT_CACHE_ENABLED:
+        _count('uncached')
+        return render()
+
+    versioned = [version_key(type(obj), obj.pk) for obj in objects if isinstance(obj, Model)]
+    key = 'okr:fragment:{name}:{vary}'.format(name=name, vary=':'.join(
+        '{label}.{pk}'.format(label=obj._meta.label_lower, pk=obj.pk) if isinstance(obj, Model) else str(obj)
+        for obj in objects))
+
+    values = cache.get_many(versioned + [key])
+    missing = {version: uuid4().hex for version in versioned if version not in values}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        values.update(missing)
+    versions = tuple(values[version] for version in versioned)
+
+    cached = values.get(key)
+    if cached is not None and cached[0] == versions:
+        _count('hits')
+        return cached[1]
+
+    lock = key + ':lock'
+    if cache.add(lock, 1, settings.FRAGMENT_CACHE_LOCK_TIMEOUT):
+        try:
+            text = render()
+            cache.set(key, (versions, text), settings.FRAGMENT_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock)
+        _count('misses')
+        return text
+
+    if cached is not None:
+        _count('stale')
+        return cached[1]
+
+    _count('uncached')
+    return render()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def stats():
+    """ Fragment lookups of this process so far: hits, misses, stale copies served and uncached renders. """
+    with _stats_lock:
+        return {outcome: _stats[outcome] for outcome in ('hits', 'misses', 'stale', 'uncached')}
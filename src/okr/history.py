@@ -0,0 +1,176 @@
+import math
+from array import array
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils.timezone import localtime, now
+
+from .models import Quarter, Result, ResultProgress, ResultProgressSeries
+
+# closed quarters keep one value per week
+SERIES_STEP_DAYS = 7
+
+# keeps each IN (...) list well under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+
+def today():
+    return localtime(now()).date()
+
+
+def record(percentages):
+    """
+        Record {result_id: percentage} as of today.
+
+        Nothing is written for key results whose last recorded value is unchanged, and a second change on the same
+        day overwrites that day's row, so a key result has at most one row per day it actually moved.
+    """
+    day = today()
+    ids = [pk for pk in percentages if pk]
+    for start in range(0, len(ids), BATCH_SIZE):
+        _record({pk: percentages[pk] for pk in ids[start:start + BATCH_SIZE]}, day)
+
+
+def _record(percentages, day):
+    latest_day = (ResultProgress.objects.filter(result=OuterRef('result'), day__lte=day).order_by('-day')
+                  .values('day')[:1])
+    latest = {row.result_id: row for row in ResultProgress.objects.filter(result_id__in=percentages,
+                                                                          day=Subquery(latest_day))}
+
+    created, updated = [], []
+    for pk, percentage in percentages.items():
+        row = latest.get(pk)
+        if row is not None and row.percentage == percentage:
+            continue
+        if row is not None and row.day == day:
+            row.percentage = percentage
+            updated.append(row)
+        else:
+            created.append(ResultProgress(result_id=pk, day=day, percentage=percentage))
+
+    ResultProgress.objects.bulk_create(created)
+    ResultProgress.objects.bulk_update(updated, ['percentage'])
+
+
+def burn_up(results, quarter):
+    """
+        [(day, percentage), ...] for every day of the quarter up to today.
+
+        results is a Result queryset; each day averages the key results per objective and then the objectives, the
+        same way the rollup does. Key results without history count with their current value from the day they were
+        created. The history comes from one range query on the (result, day) index, or from the packed series once
+        the quarter has been compacted.
+    """
+    if quarter is None:
+        return []
+
+    end = min(quarter.end_date, today())
+    objectives, baseline = {}, {}
+    for pk, objective_id, created, percentage in results.values_list('id', 'objective_id', 'created', 'percentage'):
+        objectives[pk] = objective_id
+        baseline[pk] = [(localtime(created).date(), percentage)]
+
+    history = {}
+    if quarter.end_date < today():
+        history = {pk: unpack(quarter, packed, step_days) for pk, step_days, packed in
+                   ResultProgressSeries.objects.filter(result__in=results).values_list('result_id', 'step_days',
+                                                                                        'values')}
+
+    rows = {}
+    for pk, day, percentage in (ResultProgress.objects.filter(result__in=results, day__lte=end)
+                                .order_by('result_id', 'day').values_list('result_id', 'day', 'percentage')):
+        rows.setdefault(pk, []).append((day, percentage))
+
+    points = {pk: merge(history.get(pk, []), rows.get(pk, [])) or baseline[pk] for pk in baseline}
+
+    series = []
+    day = quarter.start_date
+    while day <= end:
+        by_objective = {}
+        for pk, result_points in points.items():
+            value = value_at(result_points, day)
+            if value is not None:
+                by_objective.setdefault(objectives[pk], []).append(value)
+        averages = [sum(values) / len(values) for values in by_objective.values()]
+        series.append((day, round(sum(averages) / len(averages), 2) if averages else None))
+        day += timedelta(days=1)
+
+    return series
+
+
+def merge(points, rows):
+    """ Sorted (day, value) points; rows win over points on the same day. """
+    merged = dict(points)
+    merged.update(rows)
+    return sorted(merged.items())
+
+
+def value_at(points, day):
+    """ The last value recorded on or before day, or None. """
+    value = None
+    for point_day, point_value in points:
+        if point_day > day:
+            break
+        value = point_value
+    return value
+
+
+def sample_days(quarter, step_days):
+    days = (quarter.end_date - quarter.start_date).days
+    return [min(quarter.start_date + timedelta(days=i * step_days), quarter.end_date)
+            for i in range(-(-days // step_days) + 1)]
+
+
+def pack(quarter, points, step_days=SERIES_STEP_DAYS):
+    values = [value_at(points, day) for day in sample_days(quarter, step_days)]
+    return array('f', [math.nan if value is None else value for value in values]).tobytes()
+
+
+def unpack(quarter, packed, step_days=SERIES_STEP_DAYS):
+    values = array('f')
+    values.frombytes(bytes(packed))
+    return [(day, round(value, 2)) for day, value in zip(sample_days(quarter, step_days), values)
+            if not math.isnan(value)]
+
+
+def compact(quarter):
+    """
+        Downsample a closed quarter: pack each key result's rows into a weekly ResultProgressSeries and delete them.
+
+        Safe to run repeatedly; rows written after an earlier run are merged into the existing series. The rows are
+        read and deleted in one transaction, by primary key, so a row recorded meanwhile is left for the next run.
+    """
+    results = Result.objects.filter(objective__global_key_result__objective__quarter=quarter)
+    with transaction.atomic():
+        read, rows = [], {}
+        for row_pk, pk, day, percentage in (ResultProgress.objects.filter(result__in=results)
+                                            .order_by('result_id', 'day')
+                                            .values_list('id', 'result_id', 'day', 'percentage')):
+            read.append(row_pk)
+            rows.setdefault(pk, []).append((day, percentage))
+        if not rows:
+            return 0
+
+        existing = ResultProgressSeries.objects.in_bulk(rows, field_name='result_id')
+        created, updated = [], []
+        for pk, result_rows in rows.items():
+            series = existing.get(pk)
+            if series is None:
+                created.append(ResultProgressSeries(result_id=pk, quarter=quarter, step_days=SERIES_STEP_DAYS,
+                                                    values=pack(quarter, result_rows)))
+            else:
+                series.values = pack(quarter, merge(unpack(quarter, series.values, series.step_days), result_rows))
+                series.step_days = SERIES_STEP_DAYS
+                updated.append(series)
+
+        ResultProgressSeries.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        ResultProgressSeries.objects.bulk_update(updated, ['values', 'step_days'], batch_size=BATCH_SIZE)
+        for start in range(0, len(read), BATCH_SIZE):
+            ResultProgress.objects.filter(pk__in=read[start:start + BATCH_SIZE]).delete()
+
+    return len(rows)
+
+
+def compact_closed_quarters():
+    return {quarter: compact(quarter) for quarter in Quarter.objects.filter(end_date__lt=today())}
@@ -0,0 +1,169 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from . import cron, snapshots
+from .aj import AJ
+from .models import Job, JobRun, Quarter, Team
+from .sync import apply_events, sync_issues
+
+# due jobs looked at per claim; another worker may win the race for any of them
+CLAIM_BATCH = 10
+
+# characters of a job's return value kept in its run history
+RESULT_LENGTH = 1000
+
+
+def sync_jira(full=False):
+    # unlike cron.update_issues this lets JiraUnavailable through, so the job is retried with backoff
+    return sync_issues(AJ().jira, full=full)
+
+
+def take_report_snapshot(team_id, quarter_id):
+    snapshot = snapshots.take_snapshot(Team.objects.get(pk=team_id), Quarter.objects.get(pk=quarter_id))
+    return {'snapshot': snapshot.id, 'percentage': snapshot.percentage}
+
+
+def apply_jira_issue(issue):
+    return apply_events([issue])
+
+
+TASKS = {
+    'apply_jira_issue': apply_jira_issue,
+    'sync_issues': sync_jira,
+    'update_percentages': cron.update_percentages,
+    'take_report_snapshots': cron.take_report_snapshots,
+    'take_report_snapshot': take_report_snapshot,
+    'prune_report_snapshots': cron.prune_report_snapshots,
+    'compact_progress_history': cron.compact_progress_history,
+}
+
+
+def worker_name():
+    return '{host}:{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+
+
+def enqueue(name, key='', delay=0, max_attempts=None, **kwargs):
+    """
+        Queue the task name to be called with kwargs, which have to be JSON serialisable.
+
+        While a job with the same key is still queued that job is returned instead of queueing another, so the
+        same work asked for repeatedly (or by every node) runs once.
+    """
+    if name not in TASKS:
+        raise ValueError('Unknown job {name!r}.'.format(name=name))
+
+    job = Job(name=name, key=key, kwargs=json.dumps(kwargs, sort_keys=True),
+              run_after=now() + timedelta(seconds=delay), max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS)
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        existing = Job.objects.filter(key=key, status=Job.QUEUED).first()
+        if existing is None:
+            # claimed by a worker in the meantime; this request needs a job of its own
+            return enqueue(name, key, delay, max_attempts, **kwargs)
+        return existing
+    return job
+
+
+def claim(worker):
+    """
+        Lease the next due job to worker, or None if nothing is due.
+
+        A job is due once its run_after has passed, or when the worker running it let its lease expire. The
+        claim is a conditional UPDATE on the attempt count, so of several workers racing for a job one wins.
+        Queued jobs wait while a job with their key is still running, so work on one key is applied in order.
+    """
+    current = now()
+    running = Job.objects.filter(status=Job.RUNNING, leased_until__gte=current).exclude(key='').values('key')
+    due = Job.objects.filter(Q(status=Job.QUEUED, run_after__lte=current) |
+                             Q(status=Job.RUNNING, leased_until__lt=current)).exclude(status=Job.QUEUED,
+                                                                                      key__in=running)
+
+    for job in due.order_by('run_after', 'id')[:CLAIM_BATCH]:
+        claimed = Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+            status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+            leased_until=current + timedelta(seconds=settings.JOB_LEASE))
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+    return None
+
+
+def run(job, worker):
+    """ Run a claimed job, then record the attempt and finish, retry or fail the job. Returns the JobRun. """
+    started = now()
+    start = time.perf_counter()
+    result, error = None, ''
+
+    if job.attempts > job.max_attempts:
+        error = 'Lease expired after the last attempt.'
+    else:
+        try:
+            with Heartbeat(job):
+                result = TASKS[job.name](**json.loads(job.kwargs))
+        except Exception:
+            error = traceback.format_exc()
+
+    outcome = JobRun.FAILED if error else JobRun.SUCCEEDED
+    history = JobRun.objects.create(job=job, name=job.name, worker=worker, attempt=job.attempts, started=started,
+                                    duration=time.perf_counter() - start, outcome=outcome,
+                                    result='' if result is None else str(result)[:RESULT_LENGTH], error=error)
+
+    # only the holder of the current lease may move the job on
+    current = Job.objects.filter(pk=job.pk, status=Job.RUNNING, attempts=job.attempts)
+    if not error:
+        current.update(status=Job.SUCCEEDED, finished=now(), leased_until=None, error='')
+    elif job.attempts < job.max_attempts:
+        try:
+            with transaction.atomic():
+                current.update(status=Job.QUEUED, run_after=now() + backoff(job.attempts), leased_until=None,
+                               error=error)
+        except IntegrityError:
+            current.update(status=Job.FAILED, finished=now(), leased_until=None,
+                           error='{error}\nNot retried, a newer job with its key is queued.'.format(error=error))
+    else:
+        current.update(status=Job.FAILED, finished=now(), leased_until=None, error=error)
+
+    return history
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX))
+
+
+class Heartbeat(object):
+    """ Keeps extending the lease of a running job, so a long job isn't mistaken for one whose worker died. """
+
+    def __init__(self, job):
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def beat(self):
+        try:
+            while not self.stopped.wait(settings.JOB_LEASE / 3):
+                Job.objects.filter(pk=self.job.pk, status=Job.RUNNING, attempts=self.job.attempts).update(
+                    leased_until=now() + timedelta(seconds=settings.JOB_LEASE))
+        finally:
+            # the heartbeat thread has its own database connection
+            connection.close()
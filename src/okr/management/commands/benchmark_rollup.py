@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localtime, now
+
+from okr import rollup
+from okr.cron import update_percentages
+from okr.models import GlobalKeyResult, GlobalObjective, Issue, Objective, Quarter, Result
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure the cost of one issue change against the full recompute as the dataset grows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 5000],
+                            help='Number of key results to generate for each run.')
+        parser.add_argument('--changes', type=int, default=20, help='Issue status changes measured per run.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>14} {:>14} {:>14}'.format('results', 'queries/change', 'ms/change', 'full ms'))
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    self.run(size, options['changes'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, size, changes):
+        issues = self.populate(size)
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for issue in issues[:changes]:
+                issue.status = not issue.status
+                issue.save()
+                rollup.flush()
+            elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        update_percentages()
+        full = time.perf_counter() - start
+
+        self.stdout.write('{:>8} {:>14.1f} {:>14.2f} {:>14.0f}'.format(
+            size, len(queries) / changes, elapsed * 1000 / changes, full * 1000))
+
+    @staticmethod
+    def populate(size):
+        today = localtime(now()).date()
+        user = User.objects.create(username='benchmark-rollup-{size}'.format(size=size))
+        quarter = Quarter.objects.create(name='QB', start_date=today, end_date=today)
+        global_objective = GlobalObjective.objects.create(objective='Benchmark', quarter=quarter, user=user)
+
+        global_key_results = GlobalKeyResult.objects.bulk_create(
+            GlobalKeyResult(objective=global_objective, key_result=str(i)) for i in range(max(size // 100, 1)))
+        global_key_results = list(GlobalKeyResult.objects.filter(objective=global_objective))
+
+        Objective.objects.bulk_create(
+            Objective(global_key_result=global_key_results[i % len(global_key_results)], user=user,
+                      objective=str(i)) for i in range(max(size // 4, 1)))
+        objectives = list(Objective.objects.filter(user=user))
+
+        Result.objects.bulk_create(
+            Result(objective=objectives[i % len(objectives)], result=str(i)) for i in range(size))
+        results = list(Result.objects.filter(objective__user=user))
+
+        Issue.objects.bulk_create(Issue(key='BENCH-{i}'.format(i=i), user=user) for i in range(size * 2))
+        issues = list(Issue.objects.filter(user=user))
+
+        Result.jira_issues.through.objects.bulk_create(
+            Result.jira_issues.through(result_id=results[i // 2].id, issue_id=issue.id)
+            for i, issue in enumerate(issues))
+
+        return issues
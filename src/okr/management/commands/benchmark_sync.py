@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from jira.client import JIRA
+
+from okr.fake_jira import FakeJira
+from okr.models import Issue
+from okr.sync import PAGE_SIZE, WORKERS, jira_fields, sync_issues
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Sync a generated set of issues against a local fake JIRA server and report throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=10000)
+        parser.add_argument('--workers', type=int, default=WORKERS)
+
+    def handle(self, *args, **options):
+        total = options['issues']
+        statuses = ['Open', 'In Progress', 'Done']
+        remote = [FakeJira.issue('SUM-{i}'.format(i=i), status=statuses[i % len(statuses)],
+                                 summary='Issue {i}'.format(i=i), assignee='benchmark-sync', story_points=i % 13,
+                                 description='Lorem ipsum dolor sit amet. ' * 40)
+                  for i in range(total)]
+
+        with FakeJira(remote) as fake:
+            jira = JIRA(options={'server': fake.url})
+            try:
+                with transaction.atomic():
+                    User.objects.create(username='benchmark-sync')
+                    Issue.objects.bulk_create((Issue(key=issue['key']) for issue in remote), ignore_conflicts=True)
+
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        stats = sync_issues(jira, full=True, workers=options['workers'])
+                        elapsed = time.perf_counter() - start
+
+                    raise Rollback
+            except Rollback:
+                pass
+
+            self.stdout.write('{issues} issues in {elapsed:.2f}s ({rate:.0f}/s), {queries} queries, '
+                              '{requests} JIRA requests, {kb:.0f} KB received'.format(
+                                  issues=stats['updated'], elapsed=elapsed, rate=stats['updated'] / elapsed,
+                                  queries=len(queries), requests=fake.requests, kb=fake.bytes_sent / 1024))
+
+            for label, fields in (('all fields', '*all'), ('mapped fields', jira_fields())):
+                sent = fake.bytes_sent
+                start = time.perf_counter()
+                jira.search_issues("project = 'SUM'", maxResults=PAGE_SIZE, fields=fields)
+                self.stdout.write('one page with {label}: {kb:.1f} KB, {ms:.1f} ms'.format(
+                    label=label, kb=(fake.bytes_sent - sent) / 1024, ms=(time.perf_counter() - start) * 1000))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from okr.cron import update_percentages
+
+
+class Command(BaseCommand):
+    help = 'Recompute every key result, objective and global key result percentage from scratch.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = update_percentages()
+        elapsed = time.perf_counter() - start
+
+        for level, (scanned, changed) in stats.items():
+            self.stdout.write('{level}: {scanned} scanned, {changed} changed'.format(
+                level=level.replace('_', ' '), scanned=scanned, changed=changed))
+        self.stdout.write(self.style.SUCCESS('Percentages rebuilt in {:.2f}s.'.format(elapsed)))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from okr.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index of objectives, key results, global key results and JIRA issues from scratch.'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = rebuild()
+        elapsed = time.perf_counter() - start
+
+        for kind, indexed in stats.items():
+            self.stdout.write('{kind}: {indexed} indexed'.format(kind=kind.replace('_', ' '), indexed=indexed))
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt in {:.2f}s.'.format(elapsed)))
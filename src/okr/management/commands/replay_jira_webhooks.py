@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from okr.sync import apply_events
+from okr.webhook import is_issue_event, newest
+
+
+class Command(BaseCommand):
+    help = 'Apply recorded JIRA webhook payloads (one JSON payload, or a list of them, per file).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+')
+
+    def handle(self, *args, **options):
+        issues = []
+        for path in options['files']:
+            with open(path) as payload_file:
+                payloads = json.load(payload_file)
+
+            for payload in payloads if isinstance(payloads, list) else [payloads]:
+                if is_issue_event(payload):
+                    issues.append(payload['issue'])
+
+        # the newest event of every issue, like the coalescing webhook jobs
+        stats = apply_events(newest(issues)) if issues else {}
+        self.stdout.write('{received} events, {fetched} distinct issues, {updated} updated, {completed} completed'
+                          .format(received=len(issues), fetched=stats.get('fetched', 0),
+                                  updated=stats.get('updated', 0), completed=stats.get('completed', 0)))
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from okr import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped; start one per worker process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no job is due.')
+        parser.add_argument('--poll', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds to wait before looking again when no job is due.')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        count = 0
+        try:
+            while True:
+                close_old_connections()
+                job = jobs.claim(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+
+                run = jobs.run(job, worker)
+                count += 1
+                self.stdout.write('{name} #{id} attempt {attempt}: {outcome} in {duration:.2f}s'.format(
+                    name=job.name, id=job.id, attempt=run.attempt, outcome=run.outcome, duration=run.duration))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('{worker} ran {count} jobs.'.format(worker=worker, count=count)))
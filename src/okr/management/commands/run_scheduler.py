@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.timezone import localtime, now
+
+from okr.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = 'Queue the periodic jobs of SCHEDULE; start one on every node, only the elected leader queues them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Take the current tick if this node is the leader, queue its jobs and exit.')
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler()
+        try:
+            while True:
+                close_old_connections()
+                for entry, event in scheduler.step():
+                    self.stdout.write('{time:%Y-%m-%d %H:%M} {entry}: {event}'.format(
+                        time=localtime(now()), entry=entry, event=event))
+                if options['once']:
+                    break
+                time.sleep(settings.SCHEDULER_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.stop()
+
+        self.stdout.write(self.style.SUCCESS('{holder} stopped.'.format(holder=scheduler.holder)))
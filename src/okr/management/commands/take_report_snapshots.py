@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from okr.cron import take_report_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Write a report snapshot of the current quarter for every managed team.'
+
+    def handle(self, *args, **options):
+        snapshots = take_report_snapshots()
+        for snapshot in snapshots:
+            self.stdout.write('{team}: {percentage}%'.format(team=snapshot.team, percentage=snapshot.percentage))
+        self.stdout.write(self.style.SUCCESS('{count} snapshots taken.'.format(count=len(snapshots))))
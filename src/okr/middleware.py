@@ -0,0 +1,29 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import activity
+from .permissions import get_roles
+
+
+class RolesMiddleware(object):
+    """ Exposes the signed in user's profile, team and managed teams as request.roles, loaded on first use. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
+
+
+class ActivityMiddleware(object):
+    """ Buffers the activity logged while a request is handled and writes it in one go at the end. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        activity.begin(request)
+        try:
+            return self.get_response(request)
+        finally:
+            activity.end()
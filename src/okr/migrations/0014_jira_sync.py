@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0013_auto_20180405_1531'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.CreateModel(
+            name='JiraSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('project', models.CharField(max_length=50, unique=True)),
+                ('last_synced', models.DateTimeField(verbose_name='Last Synced')),
+            ],
+            options={
+                'verbose_name': 'JIRA Sync',
+                'verbose_name_plural': 'JIRA Syncs',
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('okr', '0014_jira_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('percentage', models.FloatField(default=0)),
+                ('quarter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='report_snapshots', to='okr.Quarter')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                           related_name='report_snapshots', to='okr.Team')),
+            ],
+            options={
+                'verbose_name': 'Report Snapshot',
+                'verbose_name_plural': 'Report Snapshots',
+                'get_latest_by': 'created',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percentage', models.FloatField(default=0)),
+                ('objectives', models.IntegerField(default=0)),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='users',
+                                               to='okr.ReportSnapshot')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                           related_name='report_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Snapshot',
+                'verbose_name_plural': 'User Snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='GlobalKeyResultSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percentage', models.FloatField(default=0)),
+                ('global_key_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                        related_name='snapshots', to='okr.GlobalKeyResult')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='global_key_results', to='okr.ReportSnapshot')),
+            ],
+            options={
+                'verbose_name': 'Global Key Result Snapshot',
+                'verbose_name_plural': 'Global Key Result Snapshots',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0017_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultProgressSeries',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step_days', models.PositiveSmallIntegerField()),
+                ('values', models.BinaryField()),
+                ('quarter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                              related_name='progress_series', to='okr.Quarter')),
+                ('result', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE,
+                                                related_name='progress_series', to='okr.Result')),
+            ],
+            options={
+                'verbose_name': 'Key Result Progress Series',
+                'verbose_name_plural': 'Key Result Progress Series',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResultProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('percentage', models.FloatField()),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                             related_name='progress_history', to='okr.Result')),
+            ],
+            options={
+                'verbose_name': 'Key Result Progress',
+                'verbose_name_plural': 'Key Result Progress',
+                'unique_together': {('result', 'day')},
+            },
+        ),
+    ]
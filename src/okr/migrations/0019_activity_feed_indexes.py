@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0018_progress_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'created'], name='okr_activity_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['public', 'created'], name='okr_activity_public_created'),
+        ),
+    ]
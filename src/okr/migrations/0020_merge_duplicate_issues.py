@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+SYNCED_FIELDS = ['user_id', 'priority', 'status', 'type', 'summary', 'story_points', 'sync_hash']
+
+
+def merge_duplicate_issues(apps, schema_editor):
+    """
+        Fold every set of issues sharing a key into its oldest row, so the key can be made unique.
+
+        The oldest row keeps its id; it takes the JIRA fields of the most recently synced duplicate, and the key
+        result links of the others move over to it.
+    """
+    Issue = apps.get_model('okr', 'Issue')
+    Link = apps.get_model('okr', 'Result').jira_issues.through
+
+    keys = (Issue.objects.values('key').annotate(count=models.Count('id')).filter(count__gt=1)
+            .values_list('key', flat=True))
+    for key in keys:
+        issues = list(Issue.objects.filter(key=key).order_by('id'))
+        keeper, duplicates = issues[0], issues[1:]
+        duplicate_ids = [issue.id for issue in duplicates]
+
+        synced = [issue for issue in issues if issue.sync_hash]
+        source = max(synced, key=lambda issue: issue.modified) if synced else keeper
+        for field in SYNCED_FIELDS:
+            setattr(keeper, field, getattr(source, field))
+        if keeper.user_id is None:
+            keeper.user_id = next((issue.user_id for issue in issues if issue.user_id), None)
+        keeper.save()
+
+        linked = set(Link.objects.filter(issue_id=keeper.id).values_list('result_id', flat=True))
+        for link in Link.objects.filter(issue_id__in=duplicate_ids):
+            if link.result_id not in linked:
+                linked.add(link.result_id)
+                Link.objects.create(result_id=link.result_id, issue_id=keeper.id)
+        Issue.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0019_activity_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_issues, migrations.RunPython.noop),
+    ]
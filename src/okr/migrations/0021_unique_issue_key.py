@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0020_merge_duplicate_issues'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='issue',
+            name='key',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
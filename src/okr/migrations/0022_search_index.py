@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0021_unique_issue_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('kind', models.CharField(choices=[('objective', 'Objective'), ('key_result', 'Key Result'),
+                                                   ('global_key_result', 'Global Key Result'),
+                                                   ('issue', 'JIRA Issue')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Search Posting',
+                'verbose_name_plural': 'Search Postings',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['kind', 'object_id'], name='okr_searchposting_object'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchposting',
+            unique_together={('token', 'kind', 'object_id')},
+        ),
+    ]
@@ -0,0 +1,45 @@
+import re
+from collections import Counter
+
+from django.db import migrations
+
+# a copy of okr.models.tokenize, so this migration keeps working if that changes
+WORD = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+# kind: (model, indexed fields), as in okr.search.KINDS
+INDEXED = {
+    'objective': ('Objective', ('objective',)),
+    'key_result': ('Result', ('result',)),
+    'global_key_result': ('GlobalKeyResult', ('key_result',)),
+    'issue': ('Issue', ('key', 'summary')),
+}
+
+
+def build_search_index(apps, schema_editor):
+    SearchPosting = apps.get_model('okr', 'SearchPosting')
+
+    postings = []
+    for kind, (model_name, fields) in INDEXED.items():
+        for row in apps.get_model('okr', model_name).objects.values_list('id', *fields).iterator():
+            tokens = [token for token in WORD.findall(' '.join(row[1:]).lower()) if len(token) <= 50]
+            postings += [SearchPosting(token=token, kind=kind, object_id=row[0], count=count)
+                         for token, count in Counter(tokens).items()]
+            if len(postings) >= BATCH_SIZE:
+                SearchPosting.objects.bulk_create(postings)
+                postings = []
+    SearchPosting.objects.bulk_create(postings)
+
+
+def clear_search_index(apps, schema_editor):
+    apps.get_model('okr', 'SearchPosting').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0022_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_index, clear_search_index),
+    ]
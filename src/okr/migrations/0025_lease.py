@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('okr', '0024_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('holder', models.CharField(blank=True, max_length=100)),
+                ('expires', models.DateTimeField(blank=True, null=True)),
+                ('last_tick', models.DateTimeField(blank=True, help_text='The last scheduled tick taken under it.',
+                                                   null=True)),
+            ],
+            options={
+                'verbose_name': 'Lease',
+                'verbose_name_plural': 'Leases',
+            },
+        ),
+    ]
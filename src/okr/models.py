@@ -1,3 +1,5 @@
+import json
+import re
 from decimal import Decimal
 
 from django.contrib.auth.models import User
@@ -9,15 +11,38 @@ from django.utils.timezone import localtime, now
 from django_extensions.db import fields as extension_fields
 
 
-def get_current_quarter():
-    quarters = Quarter.objects.all()
-    this_current_quarter = None
+# (day, quarter) of the last lookup; cleared by the Quarter save/delete signals
+_current_quarter_cache = {}
 
-    for quarter in quarters:
-        if quarter.start_date <= localtime(now()).date() <= quarter.end_date:
-            this_current_quarter = quarter
+WORD = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = 50
 
-    return this_current_quarter
+
+def tokenize(text):
+    """ Lowercase words of text, as indexed and searched by okr.search. """
+    return [token for token in WORD.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+
+def get_current_quarter(request=None):
+    """ Quarter containing today, cached per process until the day changes and memoized per request. """
+    if request is not None and hasattr(request, '_current_quarter'):
+        return request._current_quarter
+
+    today = localtime(now()).date()
+    day, quarter = _current_quarter_cache.get('entry', (None, None))
+
+    if day != today:
+        quarter = Quarter.objects.filter(start_date__lte=today, end_date__gte=today).order_by('id').last()
+        _current_quarter_cache['entry'] = (today, quarter)
+
+    if request is not None:
+        request._current_quarter = quarter
+
+    return quarter
+
+
+def invalidate_current_quarter():
+    _current_quarter_cache.clear()
 
 
 @receiver(post_save, sender=User)
@@ -47,16 +72,32 @@ class Quarter(models.Model):
         return str(self.created.year) + self.name
 
 
+class TeamQuerySet(models.QuerySet):
+    def with_summary(self, user):
+        """ Annotate member_count, manager_username and managed_by_me (whether user manages the team). """
+        managers = Manager.objects.filter(team=models.OuterRef('pk'))
+        return self.annotate(
+            member_count=models.Count('team_user_set', distinct=True),
+            manager_username=models.Subquery(managers.order_by('id').values('manager__username')[:1]),
+            managed_by_me=models.Exists(managers.filter(manager=user)),
+        )
+
+
 class Team(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
 
     name = models.CharField(max_length=255)
 
+    objects = TeamQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     def total_members(self):
-        return len(Profile.objects.filter(team=self))
+        if hasattr(self, 'member_count'):
+            return self.member_count
+
+        return Profile.objects.filter(team=self).count()
 
     def get_members(self):
         return Profile.objects.filter(team=self)
@@ -75,6 +116,26 @@ class Manager(models.Model):
         return '{manager} - {team}'.format(manager=self.manager, team=self.team)
 
 
+class ProfileQuerySet(models.QuerySet):
+    def with_progress(self, quarter=None):
+        """
+            Annotate progress, the average of the member's objective percentages in the quarter (the current one
+            by default), and has_linked_issues, whether any of those objectives has a key result linked to JIRA.
+        """
+        quarter = quarter or get_current_quarter()
+        return self.annotate(
+            progress=models.Avg('user__objective_set__percentage',
+                                filter=models.Q(user__objective_set__global_key_result__objective__quarter=quarter)),
+            has_linked_issues=models.Exists(Result.jira_issues.through.objects.filter(
+                result__objective__user=models.OuterRef('user'),
+                result__objective__global_key_result__objective__quarter=quarter)),
+        )
+
+    def with_roles(self):
+        """ Annotate managing, whether the member manages any team. """
+        return self.annotate(managing=models.Exists(Manager.objects.filter(manager=models.OuterRef('user'))))
+
+
 class Profile(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
 
@@ -95,6 +156,8 @@ class Profile(models.Model):
     team = models.ForeignKey(Team, related_name='team_user_set', default=None, blank=True, null=True,
                              on_delete=models.CASCADE)
 
+    objects = ProfileQuerySet.as_manager()
+
     def __str__(self):
         return self.slug
 
@@ -103,34 +166,33 @@ class Profile(models.Model):
                                         global_key_result__objective__quarter=get_current_quarter())
 
     def get_percentage(self):
-        total_objectives = len(self.get_objectives())
-        total_percentage = 0
-
-        if total_objectives > 0:
-            for objective in self.get_objectives():
-                total_percentage += objective.percentage
-
-            return round(total_percentage / total_objectives, 2)
+        if hasattr(self, 'progress'):
+            return round(self.progress or 0, 2)
 
-        return 0
+        return round(self.get_objectives().aggregate(progress=models.Avg('percentage'))['progress'] or 0, 2)
 
     def has_jira_issues_connected(self):
-        count = 0
-        number_of_key_results = 0
-        for objective in self.get_objectives():
-            for keyresult in objective.get_key_results():
-                number_of_key_results += 1
-                if len(keyresult.jira_issues.all()) == 0:
-                    count += 1
-        return not count == number_of_key_results
+        if hasattr(self, 'has_linked_issues'):
+            return self.has_linked_issues
+
+        return Result.jira_issues.through.objects.filter(result__objective__in=self.get_objectives()).exists()
 
     def is_manager(self):
+        if hasattr(self, 'managed_team_ids'):
+            return bool(self.managed_team_ids)
+
+        if hasattr(self, 'managing'):
+            return self.managing
+
         return Manager.objects.filter(manager=self.user).exists()
 
     def get_managed_teams(self):
         return Manager.objects.filter(manager=self.user)
 
     def is_manager_of(self, team):
+        if hasattr(self, 'managed_team_ids'):
+            return getattr(team, 'pk', team) in self.managed_team_ids
+
         return Manager.objects.filter(manager=self.user, team=team).exists()
 
     def get_title(self):
@@ -147,6 +209,7 @@ class Profile(models.Model):
 
 class Issue(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
+    modified = models.DateTimeField(auto_now=True, editable=False, db_index=True)
 
     LOW = 'Low'
     MEDIUM = 'Medium'
@@ -172,12 +235,13 @@ class Issue(models.Model):
         (INCIDENT, INCIDENT),
     )
 
-    key = models.CharField(max_length=50)
+    key = models.CharField(max_length=50, unique=True)
     priority = models.CharField(max_length=10, choices=PRIORITY, default=LOW)
     status = models.BooleanField(default=False)
     summary = models.TextField(blank=True)
     type = models.CharField(max_length=20, choices=TYPE, default=TASK)
     story_points = models.IntegerField(default=0, verbose_name='Story Points')
+    sync_hash = models.CharField(max_length=40, blank=True, editable=False)
 
     user = models.ForeignKey(User, default=None, null=True, related_name='user_issue_set', on_delete=models.CASCADE)
 
@@ -185,17 +249,38 @@ class Issue(models.Model):
         return '{key} - {summary}'.format(key=self.key, summary=self.summary)
 
     def get_linked_key_results(self):
-        return Result.objects.filter(jira_issues__key__contains=self.key)
+        return Result.objects.filter(jira_issues=self).select_related('objective')
+
+    def tokenize(self):
+        return tokenize('{key} {summary}'.format(key=self.key, summary=self.summary))
 
     def tmp_status(self):
         if self.summary:
             return False
         return True
 
+    def get_project(self):
+        return self.key.rsplit('-', 1)[0]
 
-class GlobalObjective(models.Model):
+
+class JiraSync(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
 
+    project = models.CharField(max_length=50, unique=True)
+    last_synced = models.DateTimeField(verbose_name='Last Synced')
+
+    class Meta:
+        verbose_name = 'JIRA Sync'
+        verbose_name_plural = 'JIRA Syncs'
+
+    def __str__(self):
+        return '{project} - {last_synced}'.format(project=self.project, last_synced=self.last_synced)
+
+
+class GlobalObjective(models.Model):
+    created = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
+    modified = models.DateTimeField(auto_now=True, editable=False, db_index=True)
+
     objective = models.TextField(help_text="This is the overall objective eg. Be ITRIC Compliant.")
     quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE)
 
@@ -226,11 +311,12 @@ class GlobalObjective(models.Model):
 
 
 class GlobalKeyResult(models.Model):
-    created = models.DateTimeField(auto_now_add=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
+    modified = models.DateTimeField(auto_now=True, editable=False, db_index=True)
 
     objective = models.ForeignKey(GlobalObjective, on_delete=models.CASCADE)
     key_result = models.TextField(verbose_name='Key Result')
-    percentage = models.FloatField(default=0)
+    percentage = models.FloatField(default=0, db_index=True)
 
     class Meta:
         verbose_name = 'Global Key Result'
@@ -239,6 +325,9 @@ class GlobalKeyResult(models.Model):
     def __str__(self):
         return u'%s' % self.key_result
 
+    def tokenize(self):
+        return tokenize(self.key_result)
+
     def get_user_objectives(self):
         return Objective.objects.filter(global_key_result=self)
 
@@ -272,14 +361,31 @@ class GlobalKeyResult(models.Model):
         return 'GRST-' + str(obj_id)
 
 
+class ObjectiveQuerySet(models.QuerySet):
+    def for_quarter(self, quarter=None):
+        return self.filter(global_key_result__objective__quarter=quarter or get_current_quarter())
+
+    def with_progress(self):
+        """ Annotate has_linked_issues and the key result counts is_complete reads. """
+        return self.annotate(
+            total_key_results=models.Count('result'),
+            completed_key_results=models.Count('result', filter=models.Q(result__percentage=100)),
+            has_linked_issues=models.Exists(Result.jira_issues.through.objects.filter(
+                result__objective=models.OuterRef('pk'))),
+        )
+
+
 class Objective(models.Model):
-    created = models.DateTimeField(auto_now_add=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
+    modified = models.DateTimeField(auto_now=True, editable=False, db_index=True)
 
     global_key_result = models.ForeignKey(GlobalKeyResult, on_delete=models.CASCADE, related_name='okr',
                                           verbose_name='Global Key Result')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='objective_set')
     objective = models.TextField(help_text="This is your objective you would like to submit.")
-    percentage = models.FloatField(default=0)
+    percentage = models.FloatField(default=0, db_index=True)
+
+    objects = ObjectiveQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'User Objective'
@@ -288,6 +394,9 @@ class Objective(models.Model):
     def __str__(self):
         return u'{user} - {objective}'.format(user=self.user.username, objective=self.objective)
 
+    def tokenize(self):
+        return tokenize(self.objective)
+
     def get_key_results(self):
         objects = Result.objects.filter(objective=self)
         return objects
@@ -304,6 +413,9 @@ class Objective(models.Model):
         return True
 
     def is_complete(self):
+        if hasattr(self, 'total_key_results'):
+            return self.total_key_results > 0 and self.completed_key_results == self.total_key_results
+
         status = False
         if len(self.get_key_results()) > 0:
             status = True
@@ -323,14 +435,15 @@ class Objective(models.Model):
 
 
 class Result(models.Model):
-    created = models.DateTimeField(auto_now_add=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
+    modified = models.DateTimeField(auto_now=True, editable=False, db_index=True)
 
     objective = models.ForeignKey(Objective, on_delete=models.CASCADE)
     result = models.TextField(help_text="This is your key result related to your objective.")
     jira_issues = models.ManyToManyField(Issue, blank=True, verbose_name='JIRA Issues')
     manual_bar = models.BooleanField(default=False, verbose_name='Manual Progress Bar',
                                      help_text=' If you select this, DO NOT select any jira_issues.')
-    percentage = models.FloatField(default=0)
+    percentage = models.FloatField(default=0, db_index=True)
 
     class Meta:
         verbose_name = 'User Key Result'
@@ -340,7 +453,7 @@ class Result(models.Model):
         return u'{user} - {result}'.format(user=self.objective.user.username, result=self.result)
 
     def tokenize(self):
-        return self.result.lower().split(' ')
+        return tokenize(self.result)
 
     def is_complete(self):
         if self.percentage == 100:
@@ -384,6 +497,41 @@ class Result(models.Model):
         return 'RST-' + str(obj_id)
 
 
+class ResultProgress(models.Model):
+    """ A key result's percentage as of a day; rows are only written on days the value changed. """
+    result = models.ForeignKey(Result, related_name='progress_history', on_delete=models.CASCADE)
+    day = models.DateField()
+    percentage = models.FloatField()
+
+    class Meta:
+        verbose_name = 'Key Result Progress'
+        verbose_name_plural = 'Key Result Progress'
+        unique_together = ('result', 'day')
+
+    def __str__(self):
+        return '{result} - {day} - {percentage}'.format(result=self.result_id, day=self.day, percentage=self.percentage)
+
+
+class ResultProgressSeries(models.Model):
+    """
+        Downsampled progress of a key result over a closed quarter.
+
+        values packs one float32 per step_days from the quarter's start date (NaN before the key result existed),
+        replacing the ResultProgress rows once the quarter is over.
+    """
+    result = models.OneToOneField(Result, related_name='progress_series', on_delete=models.CASCADE)
+    quarter = models.ForeignKey(Quarter, related_name='progress_series', on_delete=models.CASCADE)
+    step_days = models.PositiveSmallIntegerField()
+    values = models.BinaryField()
+
+    class Meta:
+        verbose_name = 'Key Result Progress Series'
+        verbose_name_plural = 'Key Result Progress Series'
+
+    def __str__(self):
+        return '{result} - {quarter}'.format(result=self.result_id, quarter=self.quarter)
+
+
 class Activity(models.Model):
     MODIFIED_OBJECTIVE = 'Modified Objective'
     MODIFIED_KEY_RESULT = 'Modified Key Result'
@@ -417,10 +565,184 @@ class Activity(models.Model):
     class Meta:
         verbose_name = 'Activity'
         verbose_name_plural = 'Activities'
+        indexes = [
+            models.Index(fields=['user', 'created'], name='okr_activity_user_created'),
+            models.Index(fields=['public', 'created'], name='okr_activity_public_created'),
+        ]
 
     def __str__(self):
         return str(self.type)
 
+    def get_data(self):
+        """ The structured data of the activity; rows written before it was JSON only have their text. """
+        try:
+            data = json.loads(self.data)
+        except ValueError:
+            data = None
+        return data if isinstance(data, dict) else {'text': self.data}
+
+    def get_summary(self):
+        data = self.get_data()
+        return ' '.join(str(data[field]) for field in ('key', 'text') if data.get(field))
+
+
+class SearchPosting(models.Model):
+    """ One entry of the search index: token appears count times in the text of one object. """
+    OBJECTIVE = 'objective'
+    KEY_RESULT = 'key_result'
+    GLOBAL_KEY_RESULT = 'global_key_result'
+    ISSUE = 'issue'
+
+    KINDS = (
+        (OBJECTIVE, 'Objective'),
+        (KEY_RESULT, 'Key Result'),
+        (GLOBAL_KEY_RESULT, 'Global Key Result'),
+        (ISSUE, 'JIRA Issue'),
+    )
+
+    token = models.CharField(max_length=MAX_TOKEN_LENGTH)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Search Posting'
+        verbose_name_plural = 'Search Postings'
+        unique_together = ('token', 'kind', 'object_id')
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='okr_searchposting_object'),
+        ]
+
+    def __str__(self):
+        return '{token} - {kind} {object_id}'.format(token=self.token, kind=self.kind, object_id=self.object_id)
+
+
+class ReportSnapshot(models.Model):
+    created = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
+
+    team = models.ForeignKey(Team, related_name='report_snapshots', on_delete=models.CASCADE)
+    quarter = models.ForeignKey(Quarter, related_name='report_snapshots', on_delete=models.CASCADE)
+    percentage = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = 'Report Snapshot'
+        verbose_name_plural = 'Report Snapshots'
+        get_latest_by = 'created'
+
+    def __str__(self):
+        return '{team} - {quarter} - {created}'.format(team=self.team, quarter=self.quarter, created=self.created)
+
+    def previous(self):
+        return ReportSnapshot.objects.filter(team=self.team_id, quarter=self.quarter_id,
+                                             created__lt=self.created).order_by('-created').first()
+
+
+class GlobalKeyResultSnapshot(models.Model):
+    snapshot = models.ForeignKey(ReportSnapshot, related_name='global_key_results', on_delete=models.CASCADE)
+    global_key_result = models.ForeignKey(GlobalKeyResult, related_name='snapshots', on_delete=models.CASCADE)
+    percentage = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = 'Global Key Result Snapshot'
+        verbose_name_plural = 'Global Key Result Snapshots'
+
+
+class UserSnapshot(models.Model):
+    snapshot = models.ForeignKey(ReportSnapshot, related_name='users', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='report_snapshots', on_delete=models.CASCADE)
+    percentage = models.FloatField(default=0)
+    objectives = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'User Snapshot'
+        verbose_name_plural = 'User Snapshots'
+
+
+class Job(models.Model):
+    """ A unit of background work, run by the job worker (see okr.jobs). """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    created = models.DateTimeField(auto_now_add=True, editable=False)
+
+    name = models.CharField(max_length=100)
+    kwargs = models.TextField(default='{}')
+    key = models.CharField(max_length=200, blank=True, help_text="Only one job per key is queued at a time.")
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=now)
+    leased_until = models.DateTimeField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='okr_job_status_run_after'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='queued') & ~models.Q(key=''),
+                                    name='okr_job_queued_key'),
+        ]
+
+    def __str__(self):
+        return '{name} #{id} ({status})'.format(name=self.name, id=self.id, status=self.status)
+
+
+class JobRun(models.Model):
+    """ One attempt at running a job. """
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    OUTCOMES = (
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+
+    job = models.ForeignKey(Job, related_name='runs', on_delete=models.CASCADE)
+    name = models.CharField(max_length=100)
+    worker = models.CharField(max_length=100)
+    attempt = models.PositiveIntegerField()
+    started = models.DateTimeField(db_index=True)
+    duration = models.FloatField(help_text="Seconds.")
+    outcome = models.CharField(max_length=10, choices=OUTCOMES)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Job Run'
+        verbose_name_plural = 'Job Runs'
+
+    def __str__(self):
+        return '{name} {started} ({outcome})'.format(name=self.name, started=self.started, outcome=self.outcome)
+
+
+class Lease(models.Model):
+    """ A named lock held by one node until it expires (see okr.scheduler). """
+    name = models.CharField(max_length=100, unique=True)
+    holder = models.CharField(max_length=100, blank=True)
+    expires = models.DateTimeField(blank=True, null=True)
+    last_tick = models.DateTimeField(blank=True, null=True, help_text="The last scheduled tick taken under it.")
+
+    class Meta:
+        verbose_name = 'Lease'
+        verbose_name_plural = 'Leases'
+
+    def __str__(self):
+        return '{name} - {holder}'.format(name=self.name, holder=self.holder)
+
 
 class Poker(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
@@ -1,13 +1,55 @@
+from .models import Manager, Profile, User
+
+
+class Roles(object):
+    """ The user's profile, team and managed team ids, loaded once and shared by the permission checks. """
+
+    def __init__(self, user):
+        self.profile = None
+        self.managed_team_ids = frozenset()
+
+        if user.is_authenticated:
+            if User.profile.is_cached(user):
+                self.profile = user.profile
+            else:
+                self.profile = Profile.objects.select_related('team').filter(user=user).first()
+            self.managed_team_ids = frozenset(Manager.objects.filter(manager=user).values_list('team_id', flat=True))
+
+        if self.profile is not None:
+            # user.profile, Profile.is_manager() and Profile.is_manager_of() are answered from here from now on
+            self.profile.managed_team_ids = self.managed_team_ids
+            user.profile = self.profile
+
+    @property
+    def team(self):
+        return self.profile.team if self.profile is not None else None
+
+    @property
+    def is_manager(self):
+        return bool(self.managed_team_ids)
+
+    def is_manager_of(self, team):
+        return team is not None and team.pk in self.managed_team_ids
+
+
+def get_roles(user):
+    """ Roles of the user, cached on the user object and therefore on the request it belongs to. """
+    if getattr(user, '_roles', None) is None:
+        user._roles = Roles(user)
+    return user._roles
+
+
 def is_manager_or_staff(user):
-    return True if user.profile.is_manager() or user.is_staff else False
+    return True if user.is_staff or get_roles(user).is_manager else False
 
 
 def is_manager_or_staff_or_in_team(user, team):
-    return True if user.profile.is_manager() or user.is_staff or user.profile.team == team else False
+    roles = get_roles(user)
+    return True if user.is_staff or roles.is_manager or roles.team == team else False
 
 
 def is_manager_of_team_or_staff(user, team):
-    return True if user.profile.is_manager_of(team) or user.is_staff else False
+    return True if user.is_staff or get_roles(user).is_manager_of(team) else False
 
 
 def is_owner_of_objective(user, objective):
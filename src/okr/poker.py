@@ -1,7 +1,10 @@
 import json
 
+from django.conf import settings
+from jira.exceptions import JIRAError
+
 from api.serializers import IssueSerializer
-from .aj import AJ
+from .aj import AJ, JiraUnavailable
 from .models import Issue
 
 
@@ -28,15 +31,22 @@ class Poker:
         # TODO: Augment JQL to incorporate SCRUM teams
         jql = "project = 'SUM'"
 
-        object_list = self.jira_con.jira.search_issues(jql)
-        issues = []
-
-        for o in object_list:
-            # TODO: Complete arguments
-            issue, created = Issue.objects.get_or_create(key=o.key, defaults={})
-            issues.append(issue)
-
-        self.issues = issues
+        try:
+            object_list = self.jira_con.jira.search_issues(jql, fields='summary', retries=0,
+                                                           timeout=settings.JIRA_POKER_READ_TIMEOUT)
+        except (JiraUnavailable, JIRAError):
+            # serve what the last sync stored rather than hold the request on a slow JIRA or fail it on a refusal
+            self.issues = list(Issue.objects.filter(key__startswith='SUM-'))
+            return IssueSerializer(self.issues, many=True).data
+
+        # one insert for the issues we have not seen yet and one select for all of them, instead of a
+        # get_or_create round trip per issue
+        keys = [o.key for o in object_list]
+        Issue.objects.bulk_create([Issue(key=o.key, summary=getattr(o.fields, 'summary', '') or '')
+                                   for o in object_list], ignore_conflicts=True)
+        issues = Issue.objects.in_bulk(keys, field_name='key')
+
+        self.issues = [issues[key] for key in keys]
         return IssueSerializer(self.issues, many=True).data
 
     def assign_story_points(self, issue, card_value):
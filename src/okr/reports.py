@@ -0,0 +1,32 @@
+from collections import OrderedDict
+
+from django.db.models import Prefetch
+
+from .models import Objective, Result
+
+
+def team_objectives(team):
+    """ Objectives of a team with their user, global key result and key results loaded up front. """
+    return (Objective.objects.filter(user__profile__team=team)
+            .select_related('user', 'global_key_result')
+            .prefetch_related(Prefetch('result_set', queryset=Result.objects.order_by('id'), to_attr='key_results'))
+            .order_by('user__username', 'id'))
+
+
+def group_objectives(objectives, key):
+    tree = OrderedDict()
+    for objective in objectives:
+        tree.setdefault(key(objective), []).append(objective)
+    return list(tree.items())
+
+
+def global_key_result_report(team, global_key_result):
+    """ [(user, [objective, ...]), ...] for every team member working towards the global key result. """
+    return group_objectives(team_objectives(team).filter(global_key_result=global_key_result),
+                            lambda objective: objective.user)
+
+
+def user_report(team, user):
+    """ [(global_key_result, [objective, ...]), ...] for one team member. """
+    return group_objectives(team_objectives(team).filter(user=user).order_by('global_key_result_id', 'id'),
+                            lambda objective: objective.global_key_result)
@@ -0,0 +1,165 @@
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, FloatField, Q, Value, When
+from django.utils.timezone import now
+
+from . import activity, fragments, history
+from .models import GlobalKeyResult, Objective, Result
+
+# rows per UPDATE; each takes three bound parameters, which keeps a statement under SQLite's limit of 999
+UPDATE_BATCH_SIZE = 300
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'results'):
+        _state.results = set()
+        _state.objectives = set()
+        _state.global_key_results = set()
+    return _state
+
+
+def _schedule():
+    # once per transaction: a rolled back transaction takes its callback with it, and the ids it marked are
+    # simply recomputed by the next flush
+    if not any(callback is flush for savepoints, callback in connection.run_on_commit):
+        transaction.on_commit(flush)
+
+
+def mark_results(result_ids):
+    """ Mark key results (and therefore their objective chain) as needing recomputation. """
+    result_ids = {pk for pk in result_ids if pk}
+    if result_ids:
+        _pending().results.update(result_ids)
+        _schedule()
+
+
+def mark_objectives(objective_ids):
+    objective_ids = {pk for pk in objective_ids if pk}
+    if objective_ids:
+        _pending().objectives.update(objective_ids)
+        _schedule()
+
+
+def mark_global_key_results(global_key_result_ids):
+    global_key_result_ids = {pk for pk in global_key_result_ids if pk}
+    if global_key_result_ids:
+        _pending().global_key_results.update(global_key_result_ids)
+        _schedule()
+
+
+def mark_issues(issue_ids):
+    """ Mark every key result linked to the given issues. """
+    issue_ids = {pk for pk in issue_ids if pk}
+    if issue_ids:
+        mark_results(Result.jira_issues.through.objects.filter(issue_id__in=issue_ids)
+                     .values_list('result_id', flat=True))
+
+
+def flush():
+    """ Recompute every dirty row, walking up Result -> Objective -> GlobalKeyResult. """
+    state = _pending()
+    result_ids, state.results = state.results, set()
+    objective_ids, state.objectives = state.objectives, set()
+    global_key_result_ids, state.global_key_results = state.global_key_results, set()
+
+    if result_ids:
+        recompute_results(result_ids)
+        objective_ids |= set(Result.objects.filter(id__in=result_ids).values_list('objective_id', flat=True))
+
+    if objective_ids:
+        recompute_objectives(objective_ids)
+        global_key_result_ids |= set(Objective.objects.filter(id__in=objective_ids)
+                                     .values_list('global_key_result_id', flat=True))
+
+    if global_key_result_ids:
+        recompute_global_key_results(global_key_result_ids)
+
+    # the UPDATEs above bypass post_save, so cached fragments showing these rows are invalidated here
+    fragments.bump(Result, result_ids)
+    fragments.bump(Objective, objective_ids)
+    fragments.bump(GlobalKeyResult, global_key_result_ids)
+
+
+def recompute_all():
+    """ Recompute every row with set-based queries; returns (scanned, changed) per level. """
+    return {
+        'results': recompute_results(),
+        'objectives': recompute_objectives(),
+        'global_key_results': recompute_global_key_results(),
+    }
+
+
+def recompute_results(result_ids=None):
+    rows = _scope(Result, result_ids).annotate(
+        total_issues=Count('jira_issues'),
+        completed_issues=Count('jira_issues', filter=Q(jira_issues__status=True)),
+    ).values_list('id', 'percentage', 'total_issues', 'completed_issues')
+
+    updates = {}
+    scanned = 0
+    for pk, percentage, total_issues, completed_issues in rows.iterator():
+        scanned += 1
+        # manual progress bars have no issues and keep whatever was set by hand
+        if total_issues > 0:
+            new_percentage = round(completed_issues / total_issues, 2) * 100
+            if new_percentage != percentage:
+                updates.setdefault(new_percentage, []).append(pk)
+
+    changed = _write(Result, updates)
+    history.record({pk: percentage for percentage, ids in updates.items() for pk in ids})
+    activity.completed(Result, updates.get(100.0))
+    return scanned, changed
+
+
+def recompute_objectives(objective_ids=None):
+    return _recompute_average(_scope(Objective, objective_ids), 'result')
+
+
+def recompute_global_key_results(global_key_result_ids=None):
+    return _recompute_average(_scope(GlobalKeyResult, global_key_result_ids), 'okr')
+
+
+def _scope(model, ids):
+    if ids is None:
+        return model.objects.all()
+    return model.objects.filter(id__in=ids)
+
+
+def _recompute_average(queryset, children):
+    rows = queryset.annotate(
+        total_children=Count(children),
+        average_percentage=Avg('{children}__percentage'.format(children=children)),
+    ).values_list('id', 'percentage', 'total_children', 'average_percentage')
+
+    updates = {}
+    scanned = 0
+    for pk, percentage, total_children, average_percentage in rows.iterator():
+        scanned += 1
+        if total_children > 0:
+            new_percentage = round(average_percentage, 2)
+            if new_percentage != percentage:
+                updates.setdefault(new_percentage, []).append(pk)
+
+    changed = _write(queryset.model, updates)
+    if queryset.model is Objective:
+        activity.completed(Objective, updates.get(100.0))
+    return scanned, changed
+
+
+def _write(model, updates):
+    """ Write every changed row of a level with one UPDATE ... CASE per UPDATE_BATCH_SIZE rows. """
+    changed = 0
+    modified = now()
+    rows = [(pk, percentage) for percentage, ids in updates.items() for pk in ids]
+    for start in range(0, len(rows), UPDATE_BATCH_SIZE):
+        batch = rows[start:start + UPDATE_BATCH_SIZE]
+        changed += model.objects.filter(id__in=[pk for pk, percentage in batch]).update(
+            percentage=Case(*[When(id=pk, then=Value(percentage)) for pk, percentage in batch],
+                            output_field=FloatField()),
+            modified=modified)
+        fragments.bump(model, [pk for pk, percentage in batch])
+
+    return changed
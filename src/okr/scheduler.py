@@ -0,0 +1,145 @@
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.timezone import localtime, now
+
+from . import jobs
+from .models import Job, Lease
+
+LEADER = 'scheduler'
+
+# minute, hour, day of month, month, day of week (0 is Sunday)
+FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+@lru_cache()
+def parse(expression):
+    """ The values each field of a five-field cron expression matches, e.g. '*/5 * * * *' or '0 9 * * 1-5'. """
+    fields = expression.split()
+    if len(fields) != len(FIELDS):
+        raise ValueError('{expression!r} is not a five-field cron expression.'.format(expression=expression))
+    return tuple(_values(field, low, high) for field, (low, high) in zip(fields, FIELDS))
+
+
+def _values(field, low, high):
+    values = set()
+    for part in field.split(','):
+        span, _, step = part.partition('/')
+        if span == '*':
+            start, end = low, high
+        elif '-' in span:
+            start, end = (int(value) for value in span.split('-', 1))
+        else:
+            start = int(span)
+            end = high if step else start
+        if not low <= start <= end <= high:
+            raise ValueError('{part!r} is out of range {low}-{high}.'.format(part=part, low=low, high=high))
+        values.update(range(start, end + 1, int(step or 1)))
+    return frozenset(values)
+
+
+def matches(expression, moment):
+    """ Whether a cron expression is due at moment; unlike cron, day of month and day of week must both match. """
+    minutes, hours, days, months, weekdays = parse(expression)
+    return (moment.minute in minutes and moment.hour in hours and moment.day in days and moment.month in months
+            and moment.isoweekday() % 7 in weekdays)
+
+
+def acquire(name, holder, seconds, tick=None, renew=False):
+    """
+        Take the lease name for seconds; True if holder has it now.
+
+        A lease is free once it has expired or been released. With renew, holder may also extend a lease it
+        already has. With tick, the lease is only taken if nobody took it for that tick or a later one yet.
+    """
+    current = now()
+    Lease.objects.get_or_create(name=name)
+
+    available = Q(expires__isnull=True) | Q(expires__lt=current)
+    if renew:
+        available |= Q(holder=holder)
+    leases = Lease.objects.filter(available, name=name)
+    values = {'holder': holder, 'expires': current + timedelta(seconds=seconds)}
+    if tick is not None:
+        leases = leases.filter(Q(last_tick__isnull=True) | Q(last_tick__lt=tick))
+        values['last_tick'] = tick
+
+    return leases.update(**values) == 1
+
+
+def release(name, holder):
+    Lease.objects.filter(name=name, holder=holder).update(expires=None)
+
+
+def lease_name(entry):
+    return 'schedule:{entry}'.format(entry=entry)
+
+
+class Scheduler(object):
+    """
+        Queues the jobs of the SCHEDULE on whichever node holds the scheduler lease; `run_jobs` workers run them.
+
+        Every node may run a scheduler; the others stand by and take over once the leader's lease expires, and
+        catch up on the ticks since the last one its predecessor took (up to SCHEDULER_CATCH_UP). Each entry is
+        queued under a lease of its own taken once per tick, so it's queued on one node per tick, with the entry's
+        name as job key. A tick is skipped while the entry's previous job is still queued or running.
+    """
+
+    def __init__(self, holder=None, schedule=None):
+        self.holder = holder or jobs.worker_name()
+        self.schedule = settings.SCHEDULE if schedule is None else schedule
+        for entry, expression, task, kwargs in self.schedule:
+            parse(expression)
+            if task not in jobs.TASKS:
+                raise ValueError('Unknown job {task!r} scheduled as {entry!r}.'.format(task=task, entry=entry))
+
+        self.last_minute = None
+
+    def step(self, moment=None):
+        """ One pass of the scheduler loop; returns the (entry, 'queued' or 'skipped') of every tick it took. """
+        if not acquire(LEADER, self.holder, settings.SCHEDULER_LEASE, renew=True):
+            self.last_minute = None
+            return []
+
+        minute = (moment or now()).replace(second=0, microsecond=0)
+        tick = self.first_tick(minute) if self.last_minute is None else self.last_minute + timedelta(minutes=1)
+        events = []
+        while tick <= minute:
+            events += self.tick(tick)
+            tick += timedelta(minutes=1)
+        self.last_minute = minute
+        Lease.objects.filter(name=LEADER, holder=self.holder).update(last_tick=minute)
+        return events
+
+    def first_tick(self, minute):
+        """ Where a new leader starts: after the last minute a leader got through, or now if none did lately. """
+        last_tick = Lease.objects.filter(name=LEADER).values_list('last_tick', flat=True).first()
+        if last_tick is None:
+            return minute
+        return max(last_tick + timedelta(minutes=1), minute - timedelta(seconds=settings.SCHEDULER_CATCH_UP))
+
+    def tick(self, minute):
+        events = []
+        for entry, expression, task, kwargs in self.schedule:
+            if not matches(expression, localtime(minute)):
+                continue
+
+            name = lease_name(entry)
+            if not acquire(name, self.holder, settings.SCHEDULER_LEASE, tick=minute):
+                # another node took this tick
+                continue
+            try:
+                if Job.objects.filter(key=name, status__in=(Job.QUEUED, Job.RUNNING)).exists():
+                    events.append((entry, 'skipped'))
+                else:
+                    jobs.enqueue(task, key=name, **kwargs)
+                    events.append((entry, 'queued'))
+            finally:
+                release(name, self.holder)
+        return events
+
+    def stop(self):
+        """ Hand leadership over straight away. """
+        release(LEADER, self.holder)
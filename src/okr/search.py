@@ -0,0 +1,149 @@
+import math
+from collections import Counter, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.urls import reverse
+
+from .models import GlobalKeyResult, Issue, Objective, Result, SearchPosting, tokenize
+
+LIMIT = 20
+MAX_LIMIT = 100
+BATCH_SIZE = 500
+
+Hit = namedtuple('Hit', ['kind', 'label', 'object', 'title', 'url', 'score'])
+LABELS = dict(SearchPosting.KINDS)
+
+
+class Kind(object):
+    """ How one indexed model is loaded, scoped to a quarter or team, and shown. """
+
+    def __init__(self, model, fields, quarter, team, select_related, title, url):
+        self.model = model
+        self.fields = fields
+        self.quarter = quarter
+        self.team = team
+        self.select_related = select_related
+        self.title = title
+        self.url = url
+
+    def scope(self, quarter=None, team=None):
+        """ Ids in scope as a subquery, or None when nothing narrows this kind down. """
+        filters = {}
+        if quarter is not None and self.quarter:
+            filters[self.quarter] = quarter
+        if team is not None:
+            filters[self.team] = team
+        return self.model.objects.filter(**filters).values('id') if filters else None
+
+
+KINDS = {
+    SearchPosting.OBJECTIVE: Kind(
+        Objective, ('objective',), 'global_key_result__objective__quarter', 'user__profile__team', ('user',),
+        lambda objective: '{key} {text}'.format(key=objective.get_key(), text=objective.objective),
+        lambda objective: reverse('okr:objective-detail', args=[objective.pk])),
+    SearchPosting.KEY_RESULT: Kind(
+        Result, ('result',), 'objective__global_key_result__objective__quarter', 'objective__user__profile__team',
+        ('objective',),
+        lambda result: '{key} {text}'.format(key=result.get_key(), text=result.result),
+        lambda result: reverse('okr:objective-detail', args=[result.objective_id])),
+    SearchPosting.GLOBAL_KEY_RESULT: Kind(
+        GlobalKeyResult, ('key_result',), 'objective__quarter', 'objective__user__manager__team', ('objective',),
+        lambda key_result: '{key} {text}'.format(key=key_result.get_key(), text=key_result.key_result),
+        lambda key_result: reverse('okr:report-gkr-detail', args=[key_result.pk])),
+    # issues are not tied to a quarter, so a quarter scope leaves them in
+    SearchPosting.ISSUE: Kind(
+        Issue, ('key', 'summary'), None, 'user__profile__team', (),
+        lambda issue: str(issue),
+        lambda issue: reverse('okr:issue-detail', args=[issue.pk])),
+}
+MODELS = {kind.model: name for name, kind in KINDS.items()}
+
+
+# Indexing
+
+def text_of(instance):
+    """ The indexed fields of instance; read from __dict__ so deferred fields are not fetched. """
+    return tuple(instance.__dict__.get(field) for field in KINDS[MODELS[type(instance)]].fields)
+
+
+def index(instances):
+    """ Replace the postings of the given instances of one indexed model; two queries per batch. """
+    instances = [instance for instance in instances if instance.pk]
+    if not instances:
+        return
+
+    kind = MODELS[type(instances[0])]
+    for start in range(0, len(instances), BATCH_SIZE):
+        batch = instances[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            SearchPosting.objects.filter(kind=kind, object_id__in=[instance.pk for instance in batch]).delete()
+            SearchPosting.objects.bulk_create(
+                SearchPosting(token=token, kind=kind, object_id=instance.pk, count=count)
+                for instance in batch for token, count in Counter(instance.tokenize()).items())
+
+
+def unindex(model, ids):
+    SearchPosting.objects.filter(kind=MODELS[model], object_id__in=ids).delete()
+
+
+def rebuild():
+    """ Index every object from scratch; returns {kind: objects indexed}. """
+    SearchPosting.objects.all().delete()
+    stats = {}
+    for name, kind in KINDS.items():
+        instances = list(kind.model.objects.all())
+        index(instances)
+        stats[name] = len(instances)
+    return stats
+
+
+# Querying
+
+def search(query, quarter=None, team=None, kinds=None, limit=LIMIT):
+    """
+        Objects whose text contains any word of query, best first.
+
+        Hits are ranked by how many distinct query words they contain, then by the sum of each word's count weighted
+        by how rare it is among the query words (1 + log(most common / this word's document frequency)). Everything
+        is answered from the (token, kind, object_id) index: one query for the document frequencies, one for the
+        ranked postings in scope, and one per kind of hit to load the objects.
+    """
+    tokens = set(tokenize(query))
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    if not tokens or not kinds:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    postings = SearchPosting.objects.filter(token__in=tokens, kind__in=kinds)
+    frequencies = dict(postings.values_list('token').annotate(frequency=Count('id')).order_by())
+    if not frequencies:
+        return []
+    most_common = max(frequencies.values())
+    weight = Case(*[When(token=token, then=Value(1 + math.log(most_common / frequency)))
+                    for token, frequency in frequencies.items()], output_field=FloatField())
+
+    in_scope = Q()
+    for name in kinds:
+        ids = KINDS[name].scope(quarter, team)
+        in_scope |= Q(kind=name, object_id__in=ids) if ids is not None else Q(kind=name)
+
+    ranked = (postings.filter(in_scope).values('kind', 'object_id')
+              .annotate(matched=Count('token'), score=Sum(F('count') * weight, output_field=FloatField()))
+              .order_by('-matched', '-score', 'kind', '-object_id')[:limit])
+    ranked = list(ranked)
+
+    objects = {}
+    for name in {row['kind'] for row in ranked}:
+        kind = KINDS[name]
+        objects[name] = kind.model.objects.select_related(*kind.select_related).in_bulk(
+            [row['object_id'] for row in ranked if row['kind'] == name])
+
+    hits = []
+    for row in ranked:
+        instance = objects[row['kind']].get(row['object_id'])
+        if instance is not None:
+            kind = KINDS[row['kind']]
+            hits.append(Hit(row['kind'], LABELS[row['kind']], instance, kind.title(instance), kind.url(instance),
+                            round(row['score'], 3)))
+    return hits
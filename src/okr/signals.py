@@ -0,0 +1,234 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from . import activity, fragments, history, rollup, search, typeahead
+from .models import (
+    GlobalKeyResult, GlobalObjective, Issue, Objective, Quarter, ReportSnapshot, Result, User,
+    invalidate_current_quarter,
+)
+
+
+# Current quarter
+
+@receiver(post_save, sender=Quarter)
+@receiver(post_delete, sender=Quarter)
+def quarter_changed(sender, **kwargs):
+    invalidate_current_quarter()
+
+
+# Progress rollup
+
+@receiver(post_init, sender=Issue)
+def remember_issue_status(sender, instance, **kwargs):
+    instance._rollup_status = instance.status
+
+
+@receiver(post_save, sender=Issue)
+def issue_saved(sender, instance, created, **kwargs):
+    if not created and instance.status != instance._rollup_status:
+        rollup.mark_issues([instance.id])
+    instance._rollup_status = instance.status
+
+
+@receiver(pre_delete, sender=Issue)
+def issue_deleted(sender, instance, **kwargs):
+    rollup.mark_issues([instance.id])
+
+
+@receiver(m2m_changed, sender=Result.jira_issues.through)
+def result_issues_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+
+    if reverse:
+        # instance is an Issue; on clear pk_set is empty so collect the links before they go
+        if action == 'pre_clear':
+            rollup.mark_issues([instance.id])
+            result_ids = Result.jira_issues.through.objects.filter(issue_id=instance.id).values('result_id')
+        elif pk_set:
+            rollup.mark_results(pk_set)
+            result_ids = pk_set
+        else:
+            return
+    elif action != 'pre_clear':
+        rollup.mark_results([instance.id])
+        result_ids = [instance.id]
+    else:
+        return
+
+    # linking or unlinking issues changes what a key result shows, so it counts as a modification
+    Result.objects.filter(id__in=result_ids).update(modified=now())
+
+
+@receiver(post_save, sender=Result)
+def result_saved(sender, instance, created, **kwargs):
+    rollup.mark_results([instance.id])
+    if created or instance.percentage != instance._history_percentage:
+        history.record({instance.id: instance.percentage})
+    activity.key_result_saved(instance, created, instance._history_percentage, instance.objective.user_id)
+    instance._history_percentage = instance.percentage
+
+
+@receiver(post_init, sender=Result)
+def remember_result_percentage(sender, instance, **kwargs):
+    instance._history_percentage = instance.percentage
+
+
+@receiver(post_delete, sender=Result)
+def result_deleted(sender, instance, **kwargs):
+    rollup.mark_objectives([instance.objective_id])
+    activity.key_result_deleted(instance, instance.objective.user_id)
+
+
+@receiver(post_init, sender=Objective)
+def remember_objective_global_key_result(sender, instance, **kwargs):
+    instance._rollup_global_key_result_id = instance.global_key_result_id
+
+
+@receiver(post_save, sender=Objective)
+def objective_saved(sender, instance, created, **kwargs):
+    rollup.mark_global_key_results([instance.global_key_result_id, instance._rollup_global_key_result_id])
+    instance._rollup_global_key_result_id = instance.global_key_result_id
+    activity.objective_saved(instance, created)
+
+
+@receiver(post_delete, sender=Objective)
+def objective_deleted(sender, instance, **kwargs):
+    rollup.mark_global_key_results([instance.global_key_result_id])
+    activity.objective_deleted(instance)
+
+
+# Activity
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # the cascade deletes the user's objectives and key results; activity of theirs could not be stored any more
+    activity.user_deleting(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    activity.user_deleted(instance.id)
+
+
+# Fragment cache
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def result_changed(sender, instance, **kwargs):
+    fragments.bump(Result, [instance.id])
+    fragments.bump(Objective, [instance.objective_id])
+
+
+@receiver(post_save, sender=Objective)
+@receiver(post_delete, sender=Objective)
+def objective_changed(sender, instance, **kwargs):
+    fragments.bump(Objective, [instance.id])
+    fragments.bump(GlobalKeyResult, [instance.global_key_result_id])
+
+
+@receiver(post_save, sender=GlobalKeyResult)
+@receiver(post_delete, sender=GlobalKeyResult)
+def global_key_result_changed(sender, instance, **kwargs):
+    fragments.bump(GlobalKeyResult, [instance.id])
+    fragments.bump(GlobalObjective, [instance.objective_id])
+
+
+@receiver(post_save, sender=GlobalObjective)
+@receiver(post_delete, sender=GlobalObjective)
+def global_objective_changed(sender, instance, **kwargs):
+    fragments.bump(GlobalObjective, [instance.id])
+
+
+@receiver(post_save, sender=GlobalKeyResult)
+@receiver(pre_delete, sender=GlobalKeyResult)
+def global_key_result_reported(sender, instance, **kwargs):
+    # reports show the live key result text next to the snapshot percentages
+    fragments.bump(ReportSnapshot, ReportSnapshot.objects.filter(
+        global_key_results__global_key_result=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=GlobalObjective)
+@receiver(pre_delete, sender=GlobalObjective)
+def global_objective_reported(sender, instance, **kwargs):
+    fragments.bump(ReportSnapshot, ReportSnapshot.objects.filter(
+        global_key_results__global_key_result__objective=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Issue)
+def issue_changed(sender, instance, created, **kwargs):
+    # status changes reach the fragments through the rollup; this catches edits to the key itself, and has to run
+    # before issue_key_saved below moves _typeahead_key on
+    if not created and instance.__dict__.get('key') != instance._typeahead_key:
+        result_ids = list(Result.jira_issues.through.objects.filter(issue_id=instance.id)
+                          .values_list('result_id', flat=True))
+        fragments.bump(Result, result_ids)
+        fragments.bump(Objective, Result.objects.filter(id__in=result_ids).values_list('objective_id', flat=True))
+
+
+# Search index
+
+@receiver(post_init, sender=Objective)
+@receiver(post_init, sender=Result)
+@receiver(post_init, sender=GlobalKeyResult)
+@receiver(post_init, sender=Issue)
+def remember_search_text(sender, instance, **kwargs):
+    instance._search_text = search.text_of(instance)
+
+
+@receiver(post_save, sender=Objective)
+@receiver(post_save, sender=Result)
+@receiver(post_save, sender=GlobalKeyResult)
+@receiver(post_save, sender=Issue)
+def search_text_saved(sender, instance, created, **kwargs):
+    text = search.text_of(instance)
+    if created or text != instance._search_text:
+        search.index([instance])
+    instance._search_text = text
+
+
+@receiver(post_delete, sender=Objective)
+@receiver(post_delete, sender=Result)
+@receiver(post_delete, sender=GlobalKeyResult)
+@receiver(post_delete, sender=Issue)
+def search_text_deleted(sender, instance, **kwargs):
+    search.unindex(sender, [instance.pk])
+
+
+# Typeahead
+
+@receiver(post_init, sender=Issue)
+@receiver(post_init, sender=User)
+def remember_typeahead_key(sender, instance, **kwargs):
+    # read from __dict__ so instances loaded with only() or defer() don't fetch the field
+    instance._typeahead_key = instance.__dict__.get('key' if sender is Issue else 'username')
+
+
+@receiver(post_save, sender=Issue)
+def issue_key_saved(sender, instance, created, **kwargs):
+    key = instance.__dict__.get('key')
+    if key is not None and (created or key != instance._typeahead_key):
+        typeahead.INDEXES['issues'].discard(instance._typeahead_key)
+        typeahead.INDEXES['issues'].add(key)
+        instance._typeahead_key = key
+
+
+@receiver(post_delete, sender=Issue)
+def issue_key_deleted(sender, instance, **kwargs):
+    typeahead.INDEXES['issues'].discard(instance._typeahead_key)
+
+
+@receiver(post_save, sender=User)
+def username_saved(sender, instance, **kwargs):
+    username = instance.__dict__.get('username')
+    if username is not None:
+        typeahead.INDEXES['users'].discard(instance._typeahead_key)
+        if not instance.is_staff:
+            typeahead.INDEXES['users'].add(username)
+        instance._typeahead_key = username
+
+
+@receiver(post_delete, sender=User)
+def username_deleted(sender, instance, **kwargs):
+    typeahead.INDEXES['users'].discard(instance._typeahead_key)
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max
+from django.db.models.functions import TruncDate
+from django.utils.timezone import now
+
+from .models import (GlobalKeyResult, GlobalKeyResultSnapshot, Manager, Objective, Profile, ReportSnapshot, Team,
+                     UserSnapshot, get_current_quarter)
+
+
+def take_snapshot(team, quarter):
+    """
+        Write the team's current progress for the quarter into the snapshot tables.
+
+        One row per global key result set by the team's managers and one row per member, so report pages
+        never have to aggregate the live Objective and Result tables.
+    """
+    objectives = Objective.objects.filter(user__profile__team=team, global_key_result__objective__quarter=quarter)
+    managers = Manager.objects.filter(team=team).values('manager')
+
+    with transaction.atomic():
+        snapshot = ReportSnapshot.objects.create(
+            team=team, quarter=quarter, percentage=round(objectives.aggregate(avg=Avg('percentage'))['avg'] or 0, 2))
+
+        GlobalKeyResultSnapshot.objects.bulk_create(
+            GlobalKeyResultSnapshot(snapshot=snapshot, global_key_result_id=pk, percentage=percentage)
+            for pk, percentage in GlobalKeyResult.objects.filter(objective__user__in=managers,
+                                                                 objective__quarter=quarter)
+            .values_list('id', 'percentage'))
+
+        progress = {row['user']: row for row in objectives.values('user').annotate(
+            average=Avg('percentage'), total=Count('id'))}
+        UserSnapshot.objects.bulk_create(
+            UserSnapshot(snapshot=snapshot, user_id=user_id, percentage=round(progress[user_id]['average'], 2),
+                         objectives=progress[user_id]['total']) if user_id in progress
+            else UserSnapshot(snapshot=snapshot, user_id=user_id)
+            for user_id in Profile.objects.filter(team=team).values_list('user_id', flat=True))
+
+    return snapshot
+
+
+def take_snapshots(quarter=None):
+    """ Snapshot every managed team for the quarter (the current one by default). """
+    quarter = quarter or get_current_quarter()
+    if quarter is None:
+        return []
+    return [take_snapshot(team, quarter) for team in Team.objects.filter(manager__isnull=False).distinct()]
+
+
+def latest_snapshot(team, quarter):
+    """ Newest snapshot of the team for the quarter, or None until the schedule or a refresh has taken one. """
+    if team is None or quarter is None:
+        return None
+    return ReportSnapshot.objects.filter(team=team, quarter=quarter).order_by('-created', '-id').first()
+
+
+def prune_snapshots():
+    """
+        Thin out snapshots older than REPORT_SNAPSHOT_RETENTION days to the newest one of each team, quarter and
+        day, so the hourly snapshots don't pile up. Returns the number of snapshots deleted.
+    """
+    old = ReportSnapshot.objects.filter(created__lt=now() - timedelta(days=settings.REPORT_SNAPSHOT_RETENTION))
+    kept = old.annotate(day=TruncDate('created')).values('team', 'quarter', 'day').annotate(newest=Max('id'))
+    _, per_model = old.exclude(id__in=[row['newest'] for row in kept]).delete()
+    return per_model.get(ReportSnapshot._meta.label, 0)
+
+
+def compare(snapshot, previous):
+    """
+        Rows of the snapshot grouped for the report page, each with a delta against the previous snapshot.
+
+        Returns ([(global_objective, [global_key_result_snapshot, ...]), ...], [user_snapshot, ...]).
+    """
+    earlier_global_key_results, earlier_users = {}, {}
+    if previous is not None:
+        earlier_global_key_results = dict(previous.global_key_results.values_list('global_key_result_id', 'percentage'))
+        earlier_users = dict(previous.users.values_list('user_id', 'percentage'))
+
+    global_objectives = []
+    for row in snapshot.global_key_results.select_related('global_key_result__objective__quarter').order_by(
+            'global_key_result__objective_id', 'global_key_result_id'):
+        row.delta = _delta(row.percentage, earlier_global_key_results.get(row.global_key_result_id))
+        objective = row.global_key_result.objective
+        if not global_objectives or global_objectives[-1][0] != objective:
+            global_objectives.append((objective, []))
+        global_objectives[-1][1].append(row)
+
+    users = list(snapshot.users.select_related('user').order_by('user__username'))
+    for row in users:
+        row.delta = _delta(row.percentage, earlier_users.get(row.user_id))
+
+    return global_objectives, users
+
+
+def _delta(percentage, earlier):
+    return None if earlier is None else round(percentage - earlier, 2)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.timezone import localtime, now
+from jira.exceptions import JIRAError
+import pytz
+
+from . import activity, rollup, search
+from .aj import AJ
+from .models import Activity, Issue, JiraSync
+
+PAGE_SIZE = 100
+WORKERS = 4
+
+# issuekey in (...) lists are sent in the query string, so they are kept short
+KEYS_PER_QUERY = 200
+
+# JQL only has minute precision and JIRA's clock may drift from ours
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# sync_hash of issues JIRA doesn't know; the incremental sync stops asking for them, the full sync still does
+MISSING = 'missing'
+
+SYNCED_FIELDS = ['user', 'priority', 'status', 'type', 'summary', 'story_points']
+STATS = ('fetched', 'updated', 'unchanged', 'completed', 'errors', 'missing')
+
+
+def jira_fields():
+    """ The only JIRA fields map_issue reads; everything else is left out of the search response. """
+    return ['assignee', 'priority', 'status', 'issuetype', 'summary', settings.JIRA_STORY_POINTS_FIELD]
+
+
+def sync_issues(jira, full=False, page_size=PAGE_SIZE, workers=WORKERS):
+    """
+        Refresh tracked issues from JIRA.
+
+        A full sync asks JIRA for every open issue we track, by key. An incremental sync only asks for issues
+        updated since each project's watermark, plus issues that have never been synced. Pages are fetched
+        concurrently on a bounded thread pool, then the calling thread applies them in order, each with one
+        bulk_update, inside one transaction: a page that fails to load leaves nothing applied. Keys JIRA doesn't
+        know are counted as missing and left out.
+    """
+    started = now()
+    watermarks = dict(JiraSync.objects.values_list('project', 'last_synced'))
+    full = full or not watermarks
+
+    tracked = Issue.objects.filter(status=False) if full else Issue.objects.filter(sync_hash='')
+    keys = list(tracked.values_list('key', flat=True))
+    projects = set(watermarks) | {key.rsplit('-', 1)[0] for key in keys}
+    users = dict(User.objects.values_list('username', 'id'))
+    stats = dict.fromkeys(STATS, 0)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = []
+        missing = []
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            pages += fetch_keys(pool, jira, keys[start:start + KEYS_PER_QUERY], page_size, missing)
+
+        if not full:
+            for project, last_synced in watermarks.items():
+                jql = "project = '{project}' and updated >= '{since}' order by key".format(
+                    project=project, since=jira_time(last_synced - WATERMARK_OVERLAP))
+                pages += fetch(pool, jira, jql, page_size)
+
+        remote_pages = [page.result() for page in pages]
+
+    stats['missing'] = len(missing)
+    with transaction.atomic():
+        Issue.objects.filter(key__in=missing, sync_hash='').update(sync_hash=MISSING)
+        for remote_issues in remote_pages:
+            for key, value in apply_page(remote_issues, users).items():
+                stats[key] += value
+
+    # only move the watermarks once every page has been applied
+    for project in projects:
+        JiraSync.objects.update_or_create(project=project, defaults={'last_synced': started})
+
+    return stats
+
+
+def jira_time(moment):
+    return localtime(moment, pytz.timezone(settings.JIRA_TIME_ZONE)).strftime('%Y/%m/%d %H:%M')
+
+
+def fetch(pool, jira, jql, page_size):
+    """ Queue every page of a search, driven by startAt/maxResults; returns their futures in order. """
+    fields = jira_fields()
+    first = pool.submit(jira.search_issues, jql, startAt=0, maxResults=page_size, fields=fields)
+
+    return [first] + [pool.submit(jira.search_issues, jql, startAt=start_at, maxResults=page_size, fields=fields)
+                      for start_at in range(page_size, first.result().total, page_size)]
+
+
+def fetch_keys(pool, jira, keys, page_size, missing):
+    """
+        Queue every page of the issues with the given keys.
+
+        JIRA rejects an issuekey in (...) query with a 400 if any one key doesn't exist, so a rejected batch is
+        split in halves until the unknown keys are isolated; those are appended to missing.
+    """
+    try:
+        return fetch(pool, jira, 'issuekey in ({keys}) order by key'.format(keys=','.join(keys)), page_size)
+    except JIRAError as e:
+        if e.status_code != 400:
+            raise
+        if len(keys) == 1:
+            missing.append(keys[0])
+            return []
+
+    middle = len(keys) // 2
+    return (fetch_keys(pool, jira, keys[:middle], page_size, missing) +
+            fetch_keys(pool, jira, keys[middle:], page_size, missing))
+
+
+def apply_events(issues):
+    """ Apply issues in the JSON shape JIRA sends them in webhooks ({'key': ..., 'fields': {...}}). """
+    remote_issues = [json.loads(json.dumps(issue), object_hook=lambda d: SimpleNamespace(**d)) for issue in issues]
+    assignees = {getattr(issue.fields.assignee, 'name', None) for issue in remote_issues
+                 if getattr(issue.fields, 'assignee', None)}
+    return apply_page(remote_issues, dict(User.objects.filter(username__in=assignees).values_list('username', 'id')))
+
+
+def apply_page(remote_issues, users):
+    stats = dict.fromkeys(STATS, 0)
+    stats['fetched'] = len(remote_issues)
+    remote_by_key = {issue.key: issue for issue in remote_issues}
+
+    with transaction.atomic():
+        changed = []
+        activities = []
+        status_changed_ids = []
+        reindex = []
+
+        for item in Issue.objects.filter(key__in=remote_by_key):
+            was_complete = item.status
+            summary = item.summary
+            stats['errors'] += map_issue(item, remote_by_key[item.key], users)
+
+            digest = issue_hash(item)
+            if digest == item.sync_hash:
+                stats['unchanged'] += 1
+                continue
+            item.sync_hash = digest
+            item.modified = now()
+            changed.append(item)
+            if item.summary != summary:
+                reindex.append(item)
+
+            if item.status != was_complete:
+                status_changed_ids.append(item.id)
+                if item.status and item.user_id:
+                    activities.append(Activity(type=Activity.COMPLETED_JIRA, user_id=item.user_id,
+                                               data=activity.dumps({'key': item.key, 'text': item.summary})))
+
+        Issue.objects.bulk_update(changed, SYNCED_FIELDS + ['sync_hash', 'modified'])
+        Activity.objects.bulk_create(activities)
+
+        # bulk_update bypasses the post_save signals, so queue the progress rollup and reindex ourselves
+        rollup.mark_issues(status_changed_ids)
+        search.index(reindex)
+
+    stats['updated'] = len(changed)
+    stats['completed'] = len(activities)
+    return stats
+
+
+def issue_hash(item):
+    """ Fingerprint of the mapped fields, so unchanged issues can be skipped without a write. """
+    values = [str(getattr(item, item._meta.get_field(field).attname)) for field in SYNCED_FIELDS]
+    return hashlib.sha1('\x1f'.join(values).encode()).hexdigest()
+
+
+def map_issue(item, remote, users):
+    """ Copy the JIRA fields we track onto item; returns the number of fields that could not be read. """
+    errors = 0
+    fields = remote.fields
+
+    try:
+        item.user_id = users[fields.assignee.name]
+    except (AttributeError, KeyError):
+        errors += 1
+
+    try:
+        item.priority = AJ.get_priority(fields.priority.name)
+    except AttributeError:
+        item.priority = AJ.get_priority('low')
+        errors += 1
+
+    try:
+        item.status = AJ.get_status(fields.status.name)
+    except AttributeError:
+        item.status = False
+        errors += 1
+
+    try:
+        item.type = AJ.get_type(fields.issuetype.name)
+    except AttributeError:
+        item.type = AJ.get_type('task')
+        errors += 1
+
+    try:
+        item.summary = fields.summary
+    except AttributeError:
+        item.summary = 'No Summary Pulled!'
+        errors += 1
+
+    try:
+        item.story_points = int(round(getattr(fields, settings.JIRA_STORY_POINTS_FIELD, None) or 0))
+    except (TypeError, ValueError):
+        item.story_points = 0
+        errors += 1
+
+    return errors
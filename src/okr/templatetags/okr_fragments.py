@@ -0,0 +1,34 @@
+from django import template
+
+from okr import fragments
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        objects = [value.resolve(context) for value in self.vary_on]
+        return fragments.fetch(self.name.resolve(context), objects, lambda: self.nodelist.render(context))
+
+
+@register.tag('fragment')
+def do_fragment(parser, token):
+    """
+        Cache the enclosed template until one of the model instances it varies on is bumped (see okr.fragments):
+
+            {% fragment 'objective-row' objective %} ... {% endfragment %}
+
+        Other values it varies on only become part of the key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError("'fragment' takes a name and at least one value to vary on.")
+
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1 +1,1454 @@
-# Create your tests here.
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import math
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.query import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from django.utils.timezone import localtime, now
+from jira.client import JIRA
+from jira.exceptions import JIRAError
+from requests import exceptions as requests_exceptions
+
+from . import activity, feed, fragments, history, jobs, rollup, scheduler, search, snapshots, typeahead
+from .aj import AJ, CircuitBreaker, JiraClient, JiraUnavailable
+from .fake_jira import FakeJira
+from .middleware import ActivityMiddleware
+from .models import (
+    Activity, GlobalKeyResult, GlobalObjective, Issue, JiraSync, Job, Lease, Manager, Objective, Profile, Quarter,
+    ReportSnapshot, Result, ResultProgress, ResultProgressSeries, SearchPosting, Team, invalidate_current_quarter,
+)
+from .permissions import get_roles, is_manager_of_team_or_staff, is_manager_or_staff
+from .poker import Poker
+from .reports import global_key_result_report, user_report
+from .sync import MISSING, apply_events, jira_time, sync_issues
+
+
+def create_objective(username='owner'):
+    user = User.objects.create_user(username, password='password')
+    quarter = Quarter.objects.create(name='Q1', start_date=date(2000, 1, 1), end_date=date(2999, 12, 31))
+    global_objective = GlobalObjective.objects.create(objective='Global', quarter=quarter, user=user)
+    global_key_result = GlobalKeyResult.objects.create(key_result='Global KR', objective=global_objective)
+    return Objective.objects.create(objective='Objective', user=user, global_key_result=global_key_result)
+
+
+class RollupTests(TransactionTestCase):
+    # the rollup runs on commit, which TestCase never does
+
+    def test_linked_issue_rolls_up(self):
+        objective = create_objective()
+        result = Result.objects.create(result='Result', objective=objective)
+        issues = [Issue.objects.create(key='SUM-{n}'.format(n=n), summary='Issue') for n in (1, 2)]
+        result.jira_issues.add(*issues)
+
+        issues[0].status = True
+        issues[0].save()
+
+        result.refresh_from_db()
+        objective.refresh_from_db()
+        self.assertEqual((result.percentage, objective.percentage), (50.0, 50.0))
+        self.assertEqual(GlobalKeyResult.objects.get().percentage, 50.0)
+
+    def test_rollup_continues_after_rolled_back_transaction(self):
+        objective = create_objective()
+        result = Result.objects.create(result='Result', objective=objective)
+        issue = Issue.objects.create(key='SUM-1', summary='Issue')
+        result.jira_issues.add(issue)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                rollup.mark_results([result.id])
+                raise RuntimeError
+
+        issue.status = True
+        issue.save()
+
+        result.refresh_from_db()
+        objective.refresh_from_db()
+        self.assertEqual(result.percentage, 100.0)
+        self.assertEqual(objective.percentage, 100.0)
+
+
+class RecomputeTests(TestCase):
+
+    def test_recompute_writes_each_level_with_one_update(self):
+        objective = create_objective()
+        objectives = [Objective.objects.create(objective=str(i), user=objective.user,
+                                               global_key_result=objective.global_key_result) for i in range(5)]
+        for i, each in enumerate(objectives):
+            Result.objects.create(result=str(i), objective=each, manual_bar=True, percentage=i * 10 + 5)
+        Objective.objects.update(percentage=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            scanned, changed = rollup.recompute_objectives()
+
+        self.assertEqual((scanned, changed), (6, 5))
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+        self.assertEqual([each.percentage for each in Objective.objects.filter(id__in=[o.id for o in objectives])
+                          .order_by('id')], [5.0, 15.0, 25.0, 35.0, 45.0])
+
+    def test_recompute_all_repairs_drift(self):
+        objective = create_objective()
+        Result.objects.create(result='Result', objective=objective, manual_bar=True, percentage=40)
+        Objective.objects.update(percentage=0)
+
+        totals = rollup.recompute_all()
+        objective.refresh_from_db()
+        self.assertEqual(objective.percentage, 40.0)
+        self.assertEqual(totals['objectives'], (1, 1))
+
+
+class CurrentQuarterTests(TestCase):
+
+    def setUp(self):
+        invalidate_current_quarter()
+        self.objective = create_objective()
+        self.client.force_login(self.objective.user)
+
+    def quarter_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith('SELECT') and ' FROM "okr_quarter"' in query['sql']]
+
+    def test_warm_requests_do_not_query_quarters(self):
+        self.assertEqual(len(self.quarter_queries('/objective/list/')), 1)
+        self.assertEqual(self.quarter_queries('/objective/list/'), [])
+        self.assertEqual(self.quarter_queries('/objective/{pk}/detail/'.format(pk=self.objective.pk)), [])
+        self.assertEqual(self.quarter_queries('/activity/'), [])
+
+    def test_saving_a_quarter_invalidates(self):
+        self.quarter_queries('/objective/list/')
+        quarter = self.objective.global_key_result.objective.quarter
+        quarter.name = 'Q2'
+        quarter.save()
+
+        self.assertEqual(len(self.quarter_queries('/objective/list/')), 1)
+        self.assertEqual(self.quarter_queries('/objective/list/'), [])
+
+
+class SyncPagesTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user('dev', password='password')
+        self.keys = ['SUM-{n}'.format(n=n) for n in range(1, 8)]
+        for key in self.keys:
+            Issue.objects.create(key=key)
+        self.remote = [FakeJira.issue(key, status='Done', summary=key.lower(), assignee='dev') for key in self.keys]
+
+    def test_pages_are_applied_in_order(self):
+        with FakeJira(self.remote) as fake:
+            stats = sync_issues(JIRA(options={'server': fake.url}, get_server_info=False), page_size=2, workers=3)
+
+        self.assertEqual((stats['fetched'], stats['updated'], stats['completed']), (7, 7, 7))
+        self.assertEqual(list(Issue.objects.order_by('key').values_list('summary', 'status')),
+                         [(key.lower(), True) for key in sorted(self.keys)])
+        # one bulk_create per page, so the activities follow the page order
+        logged = Activity.objects.order_by('id').values_list('data', flat=True)
+        self.assertEqual([json.loads(data)['key'] for data in logged], self.keys)
+
+    def test_failed_page_applies_nothing(self):
+        with FakeJira(self.remote) as fake:
+            jira = JIRA(options={'server': fake.url}, get_server_info=False)
+            search_issues = jira.search_issues
+
+            def search(jql, **kwargs):
+                if kwargs['startAt'] == 4:
+                    raise ConnectionError('page lost')
+                return search_issues(jql, **kwargs)
+
+            with mock.patch.object(jira, 'search_issues', search), self.assertRaises(ConnectionError):
+                sync_issues(jira, page_size=2, workers=3)
+
+        self.assertFalse(Issue.objects.filter(status=True).exists())
+        self.assertFalse(Activity.objects.exists())
+
+
+class SyncTests(TestCase):
+
+    def test_full_sync_fetches_tracked_keys_and_skips_unknown_ones(self):
+        remote = [FakeJira.issue('SUM-1', status='Done', summary='One'),
+                  FakeJira.issue('SUM-3', summary='Three', story_points=5.0),
+                  FakeJira.issue('SUM-4', summary='Untracked')]
+        for key in ('SUM-1', 'SUM-2', 'SUM-3'):
+            Issue.objects.create(key=key)
+
+        with FakeJira(remote) as fake:
+            stats = sync_issues(JIRA(options={'server': fake.url}, get_server_info=False), full=True)
+
+        self.assertEqual((stats['fetched'], stats['updated'], stats['missing']), (2, 2, 1))
+        three = Issue.objects.get(key='SUM-3')
+        self.assertEqual((three.summary, three.story_points), ('Three', 5))
+        self.assertTrue(Issue.objects.get(key='SUM-1').status)
+        self.assertFalse(Issue.objects.filter(key='SUM-4').exists())
+        self.assertEqual(list(JiraSync.objects.values_list('project', flat=True)), ['SUM'])
+
+    def test_incremental_sync_reads_only_updated_issues(self):
+        for key in ('SUM-1', 'SUM-2'):
+            Issue.objects.create(key=key)
+
+        with FakeJira([FakeJira.issue('SUM-1'), FakeJira.issue('SUM-2')]) as fake:
+            jira = JIRA(options={'server': fake.url}, get_server_info=False)
+            self.assertEqual(sync_issues(jira)['updated'], 2)
+            watermark = JiraSync.objects.get(project='SUM').last_synced
+
+            fake.add(FakeJira.issue('SUM-1', status='Done'))
+            fake.add(FakeJira.issue('SUM-2', summary='Stale', updated=datetime(2000, 1, 1)))
+            stats = sync_issues(jira)
+
+        self.assertEqual((stats['fetched'], stats['updated']), (1, 1))
+        self.assertTrue(Issue.objects.get(key='SUM-1').status)
+        self.assertEqual(Issue.objects.get(key='SUM-2').summary, '')
+        self.assertGreater(JiraSync.objects.get(project='SUM').last_synced, watermark)
+
+    def test_incremental_sync_stops_asking_for_unknown_keys(self):
+        JiraSync.objects.create(project='SUM', last_synced=now())
+        Issue.objects.create(key='SUM-2')
+
+        with FakeJira([FakeJira.issue('SUM-1')]) as fake:
+            jira = JIRA(options={'server': fake.url}, get_server_info=False)
+            self.assertEqual(sync_issues(jira)['missing'], 1)
+            self.assertEqual(Issue.objects.get(key='SUM-2').sync_hash, MISSING)
+            self.assertEqual(sync_issues(jira)['missing'], 0)
+            self.assertEqual(sync_issues(jira, full=True)['missing'], 1)
+
+    @override_settings(JIRA_TIME_ZONE='America/New_York')
+    def test_watermark_in_jira_time_zone(self):
+        self.assertEqual(jira_time(now().replace(year=2020, month=1, day=1, hour=12, minute=30)), '2020/01/01 07:30')
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_threshold_and_resets_through_half_open_trial(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        with mock.patch('okr.aj.time.monotonic', return_value=1000):
+            breaker.failure()
+            self.assertTrue(breaker.allow())
+            breaker.failure()
+            self.assertFalse(breaker.allow())
+
+        with mock.patch('okr.aj.time.monotonic', return_value=1060):
+            self.assertTrue(breaker.allow())
+            # a failed trial re-opens the circuit at once
+            breaker.failure()
+            self.assertFalse(breaker.allow())
+
+        with mock.patch('okr.aj.time.monotonic', return_value=1120):
+            self.assertTrue(breaker.allow())
+            breaker.success()
+            breaker.failure()
+            self.assertTrue(breaker.allow())
+
+
+@override_settings(JIRA_MAX_RETRIES=2, JIRA_RETRY_BACKOFF=0, JIRA_FAILURE_THRESHOLD=2)
+class JiraClientTests(SimpleTestCase):
+
+    def client_with(self, *outcomes):
+        client = JiraClient()
+        search = mock.Mock(side_effect=outcomes)
+        connection = mock.patch.object(client, 'connection', return_value=SimpleNamespace(search_issues=search))
+        self.connection = connection.start()
+        self.addCleanup(connection.stop)
+        return client, search
+
+    def test_transient_errors_are_retried(self):
+        client, search = self.client_with(requests_exceptions.ConnectionError(), JIRAError(status_code=503), ['SUM-1'])
+        self.assertEqual(client.search_issues('project = SUM'), ['SUM-1'])
+        self.assertEqual(search.call_count, 3)
+        self.assertEqual(client.breaker.failures, 0)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        client, search = self.client_with(*[requests_exceptions.Timeout()] * 6)
+        for _ in range(2):
+            with self.assertRaises(JiraUnavailable):
+                client.search_issues('project = SUM')
+        self.assertEqual(search.call_count, 6)
+
+        with self.assertRaises(JiraUnavailable):
+            client.search_issues('project = SUM')
+        self.assertEqual(search.call_count, 6)
+
+    def test_refusals_are_not_retried(self):
+        client, search = self.client_with(JIRAError(status_code=401))
+        with self.assertRaises(JIRAError):
+            client.search_issues('project = SUM')
+        self.assertEqual(search.call_count, 1)
+
+    def test_per_call_retries_and_timeout(self):
+        client, search = self.client_with(requests_exceptions.Timeout())
+        with self.assertRaises(JiraUnavailable):
+            client.search_issues('project = SUM', retries=0, timeout=3)
+        self.assertEqual(search.call_count, 1)
+        self.connection.assert_called_once_with(3)
+        search.assert_called_once_with('project = SUM')
+
+    @override_settings(JIRA_USERNAME=None, JIRA_PASSWORD=None)
+    def test_connect_requires_credentials(self):
+        with self.assertRaises(JiraUnavailable):
+            JiraClient().search_issues('project = SUM')
+
+
+@override_settings(JIRA_MAX_RETRIES=2, JIRA_RETRY_BACKOFF=0, JIRA_POKER_READ_TIMEOUT=3)
+class PokerTests(TestCase):
+
+    def setUp(self):
+        Issue.objects.create(key='SUM-1', summary='Stored')
+        self.addCleanup(AJ.client().breaker.success)
+        self.poker = Poker(Team.objects.create(name='Team'))
+
+    def poker_issues(self, error):
+        search = mock.Mock(side_effect=error)
+        with mock.patch.object(AJ.client(), 'connection', return_value=SimpleNamespace(search_issues=search)) as conn:
+            issues = self.poker.get_jira_issues()
+        conn.assert_called_once_with(3)
+        self.assertEqual(search.call_count, 1)
+        return issues
+
+    def test_falls_back_to_stored_issues_without_retrying(self):
+        self.assertEqual([issue['key'] for issue in self.poker_issues(requests_exceptions.Timeout())], ['SUM-1'])
+
+    def test_falls_back_when_jira_refuses(self):
+        self.assertEqual([issue['key'] for issue in self.poker_issues(JIRAError(status_code=401))], ['SUM-1'])
+
+
+WEBHOOKS = os.path.join(os.path.dirname(__file__), 'testdata', 'jira_webhooks')
+
+
+def webhook(name):
+    with open(os.path.join(WEBHOOKS, name)) as payload_file:
+        return json.load(payload_file)
+
+
+@override_settings(JIRA_WEBHOOK_SECRET='secret', JIRA_WEBHOOK_WINDOW=0)
+class WebhookTests(TestCase):
+
+    def setUp(self):
+        Issue.objects.create(key='SUM-1')
+        User.objects.create_user('jdoe', password='password')
+
+    def post(self, name, token='secret'):
+        return self.client.post('/jira/webhook/?token={token}'.format(token=token), json.dumps(webhook(name)),
+                                content_type='application/json')
+
+    def queued_status(self):
+        return json.loads(Job.objects.get(status=Job.QUEUED).kwargs)['issue']['fields']['status']['name']
+
+    def test_event_is_stored_before_it_is_acknowledged(self):
+        self.assertEqual(self.post('issue_updated.json').status_code, 202)
+        self.assertEqual(list(Job.objects.values_list('name', 'key', 'status')),
+                         [('apply_jira_issue', 'jira-issue:SUM-1', Job.QUEUED)])
+
+    def test_events_coalesce_into_the_newest(self):
+        self.post('issue_updated.json')
+        self.post('issue_resolved.json')
+        self.assertEqual(self.queued_status(), 'Done')
+
+        # JIRA doesn't promise to deliver in order
+        self.post('issue_updated.json')
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(self.queued_status(), 'Done')
+
+    def test_job_waits_for_running_job_of_the_same_issue(self):
+        self.post('issue_updated.json')
+        running = jobs.claim('worker')
+        self.post('issue_resolved.json')
+
+        self.assertIsNone(jobs.claim('other'))
+        jobs.run(running, 'worker')
+        jobs.run(jobs.claim('other'), 'other')
+
+        issue = Issue.objects.get(key='SUM-1')
+        self.assertEqual((issue.status, issue.user.username, issue.story_points), (True, 'jdoe', 5))
+
+    def test_bad_token_is_forbidden(self):
+        self.assertEqual(self.post('issue_resolved.json', token='wrong').status_code, 403)
+        self.assertFalse(Issue.objects.get(key='SUM-1').status)
+        self.assertFalse(Job.objects.exists())
+
+    def test_invalid_json_is_rejected(self):
+        response = self.client.post('/jira/webhook/?token=secret', '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_completed_counts_only_logged_activities(self):
+        event = webhook('issue_resolved.json')['issue']
+        event['fields']['assignee'] = None
+        stats = apply_events([event])
+        self.assertEqual((stats['updated'], stats['completed']), (1, 0))
+        self.assertFalse(Activity.objects.exists())
+
+    def test_replay_applies_newest_event(self):
+        call_command('replay_jira_webhooks', os.path.join(WEBHOOKS, 'issue_resolved.json'),
+                     os.path.join(WEBHOOKS, 'issue_updated.json'), stdout=StringIO())
+        self.assertTrue(Issue.objects.get(key='SUM-1').status)
+
+
+class ReportTests(TestCase):
+
+    def setUp(self):
+        self.team = Team.objects.create(name='Team')
+        self.viewer = self.add_member('viewer', objectives=0)
+        quarter = Quarter.objects.create(name='Q1', start_date=date(2000, 1, 1), end_date=date(2999, 12, 31))
+        global_objective = GlobalObjective.objects.create(objective='Global', quarter=quarter, user=self.viewer)
+        self.global_key_results = [GlobalKeyResult.objects.create(key_result='Global KR {n}'.format(n=n),
+                                                                  objective=global_objective) for n in (1, 2)]
+        self.client.force_login(self.viewer)
+
+    def add_member(self, username, objectives=2):
+        user = User.objects.create_user(username, password='password')
+        user.profile.team = self.team
+        user.profile.save()
+        for n in range(objectives):
+            objective = Objective.objects.create(objective='Objective', user=user,
+                                                 global_key_result=self.global_key_results[n % 2])
+            for m in range(2):
+                Result.objects.create(result='Result {m}'.format(m=m), objective=objective)
+        return user
+
+    def queries(self, url):
+        # the first request also caches the current quarter
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_global_key_result_report_queries_do_not_grow_with_the_team(self):
+        url = '/reports/GRST/{pk}/'.format(pk=self.global_key_results[0].pk)
+        self.add_member('first')
+        one = self.queries(url)
+        for username in ('second', 'third', 'fourth'):
+            self.add_member(username, objectives=3)
+        self.assertEqual(self.queries(url), one)
+
+    def test_user_report_queries_do_not_grow_with_objectives(self):
+        user = self.add_member('member', objectives=1)
+        url = '/reports/user/{pk}/'.format(pk=user.pk)
+        one = self.queries(url)
+        for n in range(4):
+            Objective.objects.create(objective='More', user=user, global_key_result=self.global_key_results[n % 2])
+        self.assertEqual(self.queries(url), one)
+
+    def test_reports_match_per_object_queries(self):
+        for username in ('first', 'second'):
+            self.add_member(username, objectives=3)
+        global_key_result = self.global_key_results[0]
+
+        for user, objectives in global_key_result_report(self.team, global_key_result):
+            self.assertEqual(objectives, list(Objective.objects.filter(user=user, global_key_result=global_key_result)
+                                              .order_by('id')))
+            for objective in objectives:
+                self.assertEqual(objective.key_results, list(objective.get_key_results().order_by('id')))
+
+        user = User.objects.get(username='first')
+        report = user_report(self.team, user)
+        self.assertEqual([global_key_result for global_key_result, objectives in report], self.global_key_results)
+        self.assertEqual(sum(len(objectives) for global_key_result, objectives in report),
+                         Objective.objects.filter(user=user).count())
+
+
+class ReportSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.objective = create_objective()
+        self.user = self.objective.user
+        self.global_key_result = self.objective.global_key_result
+        self.team = Team.objects.create(name='Team')
+        self.user.profile.team = self.team
+        self.user.profile.save()
+        Manager.objects.create(team=self.team, manager=self.user)
+        invalidate_current_quarter()
+        self.client.force_login(self.user)
+
+    def pages(self):
+        return ['/reports/', '/reports/user/{pk}/'.format(pk=self.user.pk),
+                '/reports/GRST/{pk}/'.format(pk=self.global_key_result.pk)]
+
+    def test_pages_do_not_take_snapshots(self):
+        for url in self.pages():
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertFalse(ReportSnapshot.objects.exists())
+
+    def test_refresh_takes_a_snapshot_for_managers_only(self):
+        self.assertRedirects(self.client.post('/reports/refresh/'), '/reports/')
+        jobs.run(jobs.claim('worker'), 'worker')
+        self.assertEqual(list(ReportSnapshot.objects.values_list('team', flat=True)), [self.team.pk])
+
+        member = User.objects.create_user('member', password='password')
+        member.profile.team = self.team
+        member.profile.save()
+        self.client.force_login(member)
+        self.client.post('/reports/refresh/')
+        self.assertFalse(Job.objects.filter(status=Job.QUEUED).exists())
+        self.assertEqual(ReportSnapshot.objects.count(), 1)
+
+    def test_zero_percent_snapshot_is_shown(self):
+        snapshots.take_snapshot(self.team, self.global_key_result.objective.quarter)
+        Objective.objects.filter(pk=self.objective.pk).update(percentage=50)
+        GlobalKeyResult.objects.filter(pk=self.global_key_result.pk).update(percentage=50)
+
+        for url in self.pages()[1:]:
+            self.assertEqual(self.client.get(url).context['percentage'], 0)
+
+    @override_settings(REPORT_SNAPSHOT_RETENTION=14)
+    def test_old_snapshots_are_thinned_to_one_a_day(self):
+        quarter = self.global_key_result.objective.quarter
+        taken = [snapshots.take_snapshot(self.team, quarter) for hour in range(4)]
+        old = localtime(now()).replace(hour=10, minute=0) - timedelta(days=20)
+        for hour, snapshot in enumerate(taken[:3]):
+            ReportSnapshot.objects.filter(pk=snapshot.pk).update(created=old + timedelta(hours=hour))
+
+        self.assertEqual(snapshots.prune_snapshots(), 2)
+        self.assertEqual(list(ReportSnapshot.objects.order_by('id').values_list('id', flat=True)),
+                         [taken[2].pk, taken[3].pk])
+
+
+class ProfileProgressTests(TestCase):
+
+    def setUp(self):
+        self.team = Team.objects.create(name='Team')
+        self.manager = self.add_member('manager', objectives=0)
+        Manager.objects.create(team=self.team, manager=self.manager)
+        quarter = Quarter.objects.create(name='Q1', start_date=date(2000, 1, 1), end_date=date(2999, 12, 31))
+        global_objective = GlobalObjective.objects.create(objective='Global', quarter=quarter, user=self.manager)
+        self.global_key_result = GlobalKeyResult.objects.create(key_result='Global KR', objective=global_objective)
+        invalidate_current_quarter()
+        self.client.force_login(self.manager)
+
+    def add_member(self, username, objectives=2, linked=False):
+        user = User.objects.create_user(username, password='password')
+        user.profile.team = self.team
+        user.profile.save()
+        for n in range(objectives):
+            objective = Objective.objects.create(objective='Objective', user=user,
+                                                 global_key_result=self.global_key_result, percentage=25 * n)
+            result = Result.objects.create(result='Result', objective=objective, percentage=100 * (n % 2))
+            if linked:
+                result.jira_issues.add(Issue.objects.create(key='{user}-{n}'.format(user=username.upper(), n=n)))
+        return user
+
+    def queries(self, url):
+        # the first request also caches the current quarter
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_annotations_match_per_object_methods(self):
+        self.add_member('first', objectives=3, linked=True)
+        self.add_member('second', objectives=2)
+        self.add_member('idle', objectives=0)
+
+        for member in Profile.objects.filter(team=self.team).with_progress().with_roles():
+            profile = Profile.objects.get(pk=member.pk)
+            percentages = [objective.percentage for objective in profile.get_objectives()]
+            linked = any(result.jira_issues.exists() for objective in profile.get_objectives()
+                         for result in objective.get_key_results())
+            average = round(sum(percentages) / len(percentages), 2) if percentages else 0
+
+            self.assertEqual(member.get_percentage(), profile.get_percentage())
+            self.assertEqual(member.get_percentage(), average)
+            self.assertEqual(member.has_jira_issues_connected(), profile.has_jira_issues_connected())
+            self.assertEqual(member.has_jira_issues_connected(), linked)
+            self.assertEqual(member.is_manager(), Manager.objects.filter(manager=member.user).exists())
+
+    def test_objective_annotations_match_per_object_methods(self):
+        user = self.add_member('member', objectives=4, linked=True)
+        for objective in Objective.objects.filter(user=user).with_progress():
+            plain = Objective.objects.get(pk=objective.pk)
+            self.assertEqual(objective.is_complete(), plain.is_complete())
+
+    def test_team_detail_queries_do_not_grow_with_members(self):
+        url = '/team/{pk}/detail/'.format(pk=self.team.pk)
+        self.add_member('first', linked=True)
+        one = self.queries(url)
+        for username in ('second', 'third', 'fourth'):
+            self.add_member(username, objectives=3, linked=True)
+        self.assertEqual(self.queries(url), one)
+
+    def test_objective_list_queries_do_not_grow_with_objectives(self):
+        user = self.add_member('member', objectives=1, linked=True)
+        self.client.force_login(user)
+        one = self.queries('/objective/list/')
+        for n in range(4):
+            objective = Objective.objects.create(objective='More', user=user, global_key_result=self.global_key_result)
+            Result.objects.create(result='Result', objective=objective)
+        self.assertEqual(self.queries('/objective/list/'), one)
+
+
+class RolesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='password')
+        self.teams = [Team.objects.create(name='Team {n}'.format(n=n)) for n in range(4)]
+        self.user.profile.team = self.teams[0]
+        self.user.profile.save()
+
+    def manage(self, count):
+        Manager.objects.filter(manager=self.user).delete()
+        for team in self.teams[:count]:
+            Manager.objects.create(team=team, manager=self.user)
+
+    def roles(self, queries):
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(queries):
+            roles = get_roles(user)
+            # every later check is answered from the cache
+            self.assertIs(get_roles(user), roles)
+            is_manager_or_staff(user)
+            [is_manager_of_team_or_staff(user, team) for team in self.teams]
+            user.profile.is_manager()
+        return user, roles
+
+    def test_roles_take_two_queries_however_many_teams_are_managed(self):
+        for count in (1, 3):
+            self.manage(count)
+            self.roles(2)
+
+    def test_roles_match_per_object_queries(self):
+        for count in (0, 1, 3):
+            self.manage(count)
+            user, roles = self.roles(2)
+            self.assertEqual(roles.team, Profile.objects.get(user=self.user).team)
+            self.assertEqual(roles.is_manager, Manager.objects.filter(manager=self.user).exists())
+            self.assertEqual(user.profile.is_manager(), roles.is_manager)
+            for team in self.teams:
+                managed = Manager.objects.filter(manager=self.user, team=team).exists()
+                self.assertEqual(roles.is_manager_of(team), managed)
+
+    def test_anonymous_user_has_no_roles(self):
+        with self.assertNumQueries(0):
+            roles = get_roles(AnonymousUser())
+        self.assertEqual((roles.team, roles.is_manager), (None, False))
+
+    def test_page_queries_do_not_grow_with_managed_teams(self):
+        self.client.force_login(self.user)
+        counts = []
+        for count in (1, 3):
+            self.manage(count)
+            self.client.get('/objective/list/')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get('/objective/list/').status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class TeamSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='password')
+        self.other = User.objects.create_user('other', password='password')
+        self.client.force_login(self.user)
+
+    def add_team(self, n, managed_by, members=2):
+        team = Team.objects.create(name='Team {n}'.format(n=n))
+        Manager.objects.create(team=team, manager=managed_by)
+        for m in range(members):
+            member = User.objects.create_user('member-{n}-{m}'.format(n=n, m=m), password='password')
+            member.profile.team = team
+            member.profile.save()
+        return team
+
+    def queries(self):
+        self.client.get('/team/list/')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/team/list/').status_code, 200)
+        return len(queries)
+
+    def test_team_list_queries_do_not_grow_with_teams(self):
+        self.add_team(0, self.user)
+        one = self.queries()
+        for n in range(1, 5):
+            self.add_team(n, self.user if n % 2 else self.other, members=n)
+        self.assertEqual(self.queries(), one)
+
+    def test_summary_matches_per_object_queries(self):
+        for n in range(4):
+            self.add_team(n, self.user if n % 2 else self.other, members=n)
+        Team.objects.create(name='Unmanaged')
+
+        teams = list(Team.objects.with_summary(self.user).order_by('name'))
+        self.assertEqual(len(teams), 5)
+        for team in teams:
+            managers = Manager.objects.filter(team=team).order_by('id')
+            self.assertEqual(team.total_members(), len(Profile.objects.filter(team=team)))
+            self.assertEqual(team.total_members(), Team.objects.get(pk=team.pk).total_members())
+            self.assertEqual(team.managed_by_me, managers.filter(manager=self.user).exists())
+            self.assertEqual(team.manager_username, managers.first().manager.username if managers else None)
+
+        response = self.client.get('/team/list/')
+        self.assertEqual([team.name for team in response.context['managed_teams']], ['Team 1', 'Team 3'])
+        self.assertEqual([team.name for team in response.context['object_list']], ['Team 0', 'Team 2', 'Unmanaged'])
+
+
+class ConditionalTests(TestCase):
+
+    def setUp(self):
+        self.objective = create_objective()
+        self.client.force_login(self.objective.user)
+
+    def get(self, etag='', **headers):
+        return self.client.get('/objective/list/', HTTP_IF_NONE_MATCH=etag, **headers)
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_saved_row_renders(self):
+        etag = self.get()['ETag']
+        Result.objects.create(result='Result', objective=self.objective)
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_deleted_row_renders(self):
+        result = Result.objects.create(result='Result', objective=self.objective)
+        etag = self.get()['ETag']
+        result.delete()
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_deleted_row_renders_for_if_modified_since(self):
+        Result.objects.create(result='Result', objective=self.objective)
+        Result.objects.create(result='Other', objective=self.objective).delete()
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date((now() + timedelta(hours=1)).timestamp()))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_new_csrf_token_renders(self):
+        etag = self.get()['ETag']
+        self.client.cookies['csrftoken'] = 'x' * 64
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_next_day_renders(self):
+        etag = self.get()['ETag']
+        with mock.patch('okr.conditional.now', return_value=now() + timedelta(days=1)):
+            self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_flash_messages_render(self):
+        etag = self.get()['ETag']
+        with mock.patch('okr.conditional.messages.get_messages', return_value=['Saved']):
+            self.assertEqual(self.get(etag).status_code, 200)
+
+
+class ProgressHistoryTests(TestCase):
+
+    def setUp(self):
+        self.objective = create_objective()
+        self.result = Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+
+    def days(self, result=None):
+        return list(ResultProgress.objects.filter(result=result or self.result).order_by('day')
+                    .values_list('day', 'percentage'))
+
+    def test_record_writes_only_on_change(self):
+        today = history.today()
+        self.assertEqual(self.days(), [(today, 0.0)])
+
+        self.result.save()
+        history.record({self.result.pk: 0.0})
+        self.assertEqual(self.days(), [(today, 0.0)])
+
+        self.result.percentage = 40
+        self.result.save()
+        self.assertEqual(self.days(), [(today, 40.0)])
+
+        tomorrow = today + timedelta(days=1)
+        with mock.patch('okr.history.today', return_value=tomorrow):
+            history.record({self.result.pk: 40.0})
+            self.assertEqual(self.days(), [(today, 40.0)])
+            history.record({self.result.pk: 70.0})
+        self.assertEqual(self.days(), [(today, 40.0), (tomorrow, 70.0)])
+
+    def test_pack_and_unpack_round_trip(self):
+        quarter = Quarter(name='Q', start_date=date(2020, 1, 1), end_date=date(2020, 1, 20))
+        points = [(date(2020, 1, 3), 10.0), (date(2020, 1, 9), 33.33), (date(2020, 1, 16), 80.0)]
+        self.assertEqual(history.sample_days(quarter, 7),
+                         [date(2020, 1, 1), date(2020, 1, 8), date(2020, 1, 15), date(2020, 1, 20)])
+        self.assertEqual(history.unpack(quarter, history.pack(quarter, points)),
+                         [(date(2020, 1, 8), 10.0), (date(2020, 1, 15), 33.33), (date(2020, 1, 20), 80.0)])
+
+    def test_burn_up_averages_key_results_then_objectives(self):
+        today = history.today()
+        quarter = self.objective.global_key_result.objective.quarter
+        Quarter.objects.filter(pk=quarter.pk).update(start_date=today - timedelta(days=2))
+        quarter.refresh_from_db()
+        other = Result.objects.create(result='Other', objective=self.objective, manual_bar=True)
+        second = Objective.objects.create(objective='Second', user=self.objective.user,
+                                          global_key_result=self.objective.global_key_result)
+        third = Result.objects.create(result='Third', objective=second, manual_bar=True)
+
+        ResultProgress.objects.all().delete()
+        ResultProgress.objects.bulk_create([
+            ResultProgress(result=self.result, day=today - timedelta(days=2), percentage=20),
+            ResultProgress(result=other, day=today - timedelta(days=1), percentage=40),
+            ResultProgress(result=third, day=today - timedelta(days=1), percentage=100),
+            ResultProgress(result=self.result, day=today, percentage=60),
+        ])
+
+        with self.assertNumQueries(2):
+            series = history.burn_up(Result.objects.filter(objective__user=self.objective.user), quarter)
+        self.assertEqual(series, [(today - timedelta(days=2), 20.0), (today - timedelta(days=1), 65.0), (today, 75.0)])
+
+
+class ProgressCompactionTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('owner', password='password')
+        self.quarter = Quarter.objects.create(name='Q', start_date=date(2020, 1, 1), end_date=date(2020, 1, 20))
+        global_objective = GlobalObjective.objects.create(objective='Global', quarter=self.quarter, user=user)
+        global_key_result = GlobalKeyResult.objects.create(key_result='Global KR', objective=global_objective)
+        objective = Objective.objects.create(objective='Objective', user=user, global_key_result=global_key_result)
+        self.result = Result.objects.create(result='Result', objective=objective, manual_bar=True)
+        ResultProgress.objects.all().delete()
+
+    def add(self, day, percentage):
+        ResultProgress.objects.create(result=self.result, day=date(2020, 1, day), percentage=percentage)
+
+    def series(self):
+        series = ResultProgressSeries.objects.get(result=self.result)
+        return history.unpack(self.quarter, series.values, series.step_days)
+
+    def test_rows_are_packed_and_deleted(self):
+        self.add(2, 10)
+        self.add(10, 50)
+        self.assertEqual(history.compact_closed_quarters(), {self.quarter: 1})
+        self.assertFalse(ResultProgress.objects.exists())
+        self.assertEqual(self.series(),
+                         [(date(2020, 1, 8), 10.0), (date(2020, 1, 15), 50.0), (date(2020, 1, 20), 50.0)])
+
+    def test_later_rows_are_merged_into_the_series(self):
+        self.add(2, 10)
+        history.compact(self.quarter)
+        self.add(20, 90)
+        self.assertEqual(history.compact(self.quarter), 1)
+        self.assertEqual(ResultProgressSeries.objects.count(), 1)
+        self.assertEqual(self.series(),
+                         [(date(2020, 1, 8), 10.0), (date(2020, 1, 15), 10.0), (date(2020, 1, 20), 90.0)])
+
+    def test_rows_written_while_compacting_are_kept(self):
+        self.add(2, 10)
+        pack = history.pack
+
+        def pack_while_recording(*args, **kwargs):
+            self.add(18, 70)
+            return pack(*args, **kwargs)
+
+        with mock.patch('okr.history.pack', side_effect=pack_while_recording):
+            history.compact(self.quarter)
+        self.assertEqual(list(ResultProgress.objects.values_list('percentage', flat=True)), [70.0])
+
+    def test_burn_up_reads_the_series(self):
+        self.add(2, 10)
+        history.compact(self.quarter)
+        with self.assertNumQueries(3):
+            series = history.burn_up(Result.objects.filter(pk=self.result.pk), self.quarter)
+        self.assertEqual(series[0], (date(2020, 1, 1), None))
+        self.assertEqual(series[7:9], [(date(2020, 1, 8), 10.0), (date(2020, 1, 9), 10.0)])
+        self.assertEqual(len(series), 20)
+
+
+class ActivityFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.team = Team.objects.create(name='Team')
+        self.member, self.other, self.manager = [self.add_user(name, self.team) for name in ('member', 'other', 'boss')]
+        Manager.objects.create(team=self.team, manager=self.manager)
+        self.outsider = self.add_user('outsider', Team.objects.create(name='Elsewhere'))
+
+    def add_user(self, username, team):
+        user = User.objects.create_user(username, password='password')
+        user.profile.team = team
+        user.profile.save()
+        return user
+
+    def log(self, user, count, public=True, created=None):
+        Activity.objects.bulk_create(Activity(type=Activity.MODIFIED_OBJECTIVE, user=user, public=public,
+                                              data='{}') for _ in range(count))
+        entries = list(Activity.objects.filter(user=user, public=public).order_by('-id')[:count])
+        if created is not None:
+            Activity.objects.filter(pk__in=[entry.pk for entry in entries]).update(created=created)
+        return entries
+
+    def read_all(self, viewer, member=None, size=2):
+        ids, cursor = [], None
+        while True:
+            activities, cursor = feed.read(viewer, member, cursor, size)
+            ids += [activity.pk for activity in activities]
+            if cursor is None:
+                return ids
+
+    def test_cursor_pages_through_equal_timestamps_without_duplicates_or_gaps(self):
+        created = now()
+        entries = self.log(self.member, 5, created=created) + self.log(self.other, 2, created=created)
+        self.assertEqual(self.read_all(self.member), sorted((entry.pk for entry in entries), reverse=True))
+
+    def test_cursor_is_newest_first_across_timestamps(self):
+        older = self.log(self.member, 2, created=now().replace(year=2000))
+        newer = self.log(self.member, 2)
+        self.assertEqual(self.read_all(self.member, size=3), [entry.pk for entry in newer + older])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'bm90IGEgY3Vyc29y', feed.encode_cursor(Activity(created=now(), id=1))[:-4]):
+            with self.assertRaises(feed.InvalidCursor):
+                feed.read(self.member, cursor=cursor)
+
+    def test_private_activity_is_hidden_from_other_members(self):
+        public = self.log(self.member, 1)
+        private = self.log(self.member, 1, public=False)
+        self.assertEqual(self.read_all(self.other), [public[0].pk])
+        self.assertEqual(self.read_all(self.other, self.member), [public[0].pk])
+        self.assertEqual(self.read_all(self.member, self.member), [private[0].pk, public[0].pk])
+        self.assertEqual(self.read_all(self.manager, self.member), [private[0].pk, public[0].pk])
+
+    def test_other_teams_are_denied(self):
+        self.log(self.member, 1)
+        with self.assertRaises(PermissionDenied):
+            feed.read(self.outsider, self.member)
+        self.assertEqual(feed.read(self.outsider), ([], None))
+
+    def test_first_team_page_is_cached(self):
+        first = self.log(self.member, 1)
+        self.assertEqual(self.read_all(self.other), [first[0].pk])
+        self.log(self.member, 1)
+        self.assertEqual(self.read_all(self.other), [first[0].pk])
+
+    def test_activity_page(self):
+        self.log(self.member, 3)
+        self.client.force_login(self.other)
+        response = self.client.get('/activity/?user={pk}'.format(pk=self.member.pk))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['activities']), 3)
+        self.assertEqual(self.client.get('/activity/?cursor=garbage').status_code, 404)
+
+        self.client.force_login(self.outsider)
+        self.assertEqual(self.client.get('/activity/?user={pk}'.format(pk=self.member.pk)).status_code, 403)
+
+
+class ActivityLogTests(TransactionTestCase):
+    # activity is buffered on commit, which TestCase never does
+
+    def setUp(self):
+        self.objective = create_objective()
+        Activity.objects.all().delete()
+
+    def logged(self):
+        return list(Activity.objects.order_by('id').values_list('type', flat=True))
+
+    def request(self, view):
+        request = RequestFactory().get('/')
+        request.user = self.objective.user
+        return ActivityMiddleware(view)(request)
+
+    def test_signals_log_created_modified_completed_and_deleted(self):
+        result = Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+        result.percentage = 100
+        result.save()
+        pk, key = result.pk, result.get_key()
+        result.delete()
+        # the rollup brings the objective to 100% as soon as the key result is saved
+        self.assertEqual(self.logged(), [Activity.CREATED_KEY_RESULT, Activity.COMPLETED_OBJECTIVE,
+                                         Activity.MODIFIED_KEY_RESULT, Activity.COMPLETED_KEY_RESULT,
+                                         Activity.DELETED_KEY_RESULT])
+        data = Activity.objects.get(type=Activity.COMPLETED_KEY_RESULT).get_data()
+        self.assertEqual((data['id'], data['key'], data['percentage']), (pk, key, 100))
+
+    def test_request_activity_is_written_at_the_end(self):
+        def view(request):
+            Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+            self.assertEqual(self.logged(), [])
+            return HttpResponse()
+
+        self.request(view)
+        self.assertEqual(self.logged(), [Activity.CREATED_KEY_RESULT])
+        self.assertEqual(json.loads(Activity.objects.get().data)['actor'], self.objective.user.pk)
+
+    def test_saved_changes_are_logged_when_the_view_fails_afterwards(self):
+        def failing(request):
+            Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+            return HttpResponse(status=500)
+
+        def raising(request):
+            self.objective.save()
+            raise RuntimeError
+
+        self.request(failing)
+        with self.assertRaises(RuntimeError):
+            self.request(raising)
+        self.assertEqual(self.logged(), [Activity.CREATED_KEY_RESULT, Activity.MODIFIED_OBJECTIVE])
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+                raise RuntimeError
+        self.assertEqual(self.logged(), [])
+
+    def test_deleting_a_user_logs_nothing_for_them(self):
+        Result.objects.create(result='Result', objective=self.objective, manual_bar=True)
+        Activity.objects.all().delete()
+        self.objective.user.delete()
+        self.assertFalse(Objective.objects.exists())
+        self.assertEqual(self.logged(), [])
+        self.assertEqual(activity._pending().deleted_users, set())
+
+    def test_bulk_endpoint_logs_created_and_completed_key_results(self):
+        existing = Result.objects.create(result='Existing', objective=self.objective, manual_bar=True)
+        Activity.objects.all().delete()
+        self.client.force_login(self.objective.user)
+        response = self.client.post('/api/keyresults/bulk/', json.dumps([
+            {'objective': self.objective.pk, 'result': 'New', 'manual_bar': True, 'percentage': 100},
+            {'id': existing.pk, 'objective': self.objective.pk, 'result': 'Existing', 'manual_bar': True,
+             'percentage': 20},
+        ]), content_type='application/json')
+        self.assertEqual(response.json(), {'created': 1, 'updated': 1})
+
+        created = Result.objects.get(result='New')
+        self.assertTrue(SearchPosting.objects.filter(kind=SearchPosting.KEY_RESULT, object_id=created.pk,
+                                                     token='new').exists())
+        logged = {(entry.type, json.loads(entry.data)['key']) for entry in Activity.objects.all()}
+        self.assertEqual(logged, {(Activity.CREATED_KEY_RESULT, created.get_key()),
+                                  (Activity.COMPLETED_KEY_RESULT, created.get_key()),
+                                  (Activity.MODIFIED_KEY_RESULT, existing.get_key())})
+
+
+class IssueKeyMigrationTests(TransactionTestCase):
+
+    def migrate(self, targets=None):
+        # without targets, back to the latest migrations the other tests run against
+        executor = MigrationExecutor(connection)
+        targets = targets or executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_duplicate_keys_are_merged_into_the_oldest_issue(self):
+        objective = create_objective()
+        results = [Result.objects.create(result=name, objective=objective) for name in ('First', 'Second', 'Third')]
+        other = User.objects.create_user('other', password='password')
+
+        apps = self.migrate([('okr', '0019_activity_feed_indexes')])
+        try:
+            OldIssue = apps.get_model('okr', 'Issue')
+            Link = apps.get_model('okr', 'Result').jira_issues.through
+            oldest = OldIssue.objects.create(key='SUM-1', summary='Stale')
+            synced = OldIssue.objects.create(key='SUM-1', summary='Synced', status=True, user_id=other.pk,
+                                             sync_hash='abc')
+            unsynced = OldIssue.objects.create(key='SUM-1', summary='Never synced')
+            OldIssue.objects.create(key='SUM-10', summary='Unrelated')
+            OldIssue.objects.filter(pk=unsynced.pk).update(modified=now() + timedelta(days=1))
+            Link.objects.bulk_create([Link(result_id=results[0].pk, issue_id=oldest.pk),
+                                      Link(result_id=results[0].pk, issue_id=synced.pk),
+                                      Link(result_id=results[1].pk, issue_id=synced.pk),
+                                      Link(result_id=results[2].pk, issue_id=unsynced.pk)])
+        finally:
+            self.migrate()
+
+        issue = Issue.objects.get(key='SUM-1')
+        self.assertEqual(issue.pk, oldest.pk)
+        self.assertEqual((issue.summary, issue.status, issue.user, issue.sync_hash), ('Synced', True, other, 'abc'))
+        self.assertEqual(sorted(issue.result_set.values_list('result', flat=True)), ['First', 'Second', 'Third'])
+        self.assertEqual(Issue.objects.count(), 2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Issue.objects.create(key='SUM-1')
+
+
+class IssueKeyTests(TestCase):
+
+    def setUp(self):
+        self.objective = create_objective()
+        self.client.force_login(self.objective.user)
+
+    def test_linked_key_results_match_the_exact_key(self):
+        first, tenth = Issue.objects.create(key='SUM-1'), Issue.objects.create(key='SUM-10')
+        Result.objects.create(result='Tenth', objective=self.objective).jira_issues.add(tenth)
+        Result.objects.create(result='First', objective=self.objective).jira_issues.add(first)
+        self.assertEqual([result.result for result in first.get_linked_key_results()], ['First'])
+
+    def test_adding_an_issue_upserts_on_the_key(self):
+        other = User.objects.create_user('other', password='password')
+        Issue.objects.create(key='SUM-2')
+        Issue.objects.create(key='SUM-3', user=other)
+
+        for key in ('1', 'SUM-2', '3', 'SUM-1'):
+            self.assertEqual(self.client.post('/issue/add/', {'key': key}).status_code, 302)
+        self.assertEqual(list(Issue.objects.order_by('key').values_list('key', 'user__username')),
+                         [('SUM-1', 'owner'), ('SUM-2', 'owner'), ('SUM-3', 'other')])
+
+    def test_poker_adds_missing_issues_in_one_insert(self):
+        Issue.objects.create(key='SUM-1', summary='Stored')
+        remote = [SimpleNamespace(key=key, fields=SimpleNamespace(summary=key.lower())) for key in ('SUM-2', 'SUM-1')]
+        poker = Poker(Team.objects.create(name='Team'))
+        search = mock.Mock(return_value=remote)
+        with mock.patch.object(AJ.client(), 'connection', return_value=SimpleNamespace(search_issues=search)):
+            with self.assertNumQueries(2):
+                issues = poker.get_jira_issues()
+        self.assertEqual([(issue['key'], issue['summary']) for issue in issues],
+                         [('SUM-2', 'sum-2'), ('SUM-1', 'Stored')])
+        self.assertEqual(Issue.objects.count(), 2)
+
+
+class TypeaheadTests(TestCase):
+
+    def setUp(self):
+        for index in typeahead.INDEXES.values():
+            index.keys = None
+        self.addCleanup(setattr, typeahead.INDEXES['issues'], 'keys', None)
+        self.addCleanup(setattr, typeahead.INDEXES['users'], 'keys', None)
+        Issue.objects.bulk_create(Issue(key=key) for key in ('SUM-2', 'SUM-10', 'SUN-1', 'SUM', 'SUM-1', 'SUM-\uffff'))
+
+    def search_both(self, source, prefix, limit=typeahead.LIMIT):
+        """ The search through the database and through the in-memory index, which must agree. """
+        results = []
+        for memory in (False, True):
+            with override_settings(TYPEAHEAD_MEMORY_INDEX=memory):
+                results.append(typeahead.search(source, prefix, limit))
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_prefix_bounds(self):
+        self.assertEqual(self.search_both('issues', 'SUM-1'), ['SUM-1', 'SUM-10'])
+        self.assertEqual(self.search_both('issues', 'SUM-'), ['SUM-1', 'SUM-10', 'SUM-2', 'SUM-\uffff'])
+        self.assertEqual(self.search_both('issues', 'SUM'), ['SUM', 'SUM-1', 'SUM-10', 'SUM-2', 'SUM-\uffff'])
+        self.assertEqual(self.search_both('issues', 'sum'), [])
+        self.assertEqual(self.search_both('issues', ''), [])
+
+    def test_limit(self):
+        self.assertEqual(self.search_both('issues', 'SUM-', 2), ['SUM-1', 'SUM-10'])
+        self.assertEqual(self.search_both('issues', 'SUM-', 0), ['SUM-1'])
+        self.assertEqual(len(self.search_both('issues', 'S', 1000)), 6)
+
+    def test_staff_are_not_offered(self):
+        User.objects.create_user('ann', password='password')
+        User.objects.create_user('andy', password='password', is_staff=True)
+        self.assertEqual(self.search_both('users', 'an'), ['ann'])
+
+    @override_settings(TYPEAHEAD_MEMORY_INDEX=True)
+    def test_signals_keep_the_memory_index_current(self):
+        self.assertEqual(typeahead.search('issues', 'SUM-3'), [])
+        issue = Issue.objects.create(key='SUM-3')
+        self.assertEqual(typeahead.search('issues', 'SUM-3'), ['SUM-3'])
+        issue.key = 'SUM-30'
+        issue.save()
+        self.assertEqual(typeahead.search('issues', 'SUM-3'), ['SUM-30'])
+
+        user = User.objects.create_user('ann', password='password')
+        self.assertEqual(typeahead.search('users', 'an'), ['ann'])
+        user.is_staff = True
+        user.save()
+        self.assertEqual(typeahead.search('users', 'an'), [])
+        user.is_staff = False
+        user.save()
+        self.assertEqual(typeahead.search('users', 'an'), ['ann'])
+        user.delete()
+        self.assertEqual(typeahead.search('users', 'an'), [])
+
+    @override_settings(TYPEAHEAD_MEMORY_INDEX=True, TYPEAHEAD_INDEX_TTL=60)
+    def test_memory_index_reloads_after_ttl(self):
+        self.assertEqual(typeahead.search('issues', 'SUM-3'), [])
+        # written without signals, as by another process
+        Issue.objects.bulk_create([Issue(key='SUM-3')])
+        self.assertEqual(typeahead.search('issues', 'SUM-3'), [])
+        with mock.patch('okr.typeahead.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(typeahead.search('issues', 'SUM-3'), ['SUM-3'])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.teams = [Team.objects.create(name='Team {n}'.format(n=n)) for n in range(2)]
+        self.users = []
+        for n, team in enumerate(self.teams):
+            user = User.objects.create_user('user{n}'.format(n=n), password='password')
+            user.profile.team = team
+            user.profile.save()
+            self.users.append(user)
+        self.current = Quarter.objects.create(name='Q1', start_date=date(2000, 1, 1), end_date=date(2999, 12, 31))
+        self.past = Quarter.objects.create(name='Q0', start_date=date(1990, 1, 1), end_date=date(1990, 3, 31))
+        invalidate_current_quarter()
+
+    def objective(self, text, user=None, quarter=None):
+        global_objective = GlobalObjective.objects.create(objective='Global', quarter=quarter or self.current,
+                                                          user=user or self.users[0])
+        global_key_result = GlobalKeyResult.objects.create(key_result='Global', objective=global_objective)
+        return Objective.objects.create(objective=text, user=user or self.users[0],
+                                        global_key_result=global_key_result)
+
+    def postings(self, instance):
+        kind = search.MODELS[type(instance)]
+        return dict(SearchPosting.objects.filter(kind=kind, object_id=instance.pk).values_list('token', 'count'))
+
+    def test_hits_matching_more_words_rank_first_then_by_weighted_counts(self):
+        both = self.objective('Deploy the pipeline')
+        repeated = self.objective('Deploy deploy deploy')
+        rare = self.objective('Pipeline')
+        common = self.objective('Deploy')
+        hits = search.search('pipeline deploy', kinds=[SearchPosting.OBJECTIVE])
+        self.assertEqual([hit.object for hit in hits], [both, repeated, rare, common])
+        # deploy is in three objectives and pipeline in two
+        self.assertEqual([hit.score for hit in hits[1:]], [3.0, round(1 + math.log(3 / 2), 3), 1.0])
+        self.assertEqual(hits[0].url, '/objective/{pk}/detail/'.format(pk=both.pk))
+
+    def test_quarter_and_team_scopes(self):
+        mine = self.objective('Launch', self.users[0])
+        theirs = self.objective('Launch', self.users[1])
+        old = self.objective('Launch', self.users[0], self.past)
+        issue = Issue.objects.create(key='SUM-1', summary='Launch checklist', user=self.users[0])
+
+        def hits(**scope):
+            return {(hit.kind, hit.object.pk) for hit in search.search('launch', **scope)}
+
+        objective, key = SearchPosting.OBJECTIVE, SearchPosting.ISSUE
+        self.assertEqual(hits(quarter=self.current.pk), {(objective, mine.pk), (objective, theirs.pk), (key, issue.pk)})
+        self.assertEqual(hits(quarter=self.current.pk, team=self.teams[0].pk), {(objective, mine.pk), (key, issue.pk)})
+        self.assertEqual(hits(team=self.teams[1].pk), {(objective, theirs.pk)})
+        self.assertIn((objective, old.pk), hits())
+
+    def test_search_page_defaults_to_the_current_quarter(self):
+        current = self.objective('Launch', self.users[0])
+        old = self.objective('Launch', self.users[0], self.past)
+        self.client.force_login(self.users[0])
+
+        def objectives(query):
+            response = self.client.get('/search/?' + query)
+            self.assertEqual(response.status_code, 200)
+            return [hit.object for hit in response.context['hits'] if hit.kind == SearchPosting.OBJECTIVE]
+
+        self.assertEqual(objectives('q=launch'), [current])
+        self.assertEqual(objectives('q=launch&quarter={pk}'.format(pk=self.past.pk)), [old])
+        self.assertEqual(objectives('q=launch&quarter='), [old, current])
+        self.assertEqual(objectives('q=launch&team={pk}'.format(pk=self.teams[1].pk)), [])
+
+    def test_saves_reindex_only_changed_text(self):
+        objective = self.objective('Ship it')
+        result = Result.objects.create(result='Write the docs', objective=objective)
+        self.assertEqual(self.postings(result), {'write': 1, 'the': 1, 'docs': 1})
+
+        result.percentage = 50
+        with CaptureQueriesContext(connection) as queries:
+            result.save()
+        self.assertFalse([query for query in queries if 'okr_searchposting' in query['sql']])
+
+        result.result = 'Docs docs'
+        result.save()
+        self.assertEqual(self.postings(result), {'docs': 2})
+
+        result.delete()
+        self.assertEqual(self.postings(result), {})
+        self.assertEqual(self.postings(objective), {'ship': 1, 'it': 1})
+
+    def test_sync_reindexes_changed_summaries(self):
+        Issue.objects.bulk_create([Issue(key='SUM-1', summary='Old words')])
+        apply_events([{'key': 'SUM-1', 'fields': {'summary': 'New words', 'status': {'name': 'Open'}}}])
+        self.assertEqual(self.postings(Issue.objects.get()), {'sum': 1, '1': 1, 'new': 1, 'words': 1})
+
+    def test_rebuild(self):
+        objective = self.objective('Ship it')
+        SearchPosting.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.postings(objective), {'ship': 1, 'it': 1})
+
+
+@override_settings(FRAGMENT_CACHE_ENABLED=True)
+class FragmentTests(TransactionTestCase):
+    # the rollup bumps versions on commit
+
+    def setUp(self):
+        cache.clear()
+        self.objective = create_objective()
+
+    def render(self):
+        return fragments.fetch('objective', [self.objective],
+                               lambda: str(Objective.objects.get(pk=self.objective.pk).percentage))
+
+    def test_cached_until_bumped(self):
+        self.assertEqual(self.render(), '0.0')
+
+        Objective.objects.filter(pk=self.objective.pk).update(percentage=50)
+        self.assertEqual(self.render(), '0.0')
+
+        fragments.bump(Objective, [self.objective.pk])
+        self.assertEqual(self.render(), '50.0')
+
+    def test_saving_a_key_result_invalidates_its_objective(self):
+        self.assertEqual(self.render(), '0.0')
+        Result.objects.create(result='Result', objective=self.objective, manual_bar=True, percentage=40)
+        self.assertEqual(self.render(), '40.0')
+
+    def test_full_recompute_invalidates(self):
+        Result.objects.create(result='Result', objective=self.objective, manual_bar=True, percentage=40)
+        Objective.objects.filter(pk=self.objective.pk).update(percentage=0)
+        self.assertEqual(self.render(), '0.0')
+
+        rollup.recompute_all()
+        self.assertEqual(self.render(), '40.0')
+
+    def test_outdated_copy_is_served_while_another_process_renders(self):
+        self.assertEqual(self.render(), '0.0')
+        Objective.objects.filter(pk=self.objective.pk).update(percentage=50)
+        fragments.bump(Objective, [self.objective.pk])
+
+        key = 'okr:fragment:objective:okr.objective.{pk}'.format(pk=self.objective.pk)
+        cache.add(key + ':lock', 1)
+        before = fragments.stats()
+        self.assertEqual(self.render(), '0.0')
+        self.assertEqual(fragments.stats()['stale'], before['stale'] + 1)
+
+        cache.delete(key + ':lock')
+        self.assertEqual(self.render(), '50.0')
+
+    @override_settings(FRAGMENT_CACHE_ENABLED=False)
+    def test_disabled_cache_always_renders(self):
+        self.assertEqual(self.render(), '0.0')
+        Objective.objects.filter(pk=self.objective.pk).update(percentage=50)
+        self.assertEqual(self.render(), '50.0')
+
+    def test_stats_are_for_staff(self):
+        self.client.force_login(self.objective.user)
+        self.assertEqual(self.client.get('/api/cache/fragments/').status_code, 403)
+        self.objective.user.is_staff = True
+        self.objective.user.save()
+        self.assertEqual(set(self.client.get('/api/cache/fragments/').json()), {'hits', 'misses', 'stale', 'uncached'})
+
+
+def fail():
+    raise RuntimeError('JIRA is down')
+
+
+@override_settings(JOB_RETRY_BACKOFF=30, JOB_RETRY_BACKOFF_MAX=3600)
+@mock.patch.dict(jobs.TASKS, {'fail': fail, 'succeed': lambda: 'done'})
+class JobTests(TestCase):
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=now() - timedelta(seconds=1))
+
+    def test_racing_claims(self):
+        first, second = jobs.enqueue('succeed', key='first'), jobs.enqueue('succeed', key='second')
+        won = []
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if not won:
+                # another worker claims the same job between this worker's read and its update
+                won.append(None)
+                won[0] = jobs.claim('a')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            lost = jobs.claim('b')
+
+        self.assertEqual((won[0].pk, won[0].worker), (first.pk, 'a'))
+        self.assertEqual((lost.pk, lost.worker), (second.pk, 'b'))
+        self.assertIsNone(jobs.claim('c'))
+
+    def test_expired_lease_is_claimed_again(self):
+        jobs.enqueue('succeed')
+        stale = jobs.claim('a')
+        self.assertIsNone(jobs.claim('b'))
+
+        Job.objects.filter(pk=stale.pk).update(leased_until=now() - timedelta(seconds=1))
+        job = jobs.claim('b')
+        self.assertEqual((job.pk, job.worker, job.attempts), (stale.pk, 'b', 2))
+
+        # the worker that lost its lease can no longer finish the job
+        jobs.run(stale, 'a')
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+        jobs.run(job, 'b')
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.SUCCEEDED)
+
+    def test_failed_job_backs_off_until_max_attempts(self):
+        self.assertEqual([jobs.backoff(attempts).total_seconds() for attempts in (1, 2, 3, 10)],
+                         [30, 60, 120, 3600])
+
+        job = jobs.enqueue('fail', max_attempts=2)
+        jobs.run(jobs.claim('worker'), 'worker')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertAlmostEqual((job.run_after - now()).total_seconds(), 30, delta=5)
+        self.assertIsNone(jobs.claim('worker'))
+
+        self.make_due(job)
+        jobs.run(jobs.claim('worker'), 'worker')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('JIRA is down', job.error)
+        self.assertEqual(job.runs.count(), 2)
+
+    def test_queued_key_is_deduplicated(self):
+        job = jobs.enqueue('succeed', key='report')
+        self.assertEqual(jobs.enqueue('succeed', key='report').pk, job.pk)
+        self.assertNotEqual(jobs.enqueue('succeed').pk, jobs.enqueue('succeed').pk)
+
+        # once claimed, the key may be queued again
+        jobs.claim('worker')
+        self.assertNotEqual(jobs.enqueue('succeed', key='report').pk, job.pk)
+
+
+class SchedulerTests(TestCase):
+    schedule = [
+        ('sync', '*/5 * * * *', 'sync_issues', {}),
+        ('sync_full', '0 9 * * *', 'sync_issues', {'full': True}),
+    ]
+
+    def setUp(self):
+        self.morning = localtime(now()).replace(hour=8, minute=58, second=0, microsecond=0)
+
+    def at(self, minutes):
+        return self.morning + timedelta(minutes=minutes)
+
+    def test_parse_cron_fields(self):
+        self.assertEqual(scheduler.parse('*/20 9-11 1,15 * 1-5'), (
+            frozenset({0, 20, 40}), frozenset({9, 10, 11}), frozenset({1, 15}), frozenset(range(1, 13)),
+            frozenset(range(1, 6))))
+        self.assertEqual(scheduler.parse('5/30 0 * * 0')[0], frozenset({5, 35}))
+        for expression in ('* * * *', '60 * * * *', '* 5-3 * * *', '* * 0 * *', 'x * * * *'):
+            with self.assertRaises(ValueError):
+                scheduler.parse(expression)
+
+        sunday = localtime(now()).replace(year=2020, month=1, day=5, hour=9, minute=0)
+        self.assertTrue(scheduler.matches('0 9 * * 0', sunday))
+        self.assertFalse(scheduler.matches('0 9 * * 1-5', sunday))
+
+    def test_only_the_leader_queues(self):
+        leader, standby = scheduler.Scheduler('a', self.schedule), scheduler.Scheduler('b', self.schedule)
+        self.assertEqual(leader.step(self.at(2)), [('sync', 'queued'), ('sync_full', 'queued')])
+        self.assertEqual(standby.step(self.at(2)), [])
+        self.assertEqual(list(Job.objects.order_by('key').values_list('key', 'kwargs')),
+                         [('schedule:sync', '{}'), ('schedule:sync_full', '{"full": true}')])
+
+    def test_tick_skipped_while_previous_job_is_unfinished(self):
+        runner = scheduler.Scheduler('a', self.schedule)
+        self.assertEqual(runner.step(self.at(7)), [('sync', 'queued')])
+
+        job = jobs.claim('worker')
+        self.assertEqual(runner.step(self.at(12)), [('sync', 'skipped')])
+
+        Job.objects.filter(pk=job.pk).update(status=Job.SUCCEEDED)
+        self.assertEqual(runner.step(self.at(17)), [('sync', 'queued')])
+
+    def test_new_leader_catches_up_on_missed_ticks(self):
+        scheduler.Scheduler('a', self.schedule).step(self.at(0))
+        Job.objects.update(status=Job.SUCCEEDED)
+
+        # the leader dies just before 09:00; its successor takes over a few minutes later
+        Lease.objects.filter(name=scheduler.LEADER).update(expires=None)
+        self.assertEqual(scheduler.Scheduler('b', self.schedule).step(self.at(4)),
+                         [('sync', 'queued'), ('sync_full', 'queued')])
+
+    def test_each_tick_is_taken_once(self):
+        scheduler.Scheduler('a', self.schedule).step(self.at(2))
+        Job.objects.update(status=Job.SUCCEEDED)
+
+        # a new leader starting at a tick its predecessor took doesn't queue it again
+        Lease.objects.filter(name=scheduler.LEADER).update(expires=None, last_tick=None)
+        self.assertEqual(scheduler.Scheduler('b', self.schedule).step(self.at(2)), [])
@@ -0,0 +1,78 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Issue, User
+
+LIMIT = 10
+MAX_LIMIT = 50
+
+# sorts after every character, so [prefix, prefix + MAX_CHAR) is exactly the keys starting with prefix
+MAX_CHAR = '\U0010ffff'
+
+
+class KeyIndex(object):
+    """
+        Sorted in-memory copy of a unique column, searched with bisect.
+
+        The index is loaded on first use and reloaded every TYPEAHEAD_INDEX_TTL seconds; in between, saves in this
+        process keep it current through add() and discard() (see okr.signals).
+    """
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.keys = None
+        self.loaded = 0
+        self.lock = threading.Lock()
+
+    def search(self, prefix, limit):
+        with self.lock:
+            if self.keys is None or time.monotonic() - self.loaded > settings.TYPEAHEAD_INDEX_TTL:
+                self.keys = sorted(self.queryset.values_list(self.field, flat=True))
+                self.loaded = time.monotonic()
+            start = bisect_left(self.keys, prefix)
+            return [key for key in self.keys[start:start + limit] if key.startswith(prefix)]
+
+    def add(self, key):
+        with self.lock:
+            if self.keys is not None:
+                position = bisect_left(self.keys, key)
+                if position == len(self.keys) or self.keys[position] != key:
+                    self.keys.insert(position, key)
+
+    def discard(self, key):
+        with self.lock:
+            if self.keys is not None and key is not None:
+                position = bisect_left(self.keys, key)
+                if position < len(self.keys) and self.keys[position] == key:
+                    del self.keys[position]
+
+
+# what each typeahead searches: a unique, indexed column
+SOURCES = {
+    'issues': (Issue.objects.all(), 'key'),
+    'users': (User.objects.filter(is_staff=False), 'username'),
+}
+INDEXES = {name: KeyIndex(queryset, field) for name, (queryset, field) in SOURCES.items()}
+
+
+def search(source, prefix, limit=LIMIT):
+    """
+        Up to limit values of source starting with prefix, in order.
+
+        Without the in-memory index this is a range scan on the column's unique index; unlike LIKE 'prefix%' it is
+        case sensitive, so it can use the index on every database.
+    """
+    if not prefix:
+        return []
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    if settings.TYPEAHEAD_MEMORY_INDEX:
+        return INDEXES[source].search(prefix, limit)
+
+    queryset, field = SOURCES[source]
+    return list(queryset.filter(**{field + '__gte': prefix, field + '__lt': prefix + MAX_CHAR})
+                .order_by(field).values_list(field, flat=True)[:limit])
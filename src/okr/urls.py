@@ -2,6 +2,7 @@ from django.urls import path
 
 from . import progress
 from . import views
+from . import webhook
 
 app_name = 'okr'
 
@@ -16,6 +17,9 @@ urlpatterns = [
     path('poker/', views.PokerView.as_view(), name='poker'),
     path('how-to/', views.GuideView.as_view(), name='guide'),
     path('progress/<int:kr_id>/type/<str:type>/', progress.update_progress, name='progress'),
+    path('jira/webhook/', webhook.jira_webhook, name='jira-webhook'),
+    path('activity/', views.ActivityList.as_view(), name='activity-list'),
+    path('search/', views.SearchView.as_view(), name='search'),
 
     # Global Objective
     path('global/objective/add/', views.GlobalObjectiveCreate.as_view(), name='globalobjective-add'),
@@ -62,6 +66,7 @@ urlpatterns = [
 
     # Reports
     path('reports/', views.ReportView.as_view(), name='report'),
+    path('reports/refresh/', views.ReportSnapshotCreate.as_view(), name='report-refresh'),
     path('reports/GRST/<int:pk>/', views.ReportGlobalKeyResultDetail.as_view(), name='report-gkr-detail'),
     path('reports/user/<int:pk>/', views.ReportUserDetail.as_view(), name='report-user-detail'),
 
@@ -5,12 +5,15 @@ from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.messages.views import SuccessMessageMixin
+from django.db.models import Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.csrf import requires_csrf_token
@@ -19,13 +22,18 @@ from django.views.generic import (CreateView, DeleteView, DetailView, FormView,
                                   ListView, RedirectView, TemplateView,
                                   UpdateView)
 
-from .context_processors import get_current_quarter
-from .cron import update_percentages
-from .forms import ObjectiveFormCurrent, ResultForm
+from .conditional import (conditional, objective_detail_state, objective_list_state, report_global_key_result_state,
+                          report_state, report_user_state)
+from . import feed, jobs, search
+from .forms import IssueForm, ObjectiveFormCurrent, ResultForm
+from .history import burn_up
 from .models import (GlobalKeyResult, GlobalObjective, Objective, Result, Team,
-                     User, Manager, Issue, Poker)
+                     User, Manager, Issue, Poker, Profile, GlobalKeyResultSnapshot, UserSnapshot, Quarter,
+                     get_current_quarter)
 from .permissions import is_manager_or_staff, is_manager_of_team_or_staff, is_owner_of_objective, \
-    is_owner_of_key_result, is_owner_of_issue
+    is_owner_of_key_result, is_owner_of_issue, get_roles
+from .reports import global_key_result_report, user_report
+from .snapshots import compare, latest_snapshot
 
 
 class IndexView(LoginRequiredMixin, TemplateView):
@@ -34,7 +42,7 @@ class IndexView(LoginRequiredMixin, TemplateView):
 
     def dispatch(self, request, *args, **kwargs):
         if request.user.is_authenticated:
-            if request.user.profile.team:
+            if request.roles.team:
                 return redirect('okr:objective-list')
             else:
                 return redirect('okr:welcome')
@@ -48,7 +56,8 @@ class TestView(TemplateView):
 
     def dispatch(self, request, *args, **kwargs):
         if request.user.is_staff:
-            update_percentages()
+            job = jobs.enqueue('update_percentages', key='update_percentages')
+            messages.info(request, 'Progress recomputation queued as job #{id}.'.format(id=job.id))
         return super().dispatch(request, *args, **kwargs)
 
 
@@ -122,7 +131,7 @@ class LoginView(AnonymousRequiredMixin, FormView):
     def get_success_url(self):
         redirect_to = self.success_url
 
-        if self.request.user.profile.is_manager():
+        if get_roles(self.request.user).is_manager:
             redirect_to = reverse_lazy('okr:team-list')
 
         return redirect_to
@@ -172,7 +181,7 @@ class GlobalObjectiveList(LoginRequiredMixin, ListView):
         return context
 
     def dispatch(self, request, *args, **kwargs):
-        if request.user.profile.team:
+        if request.roles.team:
             return super().dispatch(request, *args, **kwargs)
         else:
             return redirect('okr:welcome')
@@ -301,12 +310,20 @@ class ObjectiveList(LoginRequiredMixin, ListView):
     model = Objective
     login_url = reverse_lazy('okr:login')
 
+    @conditional(objective_list_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        objectives = (Objective.objects.filter(user=self.request.user).with_progress()
+                      .prefetch_related('result_set__jira_issues'))
+        percentage = self.request.roles.profile.get_percentage()
         context.update({
-            'object_list_incomplete': Objective.objects.filter(user=self.request.user, percentage__lt=100),
-            'object_list_complete': Objective.objects.filter(user=self.request.user, percentage=100),
-            'incomplete_percentage': 100 - self.request.user.profile.get_percentage(),
+            'object_list_incomplete': objectives.filter(percentage__lt=100),
+            'object_list_complete': objectives.filter(percentage=100),
+            'percentage': percentage,
+            'incomplete_percentage': 100 - percentage,
         })
         return context
 
@@ -319,6 +336,22 @@ class ObjectiveDetail(UserPassesTestMixin, LoginRequiredMixin, DetailView):
     def test_func(self, user):
         return is_owner_of_objective(user, self.get_object())
 
+    @conditional(objective_detail_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        # the burn-up chart runs over the objective's own quarter
+        return super().get_queryset().select_related('global_key_result__objective__quarter')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update({
+            'burn_up': burn_up(Result.objects.filter(objective=self.object),
+                               self.object.global_key_result.objective.quarter),
+        })
+        return context
+
 
 class ObjectiveUpdate(UserPassesTestMixin, LoginRequiredMixin, SuccessMessageMixin, UpdateView):
     template_name = 'okr/includes/objective_update.html'
@@ -467,15 +500,16 @@ class TeamList(UserPassesTestMixin, LoginRequiredMixin, ListView):
     def test_func(self, user):
         return is_manager_or_staff(user)
 
+    def get_queryset(self):
+        return Team.objects.with_summary(self.request.user).order_by('name')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        teams = []
-        for team in Team.objects.all():
-            if not self.request.user.profile.is_manager_of(team):
-                teams.append(team)
+        teams = list(self.object_list)
 
         context.update({
-            'object_list': teams
+            'managed_teams': [team for team in teams if team.managed_by_me],
+            'object_list': [team for team in teams if not team.managed_by_me],
         })
 
         return context
@@ -495,8 +529,11 @@ class TeamDetail(UserPassesTestMixin, LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        objectives = Objective.objects.for_quarter(get_current_quarter(self.request)).prefetch_related('result_set')
         context.update({
-            'users': User.objects.filter(is_staff=False)
+            'members': Profile.objects.filter(team=self.object).with_progress(get_current_quarter(self.request))
+                .with_roles().select_related('user')
+                .prefetch_related(Prefetch('user__objective_set', queryset=objectives, to_attr='current_objectives')),
         })
         return context
 
@@ -534,31 +571,77 @@ class GuideView(LoginRequiredMixin, TemplateView):
         return super().dispatch(request, *args, **kwargs)
 
 
-class IssueCreate(LoginRequiredMixin, SuccessMessageMixin, CreateView):
-    template_name = 'okr/includes/issue_create.html'
-    model = Issue
-    fields = ['key']
-    success_message = 'Issue successfully added.'
+class ActivityList(LoginRequiredMixin, TemplateView):
+    """ The team's activity feed, or a single member's with ?user=; paged with ?cursor= """
+    template_name = 'okr/includes/activity_list.html'
     login_url = reverse_lazy('okr:login')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        issues = [issue.key for issue in Issue.objects.all()]
+        member = self.request.GET.get('user', '')
+        member = get_object_or_404(User, pk=member) if member.isdigit() else None
+
+        try:
+            activities, next_cursor = feed.read(self.request.user, member, self.request.GET.get('cursor'))
+        except feed.InvalidCursor:
+            raise Http404
+
         context.update({
-            'issues': ','.join(issues),
+            'member': member,
+            'activities': activities,
+            'next_cursor': next_cursor,
         })
         return context
 
-    def form_valid(self, form):
-        if not form.instance.key.startswith('SUM-'):
-            form.instance.key = 'SUM-' + form.instance.key
 
-        # if Issue.objects.get(key=form.instance.key) in Issue.objects.all():
-        #     messages.error(self.request, 'Issue already exists!')
-        #     return self.get_success_url()
+class SearchView(LoginRequiredMixin, TemplateView):
+    """ Search objectives, key results, global key results and issues; the current quarter unless ?quarter= """
+    template_name = 'okr/includes/search.html'
+    login_url = reverse_lazy('okr:login')
 
-        form.instance.user = self.request.user
-        return super().form_valid(form)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        quarter = self.request.GET.get('quarter')
+        if quarter is None:
+            current = get_current_quarter(self.request)
+            quarter = current.pk if current else None
+        else:
+            quarter = int(quarter) if quarter.isdigit() else None
+        team = self.request.GET.get('team', '')
+        team = int(team) if team.isdigit() else None
+
+        context.update({
+            'query': query,
+            'quarter': quarter,
+            'team': team,
+            'quarters': Quarter.objects.order_by('-start_date'),
+            'teams': Team.objects.order_by('name'),
+            'hits': search.search(query, quarter, team) if query else [],
+        })
+        return context
+
+
+class IssueCreate(LoginRequiredMixin, SuccessMessageMixin, CreateView):
+    template_name = 'okr/includes/issue_create.html'
+    model = Issue
+    form_class = IssueForm
+    success_message = 'Issue successfully added.'
+    login_url = reverse_lazy('okr:login')
+
+    def form_valid(self, form):
+        self.object, created = Issue.objects.get_or_create(key=form.cleaned_data['key'],
+                                                           defaults={'user': self.request.user})
+        if created:
+            messages.success(self.request, self.success_message)
+        elif self.object.user_id is None:
+            # tracked for a key result or poker before anyone claimed it
+            self.object.user = self.request.user
+            self.object.save(update_fields=['user', 'modified'])
+            messages.success(self.request, self.success_message)
+        else:
+            messages.info(self.request, 'Issue already added.')
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('okr:issue-add')
@@ -604,17 +687,43 @@ class ReportView(LoginRequiredMixin, TemplateView):
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    @conditional(report_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        snapshot = latest_snapshot(self.request.roles.team, get_current_quarter(self.request))
+        previous = snapshot.previous() if snapshot else None
+        # only compared when the report fragment has to be rendered; a snapshot never changes once taken
+        comparison = SimpleLazyObject(lambda: compare(snapshot, previous) if snapshot else ([], []))
         context.update({
-            'global_objectives': GlobalObjective.objects.filter(
-                user=self.request.user.profile.team.get_manager().manager,
-                quarter=get_current_quarter()
-            )
+            'snapshot': snapshot,
+            'previous_snapshot': previous,
+            'global_objectives': lambda: comparison[0],
+            'users': lambda: comparison[1],
         })
         return context
 
 
+class ReportSnapshotCreate(UserPassesTestMixin, LoginRequiredMixin, RedirectView):
+    """ Queues a refresh of the team's report snapshot on demand. """
+    pattern_name = 'okr:report'
+    http_method_names = ['post']
+    login_url = reverse_lazy('okr:login')
+
+    def test_func(self, user):
+        return is_manager_or_staff(user)
+
+    def post(self, request, *args, **kwargs):
+        team, quarter = request.roles.team, get_current_quarter(request)
+        if team is not None and quarter is not None:
+            jobs.enqueue('take_report_snapshot', key='take_report_snapshot:{team}:{quarter}'.format(
+                team=team.id, quarter=quarter.id), team_id=team.id, quarter_id=quarter.id)
+            messages.success(request, 'Report refresh queued; reload the page in a moment.')
+        return super().post(request, *args, **kwargs)
+
+
 class ReportGlobalKeyResultDetail(LoginRequiredMixin, DetailView):
     template_name = 'okr/includes/report_globalkr_detail.html'
     login_url = reverse_lazy('okr:login')
@@ -623,16 +732,24 @@ class ReportGlobalKeyResultDetail(LoginRequiredMixin, DetailView):
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    @conditional(report_global_key_result_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        users = []
-        for objective in Objective.objects.filter(user__profile__team=self.request.user.profile.team):
-            if objective.global_key_result.id == self.get_object().id:
-                if objective.user not in users:
-                    users.append(objective.user)
+        team = self.request.roles.team
+        snapshot = latest_snapshot(team, self.object.objective.quarter)
+        row = GlobalKeyResultSnapshot.objects.filter(snapshot=snapshot, global_key_result=self.object).first()
         context.update({
-            'users': users,
-            'objectives': Objective.objects.filter(user__profile__team=self.request.user.profile.team)
+            'snapshot': snapshot,
+            'global_key_result_snapshot': row,
+            # live progress until a snapshot covers the global key result
+            'percentage': self.object.percentage if row is None else row.percentage,
+            'users': global_key_result_report(team, self.object),
+            'burn_up': burn_up(Result.objects.filter(objective__user__profile__team=team,
+                                                     objective__global_key_result=self.object),
+                               self.object.objective.quarter),
         })
         return context
 
@@ -645,16 +762,24 @@ class ReportUserDetail(LoginRequiredMixin, DetailView):
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    @conditional(report_user_state)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        users = []
-        for objective in Objective.objects.filter(user__profile__team=self.request.user.profile.team):
-            if objective.global_key_result.id == self.get_object().id:
-                if objective.user not in users:
-                    users.append(objective.user)
+        team, quarter = self.request.roles.team, get_current_quarter(self.request)
+        snapshot = latest_snapshot(team, quarter)
+        row = UserSnapshot.objects.filter(snapshot=snapshot, user=self.object).first()
         context.update({
-            'users': users,
-            'objectives': Objective.objects.filter(user__profile__team=self.request.user.profile.team)
+            'snapshot': snapshot,
+            'user_snapshot': row,
+            # live progress until a snapshot covers the user
+            'percentage': self.object.profile.get_percentage() if row is None else row.percentage,
+            'global_key_results': user_report(team, self.object),
+            'burn_up': burn_up(Result.objects.filter(objective__user=self.object, objective__user__profile__team=team,
+                                                     objective__global_key_result__objective__quarter=quarter),
+                               quarter),
         })
         return context
 
@@ -0,0 +1,85 @@
+import hmac
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from . import jobs
+from .models import Job
+
+ISSUE_EVENTS = ('jira:issue_created', 'jira:issue_updated')
+JIRA_DATETIME = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+def updated(issue):
+    """ When JIRA last changed the issue, or None if the payload doesn't say. """
+    try:
+        return datetime.strptime(issue['fields']['updated'], JIRA_DATETIME)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_newer(issue, than):
+    issue_updated, than_updated = updated(issue), updated(than)
+    # without timestamps the later arrival wins
+    return issue_updated is None or than_updated is None or issue_updated >= than_updated
+
+
+def newest(issues):
+    """ The newest payload of every issue, in the order JIRA changed them. """
+    latest = {}
+    for issue in issues:
+        if issue['key'] not in latest or is_newer(issue, latest[issue['key']]):
+            latest[issue['key']] = issue
+    # payloads without a timestamp go last, in the order they arrived
+    return sorted(latest.values(),
+                  key=lambda issue: (updated(issue) is None, updated(issue) and updated(issue).timestamp()))
+
+
+def queue(issue):
+    """
+        Persist an issue event as a job applied JIRA_WEBHOOK_WINDOW seconds later.
+
+        Jobs are keyed by issue, so events arriving within the window coalesce into the queued job, which keeps
+        the newest payload, and jobs of one issue never run at the same time (see okr.jobs.claim).
+    """
+    job = jobs.enqueue('apply_jira_issue', key='jira-issue:{key}'.format(key=issue['key']),
+                       delay=settings.JIRA_WEBHOOK_WINDOW, issue=issue)
+    queued = json.loads(job.kwargs)['issue']
+    if queued != issue and is_newer(issue, queued):
+        replaced = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            kwargs=json.dumps({'issue': issue}, sort_keys=True))
+        if not replaced:
+            # claimed by a worker in the meantime, so this event needs a job of its own
+            return queue(issue)
+    return job
+
+
+def is_issue_event(payload):
+    if not isinstance(payload, dict):
+        return False
+    issue = payload.get('issue')
+    return (payload.get('webhookEvent') in ISSUE_EVENTS and isinstance(issue, dict) and 'key' in issue
+            and isinstance(issue.get('fields'), dict))
+
+
+@csrf_exempt
+@require_POST
+def jira_webhook(request):
+    token = request.GET.get('token') or request.META.get('HTTP_X_ACHIEVE_TOKEN', '')
+    if not settings.JIRA_WEBHOOK_SECRET or not hmac.compare_digest(token, settings.JIRA_WEBHOOK_SECRET):
+        return HttpResponseForbidden()
+
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        return HttpResponseBadRequest('Invalid JSON')
+
+    if is_issue_event(payload):
+        # stored before answering, so an accepted event survives a restart
+        queue(payload['issue'])
+
+    return HttpResponse(status=202)